@@ -0,0 +1,81 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:10
+
+import unicodedata
+
+from django.db import migrations, models
+
+TAMANO_LOTE = 2000
+INDICE_TRIGRAM = 'cliente_busqueda_trgm_idx'
+INDICE_PREFIJO = 'cliente_busqueda_prefijo_idx'
+
+
+def _normalizar(texto):
+    # Copia de inventario.models.normalizar_busqueda al momento de la migración
+    descompuesto = unicodedata.normalize('NFKD', str(texto or ''))
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.lower().split())
+
+
+def llenar_busqueda(apps, schema_editor):
+    Cliente = apps.get_model('cliente', 'Cliente')
+    ultimo_pk = ''
+    while True:
+        lote = list(
+            Cliente.objects.filter(pk__gt=ultimo_pk).order_by('pk')
+            .only('pk', 'nombre', 'apellido', 'ruc_cedula', 'email', 'telefono')[:TAMANO_LOTE]
+        )
+        if not lote:
+            break
+        ultimo_pk = lote[-1].pk
+        for cliente in lote:
+            cliente.telefono_digitos = ''.join(c for c in (cliente.telefono or '') if c.isdigit())
+            cliente.busqueda = _normalizar(
+                f"{cliente.nombre} {cliente.apellido} {cliente.pk} {cliente.ruc_cedula or ''} {cliente.email or ''} "
+                f"{cliente.telefono_digitos}"
+            )[:255]
+        Cliente.objects.bulk_update(lote, ['busqueda', 'telefono_digitos'])
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    # Igual que en inventario.0023: solo PostgreSQL tiene pg_trgm
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDICE_TRIGRAM} ON cliente_cliente USING gin (busqueda gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDICE_PREFIJO} ON cliente_cliente (user_id, busqueda varchar_pattern_ops)'
+    )
+
+
+def eliminar_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDICE_TRIGRAM}')
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDICE_PREFIJO}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cliente', '0005_cliente_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='busqueda',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='telefono_digitos',
+            field=models.CharField(blank=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['user', 'telefono_digitos'], name='cliente_user_telefono_idx'),
+        ),
+        migrations.RunPython(llenar_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indices_busqueda, eliminar_indices_busqueda),
+    ]
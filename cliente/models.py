@@ -4,6 +4,13 @@ from decimal import Decimal
 
 from django.contrib.auth.models import User
 
+from inventario.models import normalizar_busqueda
+
+
+def solo_digitos(texto):
+    return ''.join(c for c in str(texto or '') if c.isdigit())
+
+
 class Cliente(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     id_cliente = models.CharField(max_length=20, primary_key=True)
@@ -21,6 +28,31 @@ class Cliente(models.Model):
     saldo_credito = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Saldo de Crédito Disponible")
     dias_plazo = models.IntegerField(default=30, verbose_name="Días de Plazo para Pago")
 
+    # Columnas de búsqueda mantenidas en save() (índices trigram y exactos en PostgreSQL)
+    busqueda = models.CharField(max_length=255, blank=True, default='', editable=False)
+    telefono_digitos = models.CharField(max_length=15, blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # Búsqueda exacta por teléfono dentro de los clientes de un usuario
+            models.Index(fields=['user', 'telefono_digitos'], name='cliente_user_telefono_idx'),
+        ]
+
+    def texto_busqueda(self):
+        # El teléfono va en dígitos para que los fragmentos ("0991", "099 123") coincidan
+        return normalizar_busqueda(
+            f"{self.nombre} {self.apellido} {self.id_cliente} {self.ruc_cedula or ''} {self.email or ''} "
+            f"{solo_digitos(self.telefono)}"
+        )[:255]
+
+    def save(self, *args, **kwargs):
+        self.busqueda = self.texto_busqueda()
+        self.telefono_digitos = solo_digitos(self.telefono)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'busqueda', 'telefono_digitos'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.nombre} {self.apellido} ({self.id_cliente})"
     
@@ -0,0 +1,77 @@
+# cliente/services.py
+"""
+Búsqueda de clientes compartida por el POS y el módulo de clientes.
+
+Los códigos exactos (cédula/RUC, id_cliente o teléfono) se resuelven por
+índice antes de buscar texto. La búsqueda de texto usa Cliente.busqueda
+(nombre, apellido, identificación, email y dígitos del teléfono
+normalizados), que en PostgreSQL tiene un índice trigram, así que un
+teléfono incompleto también encuentra al cliente.
+"""
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from inventario.models import normalizar_busqueda
+
+from .models import Cliente, solo_digitos
+
+# Largo mínimo de la consulta para buscar dentro del texto (un trigram)
+BUSQUEDA_MIN_TRIGRAM = 3
+# Una consulta con al menos estos dígitos puede ser cédula, RUC o teléfono
+MIN_DIGITOS_CODIGO = 6
+
+
+def buscar_clientes(consulta, clientes):
+    """
+    Clientes de `clientes` (QuerySet ya filtrado por usuario) que coinciden
+    con la consulta, ordenados por relevancia.
+
+    1. Si la consulta es un código (cédula/RUC, id_cliente o teléfono) que
+       existe exactamente, se devuelven solo esas coincidencias.
+    2. Si no, cada palabra debe aparecer en el texto normalizado; con menos
+       de BUSQUEDA_MIN_TRIGRAM caracteres solo se buscan prefijos.
+
+    Returns:
+        QuerySet sin cortar; la vista aplica su propio límite.
+    """
+    codigo = consulta.strip()
+    texto = normalizar_busqueda(consulta)
+    if not texto:
+        return clientes.none()
+
+    digitos = solo_digitos(codigo)
+    if len(digitos) >= MIN_DIGITOS_CODIGO and len(digitos) >= len(codigo.replace(' ', '')) - 1:
+        exactos = clientes.filter(Q(ruc_cedula=codigo) | Q(id_cliente=codigo) | Q(telefono_digitos=digitos))
+        if exactos.exists():
+            return exactos.order_by('nombre', 'apellido')
+
+    if len(texto) < BUSQUEDA_MIN_TRIGRAM:
+        clientes = clientes.filter(busqueda__startswith=texto)
+    else:
+        for palabra in texto.split(' '):
+            clientes = clientes.filter(busqueda__contains=palabra)
+    return clientes.annotate(
+        relevancia=Case(
+            When(busqueda__startswith=texto, then=Value(0)),
+            When(busqueda__contains=f' {texto}', then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        )
+    ).order_by('relevancia', 'nombre', 'apellido')
+
+
+def buscar_clientes_cacheado(consulta, propietario_id):
+    """
+    buscar_clientes sobre los clientes del propietario con los resultados en
+    la caché de búsqueda (possitema.cache_busqueda).
+
+    Returns:
+        QuerySet de Cliente en orden de relevancia, sin cortar.
+    """
+    from possitema.cache_busqueda import CANDIDATOS_CACHE, buscar_en_cache, en_orden
+
+    def buscar():
+        clientes = Cliente.objects.filter(user_id=propietario_id)
+        return buscar_clientes(consulta, clientes).values_list('pk', flat=True)[:CANDIDATOS_CACHE]
+
+    ids = buscar_en_cache('clientes', propietario_id, consulta, buscar)
+    return en_orden(Cliente.objects.filter(user_id=propietario_id), ids)
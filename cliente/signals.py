@@ -0,0 +1,16 @@
+# cliente/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from possitema.cache_busqueda import invalidar_busquedas
+
+from .models import Cliente
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+def invalidar_busquedas_clientes(sender, instance, **kwargs):
+    """Los resultados de búsqueda guardados del propietario dejan de ser válidos."""
+    propietario_id = instance.user_id
+    transaction.on_commit(lambda: invalidar_busquedas('clientes', propietario_id))
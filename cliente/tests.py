@@ -1,3 +1,42 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Cliente
+from .services import buscar_clientes
+
+
+class BuscarClientesTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+        self.otro = User.objects.create_user(username='otro', password='x')
+        Cliente.objects.create(
+            id_cliente='C1', user=self.user, nombre='José', apellido='Pérez',
+            ruc_cedula='0912345678', telefono='099-123 4567',
+        )
+        Cliente.objects.create(id_cliente='C2', user=self.user, nombre='María', apellido='Josefa')
+        Cliente.objects.create(id_cliente='C3', user=self.otro, nombre='José', apellido='Otro')
+
+    def _ids(self, consulta, user=None):
+        clientes = Cliente.objects.filter(user=user or self.user)
+        return list(buscar_clientes(consulta, clientes).values_list('id_cliente', flat=True))
+
+    def test_texto_sin_tildes_y_por_usuario(self):
+        self.assertEqual(self._ids('jose perez'), ['C1'])
+        # Prefijo del nombre antes que coincidencia dentro del apellido
+        self.assertEqual(self._ids('jose'), ['C1', 'C2'])
+        self.assertEqual(self._ids('jose', self.otro), ['C3'])
+
+    def test_cedula_y_telefono_exactos(self):
+        self.assertEqual(self._ids('0912345678'), ['C1'])
+        self.assertEqual(self._ids('0991234567'), ['C1'])
+        self.assertEqual(self._ids('099 123 4567'), ['C1'])
+
+    def test_telefono_parcial(self):
+        for consulta in ('1234567', '0991', '099 123'):
+            self.assertEqual(self._ids(consulta), ['C1'], consulta)
+
+    def test_columnas_se_actualizan_con_update_fields(self):
+        cliente = Cliente.objects.get(pk='C2')
+        cliente.telefono = '(04) 222-3333'
+        cliente.save(update_fields=['telefono'])
+        self.assertEqual(self._ids('042223333'), ['C2'])
@@ -3,8 +3,8 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib import messages
 from django.http import JsonResponse
-from django.db.models import Q
 from .models import Cliente
+from .services import buscar_clientes, buscar_clientes_cacheado
 from .forms import ClienteForm, ExcelUploadForm
 import openpyxl
 from django.http import HttpResponse
@@ -109,14 +109,7 @@ def clientes_lista(request):
     credito_filtro = request.GET.get('credito', '').strip()
     
     if query:
-        clientes = clientes.filter(
-            Q(nombre__icontains=query) |
-            Q(apellido__icontains=query) |
-            Q(id_cliente__icontains=query) |
-            Q(ruc_cedula__icontains=query) |
-            Q(email__icontains=query) |
-            Q(telefono__icontains=query)
-        )
+        clientes = buscar_clientes(query, clientes)
     
     if credito_filtro == 'activo':
         clientes = clientes.filter(credito_activo=True)
@@ -293,7 +286,6 @@ def cliente_actualizar_ruc(request, pk):
 def buscar_clientes_api(request):
     """API para buscar clientes por nombre, email o teléfono"""
     from django.http import JsonResponse
-    from django.db.models import Q
     
     try:
         q = request.GET.get('q', '').strip()
@@ -303,14 +295,7 @@ def buscar_clientes_api(request):
             return JsonResponse({'clientes': []})
         
         # Buscar clientes - ser más flexible con la búsqueda
-        clientes = Cliente.objects.filter(
-            user=request.user,
-        ).filter(
-            Q(nombre__icontains=q) |
-            Q(email__icontains=q) |
-            Q(telefono__icontains=q) |
-            Q(id_cliente__icontains=q)  # También permitir búsqueda por ID
-        ).order_by('nombre').values('id_cliente', 'nombre', 'email', 'telefono')[:15]
+        clientes = buscar_clientes_cacheado(q, request.user.pk).values('id_cliente', 'nombre', 'email', 'telefono')[:15]
         
         # Convertir id_cliente a id para que el frontend sea compatible
         clientes_list = []
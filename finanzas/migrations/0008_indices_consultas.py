@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cliente', '0006_cliente_busqueda'),
+        ('finanzas', '0007_cuentaporcobrar_cliente'),
+        ('ventas', '0012_detalleventa_snapshot_producto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cuentaporcobrar',
+            index=models.Index(fields=['owner', 'estado'], name='cxc_owner_estado_idx'),
+        ),
+    ]
@@ -163,6 +163,10 @@ class CuentaPorCobrar(models.Model):
         verbose_name = "Cuenta por Cobrar"
         verbose_name_plural = "Cuentas por Cobrar"
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Saldos por estado del dueño (reportes y dashboard)
+            models.Index(fields=['owner', 'estado'], name='cxc_owner_estado_idx'),
+        ]
 
 
 class AmortizacionCliente(models.Model):
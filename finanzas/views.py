@@ -1,7 +1,6 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db import transaction
 from decimal import Decimal
 
@@ -11,6 +10,7 @@ from .models import (
 )
 from cliente.models import Cliente
 from .forms import NuevoCobroForm, NuevoPagoProveedorForm, NuevoPagoClienteForm
+from possitema.paginacion import paginar_por_cursor
 
 
 @login_required
@@ -49,14 +49,11 @@ def lista_cuentas_por_pagar(request):
     if estado:
         cuentas = cuentas.filter(estado=estado)
     
-    # Paginación
-    paginator = Paginator(cuentas, 10)
-    page_number = request.GET.get('page')
-    cuentas_paginadas = paginator.get_page(page_number)
+    # Paginación por cursor sobre (fecha_creacion, pk)
+    cuentas_paginadas = paginar_por_cursor(cuentas, request, 'fecha_creacion', 10)
     
     context = {
         'cuentas': cuentas_paginadas,
-        'paginator': paginator,
         'estado_filter': estado,
     }
     return render(request, 'finanzas/lista_cuentas_por_pagar.html', context)
@@ -165,23 +162,14 @@ def lista_cuentas_por_cobrar(request):
             Q(cliente__apellido__icontains=query)
         )
     
-    # Paginación
-    paginator = Paginator(cuentas, 10)
-    page_number = request.GET.get('page')
-    cuentas_paginadas = paginator.get_page(page_number)
-    
-    # Query string sin 'page' para paginación
-    query_params = request.GET.copy()
-    if 'page' in query_params:
-        del query_params['page']
-    query_string = query_params.urlencode()
+    # Paginación por cursor sobre (fecha_creacion, pk)
+    cuentas_paginadas = paginar_por_cursor(cuentas, request, 'fecha_creacion', 10)
     
     context = {
         'cuentas': cuentas_paginadas,
-        'paginator': paginator,
         'estado_filter': estado,
         'query': query,
-        'query_string': query_string,
+        'query_string': cuentas_paginadas.query_string,
     }
     return render(request, 'finanzas/lista_cuentas_por_cobrar.html', context)
 
@@ -344,23 +332,14 @@ def lista_solicitudes_credito(request):
             Q(id__icontains=query)
         )
     
-    # Paginación
-    paginator = Paginator(solicitudes, 15)
-    page_number = request.GET.get('page')
-    solicitudes_paginadas = paginator.get_page(page_number)
-    
-    # Query string sin 'page' para paginación
-    query_params = request.GET.copy()
-    if 'page' in query_params:
-        del query_params['page']
-    query_string = query_params.urlencode()
+    # Paginación por cursor sobre (fecha_solicitud, pk)
+    solicitudes_paginadas = paginar_por_cursor(solicitudes, request, 'fecha_solicitud', 15)
     
     context = {
         'solicitudes': solicitudes_paginadas,
-        'paginator': paginator,
         'estado_filter': estado,
         'query': query,
-        'query_string': query_string,
+        'query_string': solicitudes_paginadas.query_string,
     }
     return render(request, 'finanzas/lista_solicitudes_credito.html', context)
 
@@ -458,16 +437,13 @@ def lista_amortizaciones_proveedor(request):
         'cuenta__compra__proveedor'
     ).filter(
         cuenta__owner=request.user
-    ).order_by('-fecha_pago')
+    )
     
-    # Paginación
-    paginator = Paginator(amortizaciones, 10)
-    page_number = request.GET.get('page')
-    amortizaciones_paginadas = paginator.get_page(page_number)
+    # Paginación por cursor sobre (fecha_pago, pk)
+    amortizaciones_paginadas = paginar_por_cursor(amortizaciones, request, 'fecha_pago', 10)
     
     context = {
         'amortizaciones': amortizaciones_paginadas,
-        'paginator': paginator,
     }
     return render(request, 'finanzas/lista_amortizaciones_proveedor.html', context)
 
@@ -482,16 +458,13 @@ def lista_amortizaciones_cliente(request):
         'cuenta__venta__cliente'
     ).filter(
         cuenta__owner=request.user
-    ).order_by('-fecha_cobro')
+    )
     
-    # Paginación
-    paginator = Paginator(amortizaciones, 10)
-    page_number = request.GET.get('page')
-    amortizaciones_paginadas = paginator.get_page(page_number)
+    # Paginación por cursor sobre (fecha_cobro, pk)
+    amortizaciones_paginadas = paginar_por_cursor(amortizaciones, request, 'fecha_cobro', 10)
     
     context = {
         'amortizaciones': amortizaciones_paginadas,
-        'paginator': paginator,
     }
     return render(request, 'finanzas/lista_amortizaciones_cliente.html', context)
 
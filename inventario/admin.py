@@ -1,14 +1,16 @@
 #inventario/admin.py
 from django.contrib import admin
 from .models import DetalleCompra, Producto, Proveedor, Categoria, Compra, MetodoPagoCompra, DetalleCompra
+from . import services
 from django import forms
 from django.db import transaction
 
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'precio_venta','precio_costo', 'cantidad', 'categoria')
+    list_display = ('nombre', 'precio_venta','precio_costo', 'cantidad', 'categoria', 'stock_fragmentado')
     search_fields = ('nombre', 'categoria__nombre')
-    list_filter = ('categoria',)
+    list_filter = ('categoria', 'stock_fragmentado')
     list_per_page = 10
+    actions = ['activar_stock_fragmentado', 'desactivar_stock_fragmentado']
     #agrupar los campos de fieldesets
     fieldsets = (
         ('Informacion General', {
@@ -31,6 +33,18 @@ class ProductoAdmin(admin.ModelAdmin):
             raise forms.ValidationError("La cantidad no puede ser negativa.")
         return cantidad
 
+    @admin.action(description="Fragmentar stock (productos de alta rotación)")
+    def activar_stock_fragmentado(self, request, queryset):
+        for producto in queryset.filter(stock_fragmentado=False):
+            services.activar_stock_fragmentado(producto)
+        self.message_user(request, "Stock fragmentado activado.")
+
+    @admin.action(description="Consolidar stock fragmentado")
+    def desactivar_stock_fragmentado(self, request, queryset):
+        for producto in queryset.filter(stock_fragmentado=True):
+            services.desactivar_stock_fragmentado(producto)
+        self.message_user(request, "Stock consolidado en el producto.")
+
 class ProveedorAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'contacto', 'telefono', 'email')
     search_fields = ('nombre', 'contacto')
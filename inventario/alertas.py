@@ -0,0 +1,147 @@
+# inventario/alertas.py
+"""
+Resumen de alertas de la barra superior: productos por vencer, compras con
+pago pendiente y productos con stock bajo, todo del mismo propietario.
+
+El resumen se calcula una vez (cuatro consultas con `values`) y se guarda en
+la caché por propietario ya serializado, junto con su ETag. Mientras nada
+cambie, cada consulta del navegador cuesta una lectura de la caché, y si
+trae el ETag vigente se responde 304 sin cuerpo.
+
+Lo invalidan, al confirmarse la transacción:
+  - guardar o eliminar un Producto o una Compra (caducidad, estado de pago);
+  - cualquier movimiento de inventario (ver services.registrar_movimientos).
+El cambio de día también lo descarta, porque los días restantes dependen de
+la fecha. ALERTAS_TTL es solo un respaldo por si algo cambia sin pasar por
+esos caminos.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from possitema.eventos import publicar
+from possitema.respuestas_json import serializar
+
+from .models import BAJO_STOCK_UMBRAL, Compra, Producto
+from .services import DIAS_CADUCIDAD_PROXIMA, STOCK_ACTUAL
+
+ALERTAS_TTL = 600
+# Filas por sección que se envían; el contador siempre es el total
+MAX_ALERTAS_POR_SECCION = 50
+_CLAVE_RESUMEN = 'alertas:resumen:{}'
+
+
+def _caducidad(usuario, hoy):
+    productos = (
+        Producto.objects.filter(
+            user=usuario, fecha_caducidad__isnull=False,
+            fecha_caducidad__lte=hoy + timedelta(days=DIAS_CADUCIDAD_PROXIMA),
+        )
+        .annotate(stock_actual=STOCK_ACTUAL)
+        .exclude(stock_actual=0)
+        .order_by('fecha_caducidad')
+        .values_list('id_producto', 'nombre', 'fecha_caducidad', 'stock_actual')
+    )
+    alertas = [
+        {
+            'id': pk, 'nombre': nombre, 'fecha_caducidad': fecha.isoformat(), 'cantidad': cantidad,
+            'dias_restantes': (fecha - hoy).days,
+        }
+        for pk, nombre, fecha, cantidad in productos
+    ]
+    return {'count': len(alertas), 'alertas': alertas[:MAX_ALERTAS_POR_SECCION]}
+
+
+def _compras(usuario, hoy):
+    if not usuario.has_perm('inventario.view_compra'):
+        return {'count': 0, 'alertas': []}
+    compras = (
+        Compra.objects.filter(user=usuario, fecha_pago_proveedor__isnull=False)
+        .exclude(estado__in=['PAGADA', 'CANCELADA'])
+        .order_by('fecha_pago_proveedor')
+        .values_list('id_compra', 'numero_documento', 'proveedor__nombre', 'fecha_pago_proveedor', 'total')
+    )
+    alertas = [
+        {
+            'id': pk, 'numero': numero or f'Compra #{pk}', 'proveedor': proveedor or 'Sin proveedor',
+            'fecha_pago': fecha.isoformat(), 'dias_restantes': (fecha - hoy).days, 'monto': str(total),
+            'url_editar': reverse('inventario:editar_compra', args=[pk]),
+        }
+        for pk, numero, proveedor, fecha, total in compras
+    ]
+    return {'count': len(alertas), 'alertas': alertas[:MAX_ALERTAS_POR_SECCION]}
+
+
+def _bajo_stock(usuario):
+    activos = Producto.objects.filter(user=usuario, estado='ACTIVO')
+    # Los productos normales se leen por el índice de cantidad; los pocos con
+    # stock fragmentado, por la suma de sus fragmentos
+    productos = list(
+        activos.filter(stock_fragmentado=False, cantidad__lte=BAJO_STOCK_UMBRAL)
+        .values_list('id_producto', 'nombre', 'cantidad')
+    ) + list(
+        activos.filter(stock_fragmentado=True).annotate(stock_actual=STOCK_ACTUAL)
+        .filter(stock_actual__lte=BAJO_STOCK_UMBRAL)
+        .values_list('id_producto', 'nombre', 'stock_actual')
+    )
+    productos.sort(key=lambda fila: fila[2])
+    filas = [{'id': pk, 'nombre': nombre, 'sku': pk, 'cantidad': cantidad} for pk, nombre, cantidad in productos]
+    return {'count': len(filas), 'productos': filas[:MAX_ALERTAS_POR_SECCION]}
+
+
+def calcular_alertas(usuario, hoy=None):
+    """Las tres secciones de alertas del usuario, sin pasar por la caché."""
+    hoy = hoy or timezone.localdate()
+    return {
+        'caducidad': _caducidad(usuario, hoy),
+        'compras': _compras(usuario, hoy),
+        'bajo_stock': _bajo_stock(usuario),
+    }
+
+
+def alertas_en_cache(usuario):
+    """
+    Resumen de alertas del usuario como (contenido JSON en bytes, ETag).
+    Si está en la caché y es del día, no consulta la base de datos.
+    """
+    hoy = timezone.localdate()
+    clave = _CLAVE_RESUMEN.format(usuario.pk)
+    entrada = cache.get(clave)
+    if entrada is None or entrada['fecha'] != hoy:
+        contenido = serializar(calcular_alertas(usuario, hoy))
+        entrada = {
+            'fecha': hoy,
+            'contenido': contenido,
+            'etag': '"%s"' % hashlib.md5(contenido, usedforsecurity=False).hexdigest(),
+        }
+        cache.set(clave, entrada, ALERTAS_TTL)
+    return entrada['contenido'], entrada['etag']
+
+
+def invalidar_alertas(*propietario_ids):
+    """
+    Descarta el resumen de los propietarios y avisa a sus streams de eventos,
+    al confirmarse la transacción.
+    """
+    propietario_ids = {pk for pk in propietario_ids if pk is not None}
+
+    def descartar():
+        cache.delete_many([_CLAVE_RESUMEN.format(pk) for pk in propietario_ids])
+
+    transaction.on_commit(descartar)
+    for propietario_id in propietario_ids:
+        publicar(propietario_id, 'alertas')
+
+
+def invalidar_alertas_productos(producto_ids):
+    """Como invalidar_alertas, para los dueños de los productos cuyo stock cambió."""
+    producto_ids = list(producto_ids)
+
+    def descartar():
+        invalidar_alertas(*Producto.objects.filter(pk__in=producto_ids).values_list('user_id', flat=True).distinct())
+
+    transaction.on_commit(descartar)
@@ -0,0 +1,135 @@
+# inventario/codigos_barras.py
+"""
+Reconocimiento de códigos de producto dentro de lo que devuelve el lector.
+
+Algunos lectores o etiquetas agregan prefijos/sufijos al código escaneado
+(p. ej. 'ABC7861234567890' o '7861234567890\\r01'). Para encontrar qué
+id_producto aparece dentro del texto leído se usa un autómata Aho-Corasick
+con todos los códigos del propietario: la búsqueda recorre el texto una sola
+vez, sin importar cuántos productos haya en el catálogo.
+
+El autómata se construye la primera vez que se necesita y se guarda en
+memoria del proceso por propietario. Guardar o eliminar un Producto lo
+invalida (ver inventario.signals); como cada proceso del servidor tiene su
+propia copia, además se reconstruye pasado AUTOMATA_TTL.
+"""
+import threading
+import time
+from collections import deque
+
+from django.core.cache import cache
+
+from .models import Producto
+
+# Segundos que un autómata puede usarse sin confirmar que sigue vigente
+AUTOMATA_TTL = 300
+_CLAVE_VERSION = 'inventario:automata_codigos:version:{}'
+
+_automatas = {}
+_candado = threading.Lock()
+
+
+class AutomataCodigos:
+    """Autómata Aho-Corasick sobre un conjunto de códigos."""
+
+    def __init__(self, codigos):
+        self._transiciones = [{}]
+        self._fallo = [0]
+        self._salida = [()]
+        for codigo in codigos:
+            if codigo:
+                self._agregar(codigo)
+        self._enlazar_fallos()
+
+    def _agregar(self, codigo):
+        estado = 0
+        for caracter in codigo:
+            siguiente = self._transiciones[estado].get(caracter)
+            if siguiente is None:
+                siguiente = len(self._transiciones)
+                self._transiciones[estado][caracter] = siguiente
+                self._transiciones.append({})
+                self._fallo.append(0)
+                self._salida.append(())
+            estado = siguiente
+        self._salida[estado] = (codigo,)
+
+    def _enlazar_fallos(self):
+        # Recorrido por niveles: el enlace de fallo de un estado apunta al
+        # sufijo propio más largo que también es prefijo de algún código
+        pendientes = deque(self._transiciones[0].values())
+        while pendientes:
+            estado = pendientes.popleft()
+            for caracter, hijo in self._transiciones[estado].items():
+                fallo = self._fallo[estado]
+                while fallo and caracter not in self._transiciones[fallo]:
+                    fallo = self._fallo[fallo]
+                self._fallo[hijo] = self._transiciones[fallo].get(caracter, 0)
+                self._salida[hijo] = self._salida[hijo] + self._salida[self._fallo[hijo]]
+                pendientes.append(hijo)
+
+    def buscar(self, texto):
+        """
+        Códigos que aparecen dentro de `texto`, del más largo al más corto
+        (a igual largo, el que aparece primero).
+        """
+        encontrados = {}
+        estado = 0
+        for posicion, caracter in enumerate(texto):
+            while estado and caracter not in self._transiciones[estado]:
+                estado = self._fallo[estado]
+            estado = self._transiciones[estado].get(caracter, 0)
+            for codigo in self._salida[estado]:
+                encontrados.setdefault(codigo, posicion - len(codigo) + 1)
+        return sorted(encontrados, key=lambda codigo: (-len(codigo), encontrados[codigo]))
+
+
+def _version(propietario_id):
+    return cache.get_or_set(_CLAVE_VERSION.format(propietario_id), 0, None)
+
+
+def obtener_automata(propietario_id=None):
+    """
+    Autómata con los códigos de los productos del propietario, o de todo el
+    catálogo si `propietario_id` es None. Se construye solo si no hay uno
+    vigente en este proceso.
+    """
+    version = _version(propietario_id)
+    entrada = _automatas.get(propietario_id)
+    if entrada and entrada[1] == version and time.monotonic() - entrada[2] < AUTOMATA_TTL:
+        return entrada[0]
+
+    productos = Producto.objects.all()
+    if propietario_id is not None:
+        productos = productos.filter(user_id=propietario_id)
+    automata = AutomataCodigos(productos.values_list('id_producto', flat=True).iterator())
+    with _candado:
+        _automatas[propietario_id] = (automata, version, time.monotonic())
+    return automata
+
+
+def invalidar_automata(propietario_id):
+    """Descarta el autómata del propietario y el del catálogo completo."""
+    for clave in (propietario_id, None):
+        with _candado:
+            _automatas.pop(clave, None)
+        try:
+            cache.incr(_CLAVE_VERSION.format(clave))
+        except ValueError:
+            cache.set(_CLAVE_VERSION.format(clave), 1, None)
+
+
+def buscar_producto_en_codigo(codigo, propietario_id=None):
+    """
+    Producto cuyo id_producto aparece dentro del código escaneado; si hay
+    varios, el de código más largo. Se confirma contra la base de datos por
+    si el autómata de este proceso todavía incluye un producto eliminado.
+    """
+    candidatos = obtener_automata(propietario_id).buscar(codigo)
+    if not candidatos:
+        return None
+    productos = Producto.objects.select_related('categoria').in_bulk(candidatos)
+    for candidato in candidatos:
+        if candidato in productos:
+            return productos[candidato]
+    return None
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0019_categoria_user_compra_user_producto_user_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='stock_fragmentado',
+            field=models.BooleanField(default=False, help_text='Reparte el stock en varios contadores para reducir la contención en ventas simultáneas.', verbose_name='Stock Fragmentado'),
+        ),
+        migrations.CreateModel(
+            name='FragmentoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('indice', models.PositiveSmallIntegerField()),
+                ('cantidad', models.IntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fragmentos_stock', to='inventario.producto')),
+            ],
+            options={
+                'verbose_name': 'Fragmento de Stock',
+                'verbose_name_plural': 'Fragmentos de Stock',
+                'unique_together': {('producto', 'indice')},
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def crear_snapshot_inicial(apps, schema_editor):
+    """El stock actual es el punto de partida del kardex."""
+    Producto = apps.get_model('inventario', 'Producto')
+    SnapshotStock = apps.get_model('inventario', 'SnapshotStock')
+    ahora = django.utils.timezone.now()
+    SnapshotStock.objects.bulk_create(
+        (SnapshotStock(producto_id=pk, fecha=ahora, cantidad=cantidad)
+         for pk, cantidad in Producto.objects.values_list('pk', 'cantidad').iterator()),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0020_producto_stock_fragmentado_fragmentostock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('INICIAL', 'Stock inicial'), ('VENTA', 'Venta'), ('ANULACION', 'Anulación de venta'), ('COMPRA', 'Recepción de compra'), ('IMPORTACION', 'Importación Excel'), ('AJUSTE', 'Ajuste manual')], max_length=12)),
+                ('cantidad', models.IntegerField(help_text='Positivo: entrada de stock. Negativo: salida.')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('referencia', models.CharField(blank=True, default='', max_length=50)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='inventario.producto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Inventario',
+                'verbose_name_plural': 'Movimientos de Inventario',
+                'ordering': ['fecha', 'id'],
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='movinv_producto_fecha_idx'), models.Index(fields=['fecha'], name='movinv_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('cantidad', models.IntegerField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots_stock', to='inventario.producto')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Stock',
+                'verbose_name_plural': 'Snapshots de Stock',
+                'constraints': [models.UniqueConstraint(fields=('producto', 'fecha'), name='snapshot_producto_fecha_unico')],
+            },
+        ),
+        migrations.RunPython(crear_snapshot_inicial, migrations.RunPython.noop),
+    ]
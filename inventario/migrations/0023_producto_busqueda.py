@@ -0,0 +1,66 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:52
+
+import unicodedata
+
+from django.db import migrations, models
+
+TAMANO_LOTE = 2000
+INDICE_TRIGRAM = 'producto_busqueda_trgm_idx'
+INDICE_PREFIJO = 'producto_busqueda_prefijo_idx'
+
+
+def _normalizar(texto):
+    # Copia de inventario.models.normalizar_busqueda al momento de la migración
+    descompuesto = unicodedata.normalize('NFKD', str(texto or ''))
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.lower().split())
+
+
+def llenar_busqueda(apps, schema_editor):
+    Producto = apps.get_model('inventario', 'Producto')
+    ultimo_pk = ''
+    while True:
+        lote = list(Producto.objects.filter(pk__gt=ultimo_pk).order_by('pk').only('pk', 'nombre')[:TAMANO_LOTE])
+        if not lote:
+            break
+        ultimo_pk = lote[-1].pk
+        for producto in lote:
+            producto.busqueda = _normalizar(f"{producto.nombre} {producto.pk}")
+        Producto.objects.bulk_update(lote, ['busqueda'])
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    # pg_trgm resuelve LIKE '%texto%' y varchar_pattern_ops LIKE 'texto%';
+    # otros motores (tests en SQLite) buscan sin estos índices
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDICE_TRIGRAM} ON inventario_producto USING gin (busqueda gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDICE_PREFIJO} ON inventario_producto (busqueda varchar_pattern_ops)'
+    )
+
+
+def eliminar_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDICE_TRIGRAM}')
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDICE_PREFIJO}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0022_reservastock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='busqueda',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(llenar_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indices_busqueda, eliminar_indices_busqueda),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0023_producto_busqueda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BajaCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_producto', models.CharField(max_length=100)),
+                ('version', models.PositiveBigIntegerField(db_index=True, default=0)),
+            ],
+            options={
+                'verbose_name': 'Baja de Catálogo',
+                'verbose_name_plural': 'Bajas de Catálogo',
+            },
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='version_catalogo',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['user', 'version_catalogo'], name='producto_user_version_idx'),
+        ),
+        migrations.AddField(
+            model_name='bajacatalogo',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='bajacatalogo',
+            index=models.Index(fields=['user', 'version'], name='bajacatalogo_user_version_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0024_catalogo_pos_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['fecha_compra', 'id_compra'], name='compra_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(condition=models.Q(('fecha_pago_proveedor__isnull', False)), fields=['user', 'fecha_pago_proveedor'], name='compra_user_pago_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['user', 'estado', 'cantidad'], name='producto_user_estado_cant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('cantidad__lte', 10), ('estado', 'ACTIVO')), fields=['cantidad'], name='producto_activo_bajo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('fecha_caducidad__isnull', False)), fields=['user', 'fecha_caducidad'], name='producto_user_caducidad_idx'),
+        ),
+    ]
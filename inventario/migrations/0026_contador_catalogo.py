@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:22
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def iniciar_contadores(apps, schema_editor):
+    # Los contadores siguen desde las versiones ya entregadas a los POS
+    # (microsegundos), así sus `desde` guardados siguen siendo válidos
+    Producto = apps.get_model('inventario', 'Producto')
+    BajaCatalogo = apps.get_model('inventario', 'BajaCatalogo')
+    ContadorCatalogo = apps.get_model('inventario', 'ContadorCatalogo')
+    versiones = {}
+    for modelo, campo in ((Producto, 'version_catalogo'), (BajaCatalogo, 'version')):
+        for user_id, version in modelo.objects.values_list('user_id').annotate(v=Max(campo)):
+            clave = user_id or 0
+            versiones[clave] = max(versiones.get(clave, 0), version or 0)
+    ContadorCatalogo.objects.bulk_create(
+        [ContadorCatalogo(propietario=clave, version=version) for clave, version in versiones.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0025_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorCatalogo',
+            fields=[
+                ('propietario', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador de Catálogo',
+                'verbose_name_plural': 'Contadores de Catálogo',
+            },
+        ),
+        migrations.RunPython(iniciar_contadores, migrations.RunPython.noop),
+    ]
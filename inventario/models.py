@@ -1,10 +1,25 @@
 # inventario/models.py
+import unicodedata
 from datetime import date
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 
+def normalizar_busqueda(texto):
+    """Minúsculas, sin tildes y con espacios simples: 'Café  Ñandú' -> 'cafe nandu'."""
+    descompuesto = unicodedata.normalize('NFKD', str(texto or ''))
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.lower().split())
+
+
+# Stock bajo en alertas, dashboard, lista de productos, reportes e IA
+BAJO_STOCK_UMBRAL = 10
+# El índice parcial de productos con stock bajo cubre ese umbral
+UMBRAL_INDICE_STOCK_BAJO = BAJO_STOCK_UMBRAL
+
+
 #modelos y detalles de los productos en inventario
 class Categoria(models.Model):
     
@@ -43,6 +58,15 @@ class Producto(models.Model):
     categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, related_name='productos')
     tarifa_iva = models.CharField(max_length=20, choices=TARIFAS_IVA, default='15', verbose_name="Tarifa IVA")
     estado = models.CharField(max_length=20, choices=ESTADOS, default='ACTIVO', verbose_name="Estado del Producto")
+    # Productos de alta rotación: el stock se reparte en FragmentoStock y
+    # 'cantidad' pasa a ser la suma consolidada por el reconciliador.
+    stock_fragmentado = models.BooleanField(default=False, verbose_name="Stock Fragmentado",
+                        help_text="Reparte el stock en varios contadores para reducir la contención en ventas simultáneas.")
+
+    # Nombre y código normalizados para la búsqueda del POS (índices trigram y de prefijo en PostgreSQL)
+    busqueda = models.CharField(max_length=255, blank=True, default='', editable=False)
+    # Última modificación visible en el catálogo del POS (datos o stock)
+    version_catalogo = models.PositiveBigIntegerField(default=0, editable=False, db_index=True)
 
     #campo de producto con fecha de caduicadad
     fecha_caducidad = models.DateField(blank=True, null=True, verbose_name="Fecha de Caducidad", help_text="Fecha de caducidad del producto, si aplica.")
@@ -90,9 +114,156 @@ class Producto(models.Model):
                 'badge': 'info'
             }
     
+    def texto_busqueda(self):
+        return normalizar_busqueda(f"{self.nombre} {self.id_producto}")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Stock leído: en productos fragmentados distingue una edición de
+        # 'cantidad' de un guardado que solo cambia otros campos
+        instance._cantidad_cargada = instance.__dict__.get('cantidad')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.busqueda = self.texto_busqueda()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'id_producto', 'nombre'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'busqueda'}
+        super().save(*args, **kwargs)
+        # La versión del catálogo se toma después de escribir la fila
+        from .services import marcar_cambios_catalogo
+
+        marcar_cambios_catalogo([self.pk])
+
+    class Meta:
+        indexes = [
+            # Cambios del catálogo de un propietario desde una versión
+            models.Index(fields=['user', 'version_catalogo'], name='producto_user_version_idx'),
+            # Conteos por estado y stock del dashboard e IA (user, estado, cantidad)
+            models.Index(fields=['user', 'estado', 'cantidad'], name='producto_user_estado_cant_idx'),
+            # Alertas de stock bajo de todos los productos activos
+            models.Index(
+                fields=['cantidad'], name='producto_activo_bajo_idx',
+                condition=models.Q(estado='ACTIVO', cantidad__lte=UMBRAL_INDICE_STOCK_BAJO),
+            ),
+            # Alertas de caducidad: solo productos que tienen fecha
+            models.Index(
+                fields=['user', 'fecha_caducidad'], name='producto_user_caducidad_idx',
+                condition=models.Q(fecha_caducidad__isnull=False),
+            ),
+        ]
+
     def __str__(self):
         return self.nombre
+
+
+class FragmentoStock(models.Model):
+    """
+    Contador parcial del stock de un producto de alta rotación.
+    Las ventas descuentan de un fragmento al azar en lugar de la fila del
+    Producto, de modo que varios cajeros no esperan el mismo bloqueo.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='fragmentos_stock')
+    indice = models.PositiveSmallIntegerField()
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Fragmento de Stock"
+        verbose_name_plural = "Fragmentos de Stock"
+        unique_together = ('producto', 'indice')
+
+    def __str__(self):
+        return f"{self.producto_id} [{self.indice}]: {self.cantidad}"
     
+class ReservaStock(models.Model):
+    """
+    Unidades apartadas por un cajero mientras el producto está en su carrito.
+    Una fila por (producto, cajero) con la cantidad total del carrito; vence
+    si el carrito no se toca durante el tiempo de vida de la reserva.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservas_stock')
+    cantidad = models.PositiveIntegerField()
+    expira = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Reserva de Stock"
+        verbose_name_plural = "Reservas de Stock"
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'usuario'], name='reserva_producto_usuario_unica'),
+        ]
+        indexes = [
+            # Suma de reservas vigentes por producto
+            models.Index(fields=['producto', 'expira'], name='reserva_producto_expira_idx'),
+            # Barrido de reservas vencidas
+            models.Index(fields=['expira'], name='reserva_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} reserva {self.cantidad} de {self.producto_id}"
+
+
+class MovimientoInventario(models.Model):
+    """
+    Registro inmutable (kardex) de cada cambio de stock de un producto.
+    Solo se inserta: las correcciones se registran como un nuevo movimiento.
+    """
+    TIPOS = [
+        ('INICIAL', 'Stock inicial'),
+        ('VENTA', 'Venta'),
+        ('ANULACION', 'Anulación de venta'),
+        ('COMPRA', 'Recepción de compra'),
+        ('IMPORTACION', 'Importación Excel'),
+        ('AJUSTE', 'Ajuste manual'),
+    ]
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos')
+    tipo = models.CharField(max_length=12, choices=TIPOS)
+    cantidad = models.IntegerField(help_text="Positivo: entrada de stock. Negativo: salida.")
+    fecha = models.DateTimeField(default=timezone.now)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    referencia = models.CharField(max_length=50, blank=True, default='')
+
+    class Meta:
+        verbose_name = "Movimiento de Inventario"
+        verbose_name_plural = "Movimientos de Inventario"
+        ordering = ['fecha', 'id']
+        indexes = [
+            # Kardex de un producto en un rango de fechas
+            models.Index(fields=['producto', 'fecha'], name='movinv_producto_fecha_idx'),
+            # Movimientos de un periodo (reportes, generación de snapshots)
+            models.Index(fields=['fecha'], name='movinv_fecha_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Los movimientos de inventario no se modifican; registre un ajuste.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad:+d} {self.producto_id}"
+
+
+class SnapshotStock(models.Model):
+    """
+    Stock de un producto a una fecha. El stock histórico se calcula desde el
+    último snapshot anterior más los movimientos posteriores a él.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='snapshots_stock')
+    fecha = models.DateTimeField()
+    cantidad = models.IntegerField()
+
+    class Meta:
+        verbose_name = "Snapshot de Stock"
+        verbose_name_plural = "Snapshots de Stock"
+        constraints = [
+            # También sirve de índice para buscar el último snapshot <= fecha
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='snapshot_producto_fecha_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} @ {self.fecha:%Y-%m-%d %H:%M}: {self.cantidad}"
+
 # modelo de proveedor a quien estas comprando los productos
 class Proveedor(models.Model):
     id_proveedor = models.CharField(max_length=20, primary_key=True, unique=True)
@@ -142,6 +313,17 @@ class Compra(models.Model):
     ]
     estado = models.CharField(max_length=10, choices=ESTADOS, default='PENDIENTE')
 
+    class Meta:
+        indexes = [
+            # Listado paginado por cursor (fecha_compra, pk)
+            models.Index(fields=['fecha_compra', 'id_compra'], name='compra_fecha_id_idx'),
+            # Alertas de pago a proveedores
+            models.Index(
+                fields=['user', 'fecha_pago_proveedor'], name='compra_user_pago_idx',
+                condition=models.Q(fecha_pago_proveedor__isnull=False),
+            ),
+        ]
+
     def __str__(self):
         # f-string mejorado para mayor claridad
         return f"Compra #{self.id_compra} - {self.proveedor.nombre} - {self.fecha_compra.strftime('%Y-%m-%d')}"
@@ -199,3 +381,41 @@ class MetodoPagoCompra(models.Model):
     class Meta:
         verbose_name = "Método de Pago de Compra"
         verbose_name_plural = "Métodos de Pago de Compras"
+
+
+class BajaCatalogo(models.Model):
+    """
+    Producto eliminado, para que el POS lo quite de su copia local del
+    catálogo al sincronizar cambios.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    id_producto = models.CharField(max_length=100)
+    version = models.PositiveBigIntegerField(default=0, db_index=True)
+
+    class Meta:
+        verbose_name = "Baja de Catálogo"
+        verbose_name_plural = "Bajas de Catálogo"
+        indexes = [
+            models.Index(fields=['user', 'version'], name='bajacatalogo_user_version_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id_producto} ({self.version})"
+
+
+class ContadorCatalogo(models.Model):
+    """
+    Última versión del catálogo del POS de un propietario (0 para los
+    productos sin usuario). Cada cambio incrementa la fila dentro de su
+    transacción y la deja bloqueada hasta confirmar, así las versiones de
+    un propietario se hacen visibles en orden.
+    """
+    propietario = models.PositiveIntegerField(primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Contador de Catálogo"
+        verbose_name_plural = "Contadores de Catálogo"
+
+    def __str__(self):
+        return f"{self.propietario}: {self.version}"
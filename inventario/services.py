@@ -0,0 +1,680 @@
+# inventario/services.py
+"""
+Servicios de stock compartidos por ventas, compras e inventario.
+
+Los productos de alta rotación pueden marcarse con `stock_fragmentado`: su
+stock se reparte en N filas de FragmentoStock y cada venta descuenta de un
+fragmento elegido al azar que no esté bloqueado por otro cajero. La columna
+Producto.cantidad de esos productos queda como valor consolidado, que
+`reconciliar_stock_fragmentado` recalcula a partir de la suma de fragmentos
+(comando `reconciliar_stock`). Las lecturas que deciden qué se puede vender
+(búsquedas del POS, reservas, catálogo local y alertas) no esperan a esa
+consolidación: leen STOCK_ACTUAL, que suma los fragmentos en el momento.
+"""
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import (
+    Case, CharField, DateField, DurationField, ExpressionWrapper, F, IntegerField, Max, OuterRef, Q,
+    Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    BajaCatalogo, ContadorCatalogo, DetalleCompra, FragmentoStock, MovimientoInventario, Producto,
+    ReservaStock, SnapshotStock, normalizar_busqueda,
+)
+
+NUM_FRAGMENTOS_DEFECTO = 8
+# Tiempo de vida de una reserva de carrito sin actividad
+RESERVA_STOCK_TTL = timedelta(minutes=10)
+# Fecha base cuando un producto aún no tiene snapshots de stock
+FECHA_INICIO_KARDEX = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+# Largo mínimo de la consulta para buscar dentro del texto (un trigram)
+BUSQUEDA_MIN_TRIGRAM = 3
+CAMPOS_CATALOGO = ['id', 'nombre', 'precio', 'tarifa_iva', 'stock']
+# Días antes del vencimiento en que la alerta pasa de 'warning' a 'danger',
+# igual que Producto.estado_caducidad
+DIAS_CADUCIDAD_CRITICA = 7
+DIAS_CADUCIDAD_PROXIMA = 30
+# Productos que devuelve el selector del formulario de compras
+SUGERENCIAS_COMPRA = 20
+
+
+# Stock real de un producto: la suma de sus fragmentos si tiene stock
+# fragmentado (la subconsulta usa el índice único (producto, indice)) y
+# Producto.cantidad en los demás
+STOCK_ACTUAL = Case(
+    When(stock_fragmentado=True, then=Coalesce(
+        Subquery(
+            FragmentoStock.objects.filter(producto=OuterRef('pk'))
+            .values('producto').annotate(total=Sum('cantidad')).values('total'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )),
+    default=F('cantidad'),
+    output_field=IntegerField(),
+)
+
+
+class StockInsuficienteError(Exception):
+    """El stock disponible no alcanza para la cantidad solicitada."""
+
+
+def _incrementar_productos(cantidades):
+    """Suma (o resta, si es negativa) cantidades a varios productos con un solo UPDATE."""
+    if not cantidades:
+        return
+    casos = [When(pk=producto_pk, then=F('cantidad') + cantidad) for producto_pk, cantidad in cantidades.items()]
+    Producto.objects.filter(pk__in=list(cantidades.keys())).update(
+        cantidad=Case(*casos, default=F('cantidad'), output_field=IntegerField()),
+    )
+    marcar_cambios_catalogo(cantidades.keys())
+
+
+def _descontar_de_fragmentos(producto_pk, cantidad):
+    """
+    Descuenta `cantidad` del stock fragmentado de un producto.
+
+    Primero intenta con un único fragmento al azar que tenga stock suficiente
+    y no esté bloqueado (SKIP LOCKED), así dos cajeros casi nunca esperan la
+    misma fila. Si ningún fragmento alcanza por sí solo, bloquea todos los
+    fragmentos del producto en orden y reparte el descuento entre ellos.
+    """
+    fragmento = FragmentoStock.objects.select_for_update(skip_locked=True).filter(
+        producto_id=producto_pk, cantidad__gte=cantidad
+    ).order_by('?').only('id').first()
+    if fragmento is not None:
+        FragmentoStock.objects.filter(pk=fragmento.pk).update(cantidad=F('cantidad') - cantidad)
+        return
+
+    fragmentos = list(
+        FragmentoStock.objects.select_for_update().filter(
+            producto_id=producto_pk, cantidad__gt=0
+        ).order_by('indice')
+    )
+    disponible = sum(f.cantidad for f in fragmentos)
+    if disponible < cantidad:
+        nombre = Producto.objects.filter(pk=producto_pk).values_list('nombre', flat=True).first() or producto_pk
+        raise StockInsuficienteError(f"Stock insuficiente para {nombre}. Disponible: {disponible}, Solicitado: {cantidad}.")
+
+    restante = cantidad
+    modificados = []
+    for fragmento in fragmentos:
+        tomado = min(fragmento.cantidad, restante)
+        fragmento.cantidad -= tomado
+        restante -= tomado
+        modificados.append(fragmento)
+        if restante == 0:
+            break
+    FragmentoStock.objects.bulk_update(modificados, ['cantidad'])
+
+
+def _sumar_a_fragmento(producto_pk, cantidad):
+    """Suma (o resta) `cantidad` en un fragmento libre del producto."""
+    fragmento = FragmentoStock.objects.select_for_update(skip_locked=True).filter(
+        producto_id=producto_pk
+    ).order_by('?').only('id').first()
+    if fragmento is None:
+        # Todos ocupados: esperar el primero en orden (mismo orden que el descuento repartido)
+        fragmento = FragmentoStock.objects.select_for_update().filter(
+            producto_id=producto_pk
+        ).order_by('indice').only('id').first()
+    if fragmento is None:
+        # Producto marcado sin fragmentos: se ajusta la fila del producto
+        _incrementar_productos({producto_pk: cantidad})
+        return
+    FragmentoStock.objects.filter(pk=fragmento.pk).update(cantidad=F('cantidad') + cantidad)
+
+
+def descontar_stock(cantidades, fragmentados=()):
+    """
+    Descuenta el stock de varios productos con un solo UPDATE condicional.
+    Cada fila solo se actualiza si todavía tiene stock suficiente; si alguna
+    no cumple la condición se lanza una excepción para revertir la transacción.
+    Los productos de `fragmentados` descuentan de sus fragmentos de stock.
+
+    Args:
+        cantidades: dict {id_producto: cantidad_a_descontar}
+        fragmentados: ids de productos con stock_fragmentado
+    """
+    normales = {pk: c for pk, c in cantidades.items() if pk not in fragmentados}
+    for producto_pk in sorted(set(cantidades) - set(normales)):
+        _descontar_de_fragmentos(producto_pk, cantidades[producto_pk])
+
+    if not normales:
+        return
+    condicion = Q()
+    casos = []
+    for producto_pk, cantidad in normales.items():
+        condicion |= Q(pk=producto_pk, cantidad__gte=cantidad)
+        casos.append(When(pk=producto_pk, then=F('cantidad') - cantidad))
+    actualizados = Producto.objects.filter(condicion).update(
+        cantidad=Case(*casos, default=F('cantidad'), output_field=IntegerField()),
+    )
+    if actualizados != len(normales):
+        raise StockInsuficienteError("Stock insuficiente: el inventario cambió mientras se procesaba la venta.")
+    marcar_cambios_catalogo(normales.keys())
+
+
+def reponer_stock(cantidades):
+    """
+    Devuelve stock a varios productos (anulaciones, recepciones de compra).
+    Los productos normales se actualizan con un solo UPDATE; los de stock
+    fragmentado suman en uno de sus fragmentos.
+
+    Args:
+        cantidades: dict {id_producto: cantidad_a_sumar}
+    """
+    cantidades = {pk: c for pk, c in cantidades.items() if c}
+    if not cantidades:
+        return
+    fragmentados = set(
+        Producto.objects.filter(pk__in=list(cantidades.keys()), stock_fragmentado=True)
+        .values_list('pk', flat=True)
+    )
+    for producto_pk in sorted(fragmentados):
+        _sumar_a_fragmento(producto_pk, cantidades[producto_pk])
+    _incrementar_productos({pk: c for pk, c in cantidades.items() if pk not in fragmentados})
+
+
+@transaction.atomic
+def fijar_stock_fragmentos(producto_pk, cantidad):
+    """
+    Reparte entre los fragmentos una edición manual de Producto.cantidad
+    (formulario, importación): la cantidad es el stock total deseado, no un
+    ajuste sobre la columna consolidada, que puede estar desactualizada.
+    Los fragmentos se bloquean y quedan con el mismo reparto que al activar
+    el stock fragmentado.
+    """
+    fragmentos = list(
+        FragmentoStock.objects.select_for_update().filter(producto_id=producto_pk).order_by('indice')
+    )
+    if not fragmentos:
+        return
+    base, resto = divmod(max(cantidad, 0), len(fragmentos))
+    for i, fragmento in enumerate(fragmentos):
+        fragmento.cantidad = base + (1 if i < resto else 0)
+    if cantidad < 0:
+        # Un stock negativo (faltante) queda en un solo fragmento
+        fragmentos[0].cantidad = cantidad
+    FragmentoStock.objects.bulk_update(fragmentos, ['cantidad'])
+
+
+@transaction.atomic
+def activar_stock_fragmentado(producto, num_fragmentos=NUM_FRAGMENTOS_DEFECTO):
+    """
+    Reparte el stock actual del producto en `num_fragmentos` contadores.
+    El resto de la división queda en los primeros fragmentos.
+    """
+    producto = Producto.objects.select_for_update().get(pk=producto.pk)
+    if producto.stock_fragmentado:
+        return producto
+    base, resto = divmod(max(producto.cantidad, 0), num_fragmentos)
+    FragmentoStock.objects.filter(producto=producto).delete()
+    FragmentoStock.objects.bulk_create([
+        FragmentoStock(producto=producto, indice=i, cantidad=base + (1 if i < resto else 0))
+        for i in range(num_fragmentos)
+    ])
+    Producto.objects.filter(pk=producto.pk).update(stock_fragmentado=True)
+    producto.stock_fragmentado = True
+    return producto
+
+
+@transaction.atomic
+def desactivar_stock_fragmentado(producto):
+    """Consolida los fragmentos en Producto.cantidad y los elimina."""
+    producto = Producto.objects.select_for_update().get(pk=producto.pk)
+    if not producto.stock_fragmentado:
+        return producto
+    fragmentos = FragmentoStock.objects.select_for_update().filter(producto=producto)
+    total = fragmentos.aggregate(total=Sum('cantidad'))['total'] or 0
+    fragmentos.delete()
+    Producto.objects.filter(pk=producto.pk).update(cantidad=total, stock_fragmentado=False)
+    marcar_cambios_catalogo([producto.pk])
+    producto.cantidad = total
+    producto.stock_fragmentado = False
+    return producto
+
+
+def reconciliar_stock_fragmentado(producto_pks=None):
+    """
+    Copia a Producto.cantidad la suma de los fragmentos de cada producto con
+    stock fragmentado: una consulta de agregación y un UPDATE. No bloquea los
+    fragmentos, así que puede ejecutarse mientras se vende.
+
+    Returns:
+        int: productos actualizados
+    """
+    fragmentos = FragmentoStock.objects.filter(producto__stock_fragmentado=True)
+    if producto_pks is not None:
+        fragmentos = fragmentos.filter(producto_id__in=producto_pks)
+    totales = dict(
+        fragmentos.values('producto_id').annotate(total=Sum('cantidad')).values_list('producto_id', 'total')
+    )
+    if not totales:
+        return 0
+    casos = [When(pk=producto_pk, then=total) for producto_pk, total in totales.items()]
+    desfasados = list(
+        Producto.objects.filter(pk__in=list(totales.keys())).exclude(
+            cantidad=Case(*casos, output_field=IntegerField())
+        ).values_list('pk', flat=True)
+    )
+    if not desfasados:
+        return 0
+    with transaction.atomic():
+        actualizados = Producto.objects.filter(pk__in=desfasados).update(
+            cantidad=Case(*casos, default=F('cantidad'), output_field=IntegerField()),
+        )
+        marcar_cambios_catalogo(desfasados)
+    return actualizados
+
+
+# ===== KARDEX: MOVIMIENTOS Y SNAPSHOTS DE STOCK =====
+
+def registrar_movimientos(cantidades, tipo, usuario=None, referencia='', fecha=None):
+    """
+    Inserta en un solo bulk_create un movimiento por producto.
+
+    Args:
+        cantidades: dict {id_producto: cantidad}; positiva para entradas y
+            negativa para salidas. Las cantidades en cero se omiten.
+        tipo: uno de MovimientoInventario.TIPOS
+    """
+    fecha = fecha or timezone.now()
+    movimientos = [
+        MovimientoInventario(
+            producto_id=producto_pk, tipo=tipo, cantidad=cantidad,
+            fecha=fecha, usuario=usuario, referencia=referencia[:50],
+        )
+        for producto_pk, cantidad in cantidades.items() if cantidad
+    ]
+    if movimientos:
+        MovimientoInventario.objects.bulk_create(movimientos)
+        from .alertas import invalidar_alertas_productos
+
+        invalidar_alertas_productos(cantidades)
+    return movimientos
+
+
+def productos_con_stock_a_fecha(fecha, productos=None):
+    """
+    Anota `stock_a_fecha` en cada producto: el último snapshot con fecha <=
+    `fecha` más la suma de los movimientos entre ese snapshot y `fecha`.
+    Todo se resuelve en una sola consulta con subconsultas que usan los
+    índices (producto, fecha) de snapshots y movimientos.
+    """
+    productos = Producto.objects.all() if productos is None else productos
+    ultimo_snapshot = SnapshotStock.objects.filter(
+        producto=OuterRef('pk'), fecha__lte=fecha
+    ).order_by('-fecha')
+    productos = productos.annotate(
+        _snapshot_fecha=Coalesce(Subquery(ultimo_snapshot.values('fecha')[:1]), Value(FECHA_INICIO_KARDEX)),
+        _snapshot_cantidad=Coalesce(Subquery(ultimo_snapshot.values('cantidad')[:1]), Value(0)),
+    )
+    delta = MovimientoInventario.objects.filter(
+        producto=OuterRef('pk'), fecha__gt=OuterRef('_snapshot_fecha'), fecha__lte=fecha
+    ).values('producto').annotate(total=Sum('cantidad')).values('total')
+    return productos.annotate(
+        stock_a_fecha=F('_snapshot_cantidad') + Coalesce(Subquery(delta, output_field=IntegerField()), Value(0))
+    )
+
+
+def stock_a_fecha(producto, fecha):
+    """Stock de un producto al cierre de `fecha` (datetime)."""
+    return productos_con_stock_a_fecha(
+        fecha, Producto.objects.filter(pk=producto.pk)
+    ).values_list('stock_a_fecha', flat=True).first() or 0
+
+
+def kardex_producto(producto, desde, hasta):
+    """
+    Kardex de un producto entre dos fechas: saldo inicial (snapshot + delta)
+    y los movimientos del periodo con su saldo acumulado.
+
+    Returns:
+        tuple: (saldo_inicial, [(movimiento, saldo), ...], saldo_final)
+    """
+    saldo = saldo_inicial = stock_a_fecha(producto, desde)
+    filas = []
+    movimientos = MovimientoInventario.objects.filter(
+        producto=producto, fecha__gt=desde, fecha__lte=hasta
+    ).select_related('usuario')
+    for movimiento in movimientos:
+        saldo += movimiento.cantidad
+        filas.append((movimiento, saldo))
+    return saldo_inicial, filas, saldo
+
+
+def generar_snapshots_stock(fecha=None, tamano_lote=2000):
+    """
+    Guarda el stock de todos los productos a `fecha` (por defecto, ahora).
+    Se recorre el catálogo por lotes para no cargarlo completo en memoria.
+
+    Returns:
+        int: snapshots creados
+    """
+    fecha = fecha or timezone.now()
+    creados = 0
+    lote = []
+    consulta = productos_con_stock_a_fecha(fecha).values_list('pk', 'stock_a_fecha')
+    for producto_pk, cantidad in consulta.iterator(chunk_size=tamano_lote):
+        lote.append(SnapshotStock(producto_id=producto_pk, fecha=fecha, cantidad=cantidad))
+        if len(lote) >= tamano_lote:
+            creados += len(SnapshotStock.objects.bulk_create(lote, ignore_conflicts=True))
+            lote = []
+    if lote:
+        creados += len(SnapshotStock.objects.bulk_create(lote, ignore_conflicts=True))
+    return creados
+
+
+# ===== RESERVAS DE STOCK DEL CARRITO =====
+
+def anotar_stock_disponible(productos, usuario=None):
+    """
+    Anota `reservado` (reservas vigentes de otros cajeros) y `disponible`
+    (STOCK_ACTUAL - reservado) en un queryset de productos. Son subconsultas
+    por índice: no agregan consultas a la búsqueda.
+    """
+    reservas = ReservaStock.objects.filter(producto=OuterRef('pk'), expira__gt=timezone.now())
+    if usuario is not None:
+        reservas = reservas.exclude(usuario=usuario)
+    reservas = reservas.values('producto').annotate(total=Sum('cantidad')).values('total')
+    return productos.annotate(
+        reservado=Coalesce(Subquery(reservas, output_field=IntegerField()), Value(0)),
+    ).annotate(disponible=ExpressionWrapper(STOCK_ACTUAL - F('reservado'), output_field=IntegerField()))
+
+
+def reservar_stock(usuario, producto_pk, cantidad, ttl=RESERVA_STOCK_TTL):
+    """
+    Fija en `cantidad` la reserva del cajero sobre un producto (la cantidad
+    total que tiene en el carrito) y renueva su vencimiento. Con cantidad 0
+    la reserva se libera. La reserva es orientativa: el descuento definitivo
+    sigue validándose en registrar_venta_completa.
+
+    Returns:
+        tuple: (reservado, disponible) — cantidad efectivamente reservada
+            (acotada a lo disponible) y unidades libres para este cajero.
+    """
+    if cantidad <= 0:
+        ReservaStock.objects.filter(usuario=usuario, producto_id=producto_pk).delete()
+        disponible = anotar_stock_disponible(
+            Producto.objects.filter(pk=producto_pk), usuario
+        ).values_list('disponible', flat=True).first()
+        return 0, disponible or 0
+
+    disponible = anotar_stock_disponible(
+        Producto.objects.filter(pk=producto_pk), usuario
+    ).values_list('disponible', flat=True).first()
+    if disponible is None:
+        raise Producto.DoesNotExist(f"Producto ID {producto_pk} no encontrado.")
+    reservado = max(0, min(cantidad, disponible))
+    if reservado:
+        ReservaStock.objects.bulk_create(
+            [ReservaStock(usuario=usuario, producto_id=producto_pk, cantidad=reservado,
+                          expira=timezone.now() + ttl)],
+            update_conflicts=True,
+            unique_fields=['producto', 'usuario'],
+            update_fields=['cantidad', 'expira'],
+        )
+    else:
+        ReservaStock.objects.filter(usuario=usuario, producto_id=producto_pk).delete()
+    return reservado, disponible
+
+
+def liberar_reservas(usuario, producto_pks=None):
+    """Elimina las reservas del cajero (todas o solo las de esos productos)."""
+    reservas = ReservaStock.objects.filter(usuario=usuario)
+    if producto_pks is not None:
+        reservas = reservas.filter(producto_id__in=producto_pks)
+    return reservas.delete()[0]
+
+
+def limpiar_reservas_vencidas():
+    """Borra en un solo DELETE todas las reservas vencidas."""
+    return ReservaStock.objects.filter(expira__lte=timezone.now()).delete()[0]
+
+
+def buscar_productos(consulta, productos=None):
+    """
+    Búsqueda de productos compartida por los buscadores del POS e inventario.
+
+    Cada palabra de la consulta debe aparecer en el nombre o el código
+    normalizados (Producto.busqueda, sin tildes ni mayúsculas), lo que en
+    PostgreSQL resuelve el índice trigram en lugar de recorrer la tabla. Con
+    menos de BUSQUEDA_MIN_TRIGRAM caracteres el trigram no sirve, así que solo
+    se buscan nombres que empiezan por el texto (índice de prefijo) o el
+    código exacto.
+
+    Los resultados se ordenan por relevancia: código exacto, código que
+    empieza por la consulta, nombre que empieza por ella, palabra que empieza
+    por ella y el resto.
+
+    Args:
+        consulta: Texto escrito por el usuario.
+        productos: QuerySet base (p. ej. filtrado por usuario o stock).
+
+    Returns:
+        QuerySet ordenado, sin cortar; la vista aplica su propio límite.
+    """
+    if productos is None:
+        productos = Producto.objects.all()
+    codigo = consulta.strip()
+    texto = normalizar_busqueda(consulta)
+    if not texto:
+        return productos.none()
+    if len(texto) < BUSQUEDA_MIN_TRIGRAM:
+        productos = productos.filter(Q(busqueda__startswith=texto) | Q(pk=codigo))
+    else:
+        for palabra in texto.split(' '):
+            productos = productos.filter(busqueda__contains=palabra)
+    return productos.annotate(
+        relevancia=Case(
+            When(id_producto__iexact=codigo, then=Value(0)),
+            When(id_producto__istartswith=codigo, then=Value(1)),
+            When(busqueda__startswith=texto, then=Value(2)),
+            When(busqueda__contains=f' {texto}', then=Value(3)),
+            default=Value(4),
+            output_field=IntegerField(),
+        )
+    ).order_by('relevancia', 'nombre')
+
+
+def buscar_productos_cacheado(consulta, propietario_id, productos=None, con_stock=False):
+    """
+    buscar_productos sobre el catálogo del propietario con los resultados en
+    la caché de búsqueda (possitema.cache_busqueda).
+
+    Solo se guardan los códigos en orden de relevancia; los productos se
+    leen de `productos` por clave primaria, así que precio y stock siempre
+    están al día.
+
+    Args:
+        con_stock: busca solo entre los productos con STOCK_ACTUAL > 0, en una
+            entrada de caché aparte. Los productos que se agotan después
+            siguen en la entrada hasta que expire, por eso quien lo usa
+            vuelve a filtrar el stock en `productos`; los que se reponen
+            aparecen al expirar (BUSQUEDA_CACHE_TTL).
+
+    Returns:
+        QuerySet de `productos` en orden de relevancia, sin cortar.
+    """
+    from possitema.cache_busqueda import CANDIDATOS_CACHE, buscar_en_cache, en_orden
+
+    def buscar():
+        catalogo = _filtrar_propietario(Producto.objects, propietario_id)
+        if con_stock:
+            catalogo = catalogo.annotate(stock_actual=STOCK_ACTUAL).filter(stock_actual__gt=0)
+        return buscar_productos(consulta, catalogo).values_list('pk', flat=True)[:CANDIDATOS_CACHE]
+
+    ids = buscar_en_cache('productos', propietario_id, consulta, buscar, 'con_stock' if con_stock else '')
+    return en_orden(productos if productos is not None else Producto.objects.all(), ids)
+
+
+# ===== CATÁLOGO LOCAL DEL POS =====
+
+def propietario_catalogo(usuario):
+    """Propietario cuyos productos ve el usuario; None (todo el catálogo) para staff."""
+    if usuario.is_staff or usuario.is_superuser:
+        return None
+    return usuario.pk
+
+
+def _filtrar_propietario(queryset, propietario_id):
+    return queryset if propietario_id is None else queryset.filter(user_id=propietario_id)
+
+
+def _incrementar_contador_catalogo(propietario_id):
+    """
+    Incrementa el contador de catálogo del propietario. El UPDATE deja la
+    fila bloqueada hasta que confirme la transacción del llamador: otra
+    escritura del mismo propietario espera y toma la versión siguiente, así
+    ninguna versión se hace visible antes que una menor y las deltas no
+    necesitan margen.
+    """
+    contador = ContadorCatalogo.objects.filter(pk=propietario_id or 0)
+    if not contador.update(version=F('version') + 1):
+        ContadorCatalogo.objects.get_or_create(pk=propietario_id or 0)
+        contador.update(version=F('version') + 1)
+    return contador
+
+
+def nueva_version_catalogo(propietario_id):
+    """Versión nueva del catálogo del propietario, tomada en la transacción actual."""
+    return _incrementar_contador_catalogo(propietario_id).values_list('version', flat=True).get()
+
+
+@transaction.atomic(savepoint=False)
+def marcar_cambios_catalogo(producto_pks):
+    """
+    Asigna una versión nueva del catálogo a productos ya escritos en la
+    transacción actual. Se llama después de escribir las filas: el producto
+    se bloquea antes que el contador, en el mismo orden que las ventas, y el
+    contador queda retenido el menor tiempo posible.
+    """
+    productos = Producto.objects.filter(pk__in=list(producto_pks))
+    propietarios = set(productos.values_list('user_id', flat=True))
+    if not propietarios:
+        return
+    # Contadores en orden fijo para que dos transacciones no se crucen
+    for propietario_id in sorted(propietarios, key=lambda p: p or 0):
+        _incrementar_contador_catalogo(propietario_id)
+    productos.update(version_catalogo=Subquery(
+        ContadorCatalogo.objects.filter(pk=Coalesce(OuterRef('user_id'), Value(0))).values('version')[:1]
+    ))
+
+
+def version_catalogo(propietario_id):
+    """
+    Versión actual del catálogo: el contador del propietario. Para todo el
+    catálogo (staff) es la suma de los contadores, que cambia con cada
+    confirmación pero no sirve para pedir deltas.
+    """
+    if propietario_id is None:
+        return ContadorCatalogo.objects.aggregate(v=Sum('version'))['v'] or 0
+    return ContadorCatalogo.objects.filter(pk=propietario_id).values_list('version', flat=True).first() or 0
+
+
+def catalogo_pos(propietario_id, desde=None):
+    """
+    Catálogo compacto de productos activos para que el POS busque localmente.
+
+    Sin `desde` devuelve todos los productos activos; con `desde` solo los
+    cambiados después de esa versión y los códigos que el POS debe quitar:
+    productos eliminados, inactivos o descontinuados. Todo el catálogo
+    (propietario None) siempre viaja completo. Cada producto es una lista en
+    el orden de CAMPOS_CATALOGO.
+    """
+    productos = _filtrar_propietario(Producto.objects, propietario_id)
+    bajas = []
+    if propietario_id is None:
+        desde = None
+    if desde is not None:
+        productos = productos.filter(version_catalogo__gt=desde)
+        bajas = list(
+            BajaCatalogo.objects.filter(user_id=propietario_id, version__gt=desde)
+            .values_list('id_producto', flat=True)
+        )
+        bajas += list(productos.exclude(estado='ACTIVO').values_list('id_producto', flat=True))
+    filas = productos.filter(estado='ACTIVO').order_by('nombre').values_list(
+        'id_producto', 'nombre', 'precio_venta', 'tarifa_iva', STOCK_ACTUAL
+    )
+    return {
+        'campos': CAMPOS_CATALOGO,
+        'completo': desde is None,
+        'productos': [[pk, nombre, float(precio), tarifa, stock] for pk, nombre, precio, tarifa, stock in filas],
+        'bajas': bajas,
+    }
+
+
+def anotar_estado_caducidad(productos, hoy=None):
+    """
+    Agrega a cada producto `dias_caducidad` (timedelta hasta la fecha de
+    caducidad, negativo si ya venció) y `badge_caducidad`, calculados en la
+    consulta con los mismos umbrales que Producto.estado_caducidad.
+    """
+    hoy = hoy or date.today()
+    return productos.annotate(
+        dias_caducidad=ExpressionWrapper(
+            F('fecha_caducidad') - Value(hoy, output_field=DateField()),
+            output_field=DurationField(),
+        ),
+        badge_caducidad=Case(
+            When(fecha_caducidad__isnull=True, then=Value('secondary')),
+            When(fecha_caducidad__lte=hoy + timedelta(days=DIAS_CADUCIDAD_CRITICA), then=Value('danger')),
+            When(fecha_caducidad__lte=hoy + timedelta(days=DIAS_CADUCIDAD_PROXIMA), then=Value('warning')),
+            default=Value('info'),
+            output_field=CharField(),
+        ),
+    )
+
+
+# ===== SELECTOR DE PRODUCTOS DE COMPRAS =====
+
+def _anotar_ultima_compra(productos, proveedor_id):
+    """Costo y fecha de la última compra de cada producto al proveedor."""
+    ultima = DetalleCompra.objects.filter(
+        producto=OuterRef('pk'), compra__proveedor_id=proveedor_id,
+    ).order_by('-compra__fecha_compra', '-pk')
+    return productos.annotate(
+        ultimo_costo=Subquery(ultima.values('costo_unitario')[:1]),
+        ultima_compra=Subquery(ultima.values('compra__fecha_compra')[:1]),
+    )
+
+
+def productos_para_compra(consulta, proveedor_id=None, limite=SUGERENCIAS_COMPRA):
+    """
+    Productos para una línea del formulario de compras.
+
+    Con `consulta` se usa la búsqueda del catálogo y, entre los candidatos,
+    van primero los que ya se le compraron al proveedor. Sin `consulta` se
+    sugieren los últimos productos comprados a ese proveedor. Cada fila lleva
+    el último costo pagado al proveedor (None si nunca se le compró) para
+    prellenar el costo unitario.
+
+    Returns:
+        Lista de diccionarios con id_producto, nombre, precio_costo,
+        cantidad, ultimo_costo y ultima_compra.
+    """
+    from possitema.cache_busqueda import en_orden
+
+    campos = ('id_producto', 'nombre', 'precio_costo', 'cantidad', 'ultimo_costo', 'ultima_compra')
+    if consulta.strip():
+        productos = buscar_productos_cacheado(consulta, None)
+        if not proveedor_id:
+            return list(productos.values(*campos[:4])[:limite])
+        filas = list(_anotar_ultima_compra(productos, proveedor_id).values(*campos))
+        # Orden estable: se conserva la relevancia dentro de cada grupo
+        filas.sort(key=lambda fila: fila['ultima_compra'] is None)
+        return filas[:limite]
+
+    if not proveedor_id:
+        return []
+    recientes = list(
+        DetalleCompra.objects.filter(compra__proveedor_id=proveedor_id)
+        .values('producto_id').annotate(ultima=Max('compra__fecha_compra'))
+        .order_by('-ultima').values_list('producto_id', flat=True)[:limite]
+    )
+    return list(_anotar_ultima_compra(en_orden(Producto.objects.all(), recientes), proveedor_id).values(*campos))
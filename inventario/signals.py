@@ -1,7 +1,82 @@
 # inventario/signals.py
-from django.db.models.signals import post_save
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import Compra, DetalleCompra
+from possitema.cache_busqueda import invalidar_busquedas
+from .alertas import invalidar_alertas
+from .codigos_barras import invalidar_automata
+from .models import BajaCatalogo, Compra, DetalleCompra, Producto
+from .services import fijar_stock_fragmentos, nueva_version_catalogo, registrar_movimientos, reponer_stock
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(pre_save, sender=Producto)
+def calcular_ajuste_fragmentos(sender, instance, update_fields=None, **kwargs):
+    """
+    En productos con stock fragmentado, 'cantidad' se edita como el stock
+    total deseado. Si el guardado la escribe y cambió respecto a la leída, se
+    anota para repartirla entre los fragmentos después de guardar; guardar
+    una instancia vieja solo para cambiar nombre o precio no toca el stock.
+    """
+    instance._stock_fragmentos = None
+    if not instance.stock_fragmentado or not instance.pk:
+        return
+    if update_fields is not None and 'cantidad' not in update_fields:
+        return
+    if getattr(instance, '_cantidad_cargada', None) == instance.cantidad:
+        return
+    instance._stock_fragmentos = instance.cantidad
+
+
+@receiver(post_save, sender=Producto)
+def aplicar_ajuste_fragmentos(sender, instance, **kwargs):
+    cantidad = getattr(instance, '_stock_fragmentos', None)
+    if cantidad is not None:
+        fijar_stock_fragmentos(instance.pk, cantidad)
+        instance._stock_fragmentos = None
+        instance._cantidad_cargada = cantidad
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_automata_codigos(sender, instance, **kwargs):
+    """Los códigos del propietario cambiaron: el autómata se rearma al próximo escaneo."""
+    propietario_id = instance.user_id
+    transaction.on_commit(lambda: invalidar_automata(propietario_id))
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_busquedas_productos(sender, instance, **kwargs):
+    """
+    Nombre, código o estado pudieron cambiar: se descartan las búsquedas
+    guardadas. Los cambios de stock (UPDATE en masa) no pasan por aquí, ya que
+    la caché solo guarda códigos y el stock se lee al responder.
+    """
+    propietario_id = instance.user_id
+    transaction.on_commit(lambda: invalidar_busquedas('productos', propietario_id))
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Compra)
+@receiver(post_delete, sender=Compra)
+def invalidar_alertas_propietario(sender, instance, **kwargs):
+    """Caducidad, bajo stock o pagos pendientes pudieron cambiar: se recalcula el resumen de alertas."""
+    invalidar_alertas(instance.user_id)
+
+
+@receiver(post_delete, sender=Producto)
+def registrar_baja_catalogo(sender, instance, **kwargs):
+    """El POS quita el producto de su catálogo local en la próxima sincronización."""
+    # Corre dentro de la transacción del borrado: el contador queda bloqueado hasta confirmarlo
+    BajaCatalogo.objects.create(
+        user_id=instance.user_id, id_producto=instance.pk,
+        version=nueva_version_catalogo(instance.user_id),
+    )
 
 @receiver(post_save, sender=Compra)
 def actualizar_stock_en_recepcion(sender, instance, created, **kwargs):
@@ -9,20 +84,26 @@ def actualizar_stock_en_recepcion(sender, instance, created, **kwargs):
     Signal que se dispara cuando se guarda una Compra.
     Si el estado es 'RECIBIDA', actualiza el stock de los productos.
     Solo incrementa una vez por detalle (usando el campo stock_actualizado).
+    El stock, el kardex y la marca de los detalles se escriben en masa.
     """
     # Solo procesar si la compra existe en la BD y está en estado RECIBIDA
     if instance.estado == 'RECIBIDA':
-        # Obtener todos los detalles de esta compra que aún no hayan actualizado su stock
-        detalles = DetalleCompra.objects.filter(compra=instance, stock_actualizado=False)
-        
-        for detalle in detalles:
-            # Incrementar la cantidad del producto
-            producto = detalle.producto
-            producto.cantidad += detalle.cantidad_recibida
-            producto.save()
-            
-            # Marcar este detalle como actualizado para evitar doble incremento
-            detalle.stock_actualizado = True
-            detalle.save()
-            
-            print(f"✅ Stock actualizado: {producto.nombre} (+{detalle.cantidad_recibida} unidades). Nuevo stock: {producto.cantidad}")
+        with transaction.atomic():
+            # Detalles que aún no sumaron su stock (bloqueados para no sumar dos veces)
+            detalles = list(
+                DetalleCompra.objects.select_for_update().filter(compra=instance, stock_actualizado=False)
+                .values_list('id', 'producto_id', 'cantidad_recibida')
+            )
+            if not detalles:
+                return
+
+            cantidades = {}
+            for _, producto_id, cantidad_recibida in detalles:
+                cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad_recibida
+
+            reponer_stock(cantidades)
+            registrar_movimientos(cantidades, 'COMPRA', usuario=instance.user, referencia=f"Compra #{instance.pk}")
+            # Marcar los detalles como actualizados para evitar doble incremento
+            DetalleCompra.objects.filter(id__in=[d[0] for d in detalles]).update(stock_actualizado=True)
+
+        logger.info('Stock actualizado por la compra #%s: %s productos.', instance.pk, len(cantidades))
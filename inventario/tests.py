@@ -1,3 +1,190 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Categoria, Compra, DetalleCompra, MovimientoInventario, Producto, Proveedor
+from .services import anotar_estado_caducidad, buscar_productos, productos_para_compra, generar_snapshots_stock, kardex_producto, registrar_movimientos, stock_a_fecha
+
+
+class KardexTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='bodega', password='x')
+        self.producto = Producto.objects.create(id_producto='K1', user=self.user, nombre='Aceite',
+                                                precio_costo=Decimal('2.00'), precio_venta=Decimal('3.00'), cantidad=10)
+        self.t0 = timezone.now() - timedelta(days=3)
+        registrar_movimientos({'K1': 10}, 'INICIAL', fecha=self.t0)
+        registrar_movimientos({'K1': -4}, 'VENTA', fecha=self.t0 + timedelta(days=1))
+        registrar_movimientos({'K1': 6}, 'COMPRA', fecha=self.t0 + timedelta(days=2))
+
+    def test_stock_a_fecha_usa_snapshot_mas_movimientos(self):
+        self.assertEqual(stock_a_fecha(self.producto, self.t0 + timedelta(hours=36)), 6)
+        generar_snapshots_stock(self.t0 + timedelta(hours=36))
+        # Un movimiento anterior al snapshot ya no se vuelve a sumar
+        MovimientoInventario.objects.filter(tipo='INICIAL').delete()
+        self.assertEqual(stock_a_fecha(self.producto, timezone.now()), 12)
+
+        saldo_inicial, filas, saldo_final = kardex_producto(self.producto, self.t0 + timedelta(hours=36), timezone.now())
+        self.assertEqual((saldo_inicial, len(filas), saldo_final), (6, 1, 12))
+
+    def test_movimientos_no_se_modifican(self):
+        movimiento = MovimientoInventario.objects.first()
+        movimiento.cantidad = 99
+        with self.assertRaises(ValueError):
+            movimiento.save()
+
+
+class BuscarProductosTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='bodega', password='x')
+        for pk, nombre in [('CAF1', 'Café Orgánico'), ('X9', 'Galletas de café'), ('CAF', 'Azúcar morena')]:
+            Producto.objects.create(id_producto=pk, user=user, nombre=nombre,
+                                    precio_costo=Decimal('1.00'), precio_venta=Decimal('2.00'), cantidad=5)
+
+    def _buscar(self, consulta):
+        return list(buscar_productos(consulta).values_list('pk', flat=True))
+
+    def test_ignora_tildes_y_mayusculas_y_exige_todas_las_palabras(self):
+        self.assertEqual(self._buscar('CAFE organico'), ['CAF1'])
+        self.assertEqual(self._buscar('azucar'), ['CAF'])
+
+    def test_codigo_exacto_primero_y_luego_prefijos(self):
+        self.assertEqual(self._buscar('caf'), ['CAF', 'CAF1', 'X9'])
+
+    def test_renombrar_actualiza_el_texto_de_busqueda(self):
+        producto = Producto.objects.get(pk='X9')
+        producto.nombre = 'Galletas de avena'
+        producto.save(update_fields=['nombre'])
+        self.assertEqual(self._buscar('avena'), ['X9'])
+
+
+class AutomataCodigosTestCase(TestCase):
+    def test_codigos_dentro_del_texto_escaneado(self):
+        from .codigos_barras import AutomataCodigos
+
+        automata = AutomataCodigos(['7861234', '786', '1234', 'BTP001'])
+        self.assertEqual(automata.buscar('7861234'), ['7861234', '1234', '786'])  # exacto
+        self.assertEqual(automata.buscar(']C1BTP001'), ['BTP001'])                # prefijo del lector
+        self.assertEqual(automata.buscar('BTP001\r\n'), ['BTP001'])               # sufijo
+        self.assertEqual(automata.buscar('xx1234yy786'), ['1234', '786'])
+        self.assertEqual(automata.buscar('BTP00'), [])
+
+
+class ListaProductosTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin_lista', password='x')
+        self.categoria = Categoria.objects.create(nombre='Bebidas')
+        self.client.force_login(self.user)
+
+    def _crear(self, desde, hasta):
+        hoy = timezone.localdate()
+        Producto.objects.bulk_create([
+            Producto(id_producto=f'P{i:03d}', user=self.user, nombre=f'Producto {i:03d}', categoria=self.categoria,
+                     precio_costo=Decimal('1.00'), precio_venta=Decimal('2.00'), cantidad=i % 4,
+                     fecha_caducidad=hoy + timedelta(days=i - 5), busqueda=f'producto {i:03d}')
+            for i in range(desde, hasta)
+        ])
+
+    def _consultas(self, **parametros):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('inventario:lista'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas), respuesta
+
+    def test_consultas_constantes_y_metricas_en_un_aggregate(self):
+        self._crear(0, 5)
+        pocas, _ = self._consultas()
+        self._crear(5, 80)
+        muchas, respuesta = self._consultas(stock='disponible', orden='-stock', page=2)
+        self.assertEqual(pocas, muchas)
+        self.assertEqual(respuesta.context['total_productos'], 80)
+        self.assertEqual(respuesta.context['resultados'], 60)
+        self.assertEqual(respuesta.context['total_stock'], 20 * (1 + 2 + 3))
+        self.assertEqual(len(respuesta.context['productos']), 25)
+        stock = [p.cantidad for p in respuesta.context['productos']]
+        self.assertEqual(stock, [2] * 15 + [1] * 10)
+
+    def test_estado_caducidad_anotado_coincide_con_la_propiedad(self):
+        self._crear(0, 40)
+        for producto in anotar_estado_caducidad(Producto.objects.all()):
+            estado = producto.estado_caducidad
+            self.assertEqual(producto.badge_caducidad, estado['badge'])
+            self.assertEqual(abs(producto.dias_caducidad.days), estado['dias_restantes'])
+
+
+class ProductosParaCompraTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+        user = User.objects.create_user(username='compras', password='x')
+        for pk, nombre in [('ARZ1', 'Arroz blanco'), ('ARZ2', 'Arroz integral'), ('ACE', 'Aceite')]:
+            Producto.objects.create(id_producto=pk, user=user, nombre=nombre,
+                                    precio_costo=Decimal('1.00'), precio_venta=Decimal('2.00'), cantidad=0)
+        self.proveedor = Proveedor.objects.create(id_proveedor='PRV1', nombre='Distribuidora', contacto='-',
+                                                  telefono='-', email='d@example.com')
+        for pk, costo in [('ARZ2', '1.40'), ('ACE', '3.10'), ('ARZ2', '1.35')]:
+            compra = Compra.objects.create(user=user, proveedor=self.proveedor)
+            DetalleCompra.objects.create(compra=compra, producto_id=pk, cantidad_recibida=1,
+                                         costo_unitario=Decimal(costo))
+
+    def test_sin_texto_sugiere_lo_ultimo_comprado_al_proveedor(self):
+        filas = productos_para_compra('', 'PRV1')
+        self.assertEqual([(f['id_producto'], f['ultimo_costo']) for f in filas],
+                         [('ARZ2', Decimal('1.35')), ('ACE', Decimal('3.10'))])
+        self.assertEqual(productos_para_compra('', None), [])
+
+    def test_busqueda_pone_primero_lo_comprado_al_proveedor(self):
+        self.assertEqual([f['id_producto'] for f in productos_para_compra('arroz', None)], ['ARZ1', 'ARZ2'])
+        filas = productos_para_compra('arroz', 'PRV1')
+        self.assertEqual([(f['id_producto'], f['ultimo_costo']) for f in filas],
+                         [('ARZ2', Decimal('1.35')), ('ARZ1', None)])
+
+
+class AlertasTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_superuser(username='dueno', password='x')
+        otro = User.objects.create_user(username='otro', password='x')
+        hoy = timezone.localdate()
+        Producto.objects.create(id_producto='L1', user=self.user, nombre='Leche', precio_costo=Decimal('1.00'),
+                                precio_venta=Decimal('1.50'), cantidad=3, fecha_caducidad=hoy + timedelta(days=2))
+        Producto.objects.create(id_producto='X1', user=otro, nombre='Ajeno', precio_costo=Decimal('1.00'),
+                                precio_venta=Decimal('1.50'), cantidad=1)
+        Compra.objects.create(user=self.user, fecha_pago_proveedor=hoy, total=Decimal('20.00'))
+        self.client.force_login(self.user)
+        self.url = reverse('inventario:alertas_ajax')
+
+    def test_una_respuesta_con_las_tres_secciones_del_propietario(self):
+        datos = self.client.get(self.url).json()
+        self.assertEqual([a['id'] for a in datos['caducidad']['alertas']], ['L1'])
+        self.assertEqual(datos['caducidad']['alertas'][0]['dias_restantes'], 2)
+        self.assertEqual(datos['compras']['count'], 1)
+        self.assertEqual([p['id'] for p in datos['bajo_stock']['productos']], ['L1'])
+
+    def test_sin_cambios_lee_la_cache_y_responde_304(self):
+        from .alertas import alertas_en_cache
+
+        respuesta = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            alertas_en_cache(self.user)
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta.content, b'')
 
-# Create your tests here.
+    def test_movimiento_de_stock_invalida_el_resumen(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.filter(pk='L1').update(cantidad=50)
+            registrar_movimientos({'L1': 47}, 'AJUSTE', usuario=self.user)
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['bajo_stock']['count'], 0)
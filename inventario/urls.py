@@ -27,6 +27,7 @@ urlpatterns = [
     path('producto/<str:pk>/editar/', views.editar_producto, name='editar'),
     path('producto/<str:pk>/eliminar/', views.eliminar_producto, name='eliminar'),
     path('producto/<str:pk>/detalle/', views.detalle_producto, name='detalle'),
+    path('producto/<str:pk>/kardex/', views.kardex_producto, name='kardex'),
     
     # Ruta de QR
     path('producto/<str:pk>/qr/', views.generar_qr_producto, name='producto_qr_imprimir'),
@@ -53,18 +54,13 @@ urlpatterns = [
     #notficacio de producto por vencer
     path('productos_por_vencer/', views.get_productos_por_vencer, name='productos_por_vencer'),
     
-    # Alertas de caducidad AJAX
-    path('alertas_caducidad_ajax/', views.get_alertas_caducidad_ajax, name='alertas_caducidad_ajax'),
-    
-    # Alertas de compras pendientes AJAX
-    path('alertas_compras_ajax/', views.get_alertas_compras_ajax, name='alertas_compras_ajax'),
-    
-    # Alertas de bajo stock AJAX
-    path('alertas_bajo_stock_ajax/', views.get_alertas_bajo_stock_ajax, name='alertas_bajo_stock_ajax'),
+    # Alertas de caducidad, compras pendientes y bajo stock AJAX
+    path('alertas_ajax/', views.alertas_ajax, name='alertas_ajax'),
     
     # Compras
     path('compras/', views.lista_compras, name='lista_compras'),
     path('compras/crear/', views.crear_compra, name='crear_compra'),
+    path('compras/productos/', views.productos_compra_ajax, name='productos_compra_ajax'),
     path('compras/<int:pk>/editar/', views.editar_compra, name='editar_compra'),
     path('compras/<int:pk>/qr/', views.generar_qr_compra, name='generar_qr_compra'),
     path('detalles-compras/', views.lista_detalles_compra, name='lista_detalles_compra'),
@@ -1,12 +1,18 @@
 from django.shortcuts import render
 # inventario/views.py
 from django.http import JsonResponse
+from django.db import transaction
 from django.db.models import Q, F
 from django.contrib.auth.decorators import login_required, permission_required
-from .models import Producto, Proveedor, Categoria, Compra, DetalleCompra
+from .models import BAJO_STOCK_UMBRAL, Producto, Proveedor, Categoria, Compra, DetalleCompra
 from .forms import ProductoForm, ProveedorForm, CategoriaForm, ExcelUploadForm
+from .services import (
+    STOCK_ACTUAL, anotar_estado_caducidad, buscar_productos, buscar_productos_cacheado, productos_para_compra,
+    registrar_movimientos,
+)
 from django.shortcuts import render, redirect, get_object_or_404
 from django.db.models import Sum, Count
+from django.core.paginator import Paginator
 import json 
 import openpyxl
 import logging
@@ -22,8 +28,17 @@ from finanzas.models import CuentaPorPagar
 
 logger = logging.getLogger(__name__)
 
-BAJO_STOCK_UMBRAL = 5
 DIAS_ALERTA_CADUCIDAD = 30  # Alerta cuando falta 30 días o menos para vencer
+PRODUCTOS_POR_PAGINA = 25
+# Valores aceptados en ?orden= de la lista de productos (con '-' descendente)
+ORDEN_PRODUCTOS = {
+    'id': 'id_producto',
+    'nombre': 'nombre',
+    'precio': 'precio_venta',
+    'stock': 'cantidad',
+    'categoria': 'categoria__nombre',
+    'caducidad': 'fecha_caducidad',
+}
 
 
 def _obtener_metodos_pago_compra():
@@ -65,14 +80,16 @@ def buscar_producto_ajax(request):
             
             # 2. Buscar productos usando la 'query'
             # Se busca por nombre o el Primary Key (pk) del producto.
-            productos = Producto.objects.filter(
-                user=request.user,
-                nombre__icontains=query,
-                cantidad__gt=0
-            ).values('id_producto', 'nombre', 'precio_venta', 'cantidad')[:10]
+            productos = buscar_productos_cacheado(
+                query, request.user.pk,
+                Producto.objects.annotate(stock_actual=STOCK_ACTUAL).filter(stock_actual__gt=0), con_stock=True,
+            ).values_list('id_producto', 'nombre', 'precio_venta', 'stock_actual')[:10]
             
             # Convertir el QuerySet a una lista para el JSON
-            lista_productos = list(productos)
+            lista_productos = [
+                {'id_producto': pk, 'nombre': nombre, 'precio_venta': precio, 'cantidad': stock}
+                for pk, nombre, precio, stock in productos
+            ]
             
             return JsonResponse({'productos': lista_productos})
         
@@ -96,11 +113,9 @@ def buscar_productos_api(request):
             return JsonResponse({'productos': []})
         
         # Buscar productos
-        from django.db.models import Q
-        productos = Producto.objects.filter(
-            Q(nombre__icontains=q) | Q(id_producto__icontains=q),
-            cantidad__gt=0
-        ).order_by('nombre').values('id_producto', 'nombre', 'precio_venta', 'cantidad')[:15]
+        productos = buscar_productos(
+            q, Producto.objects.annotate(stock_actual=STOCK_ACTUAL).filter(stock_actual__gt=0)
+        ).values('id_producto', 'nombre', 'precio_venta', 'stock_actual')[:15]
         
         # Convertir a lista de diccionarios
         productos_list = []
@@ -109,7 +124,7 @@ def buscar_productos_api(request):
                 'id': str(p['id_producto']),
                 'nombre': p['nombre'],
                 'precio': float(p['precio_venta']),
-                'cantidad_disponible': int(p['cantidad'])
+                'cantidad_disponible': int(p['stock_actual'])
             })
         
         return JsonResponse({'productos': productos_list})
@@ -121,65 +136,88 @@ def buscar_productos_api(request):
 @login_required
 @permission_required('inventario.view_producto', raise_exception=True)
 def productos_lista(request):
-    """Muestra la lista de productos."""
-    productos = Producto.objects.all()
-    
+    """
+    Lista paginada de productos con orden del lado del servidor.
+
+    Todas las métricas de los cuadros salen de un solo aggregate con
+    condiciones, y la página solo trae PRODUCTOS_POR_PAGINA filas con su
+    categoría y su estado de caducidad ya calculados en la consulta.
+    """
     # Motor de búsqueda
     query = request.GET.get('q', '').strip()
     categoria_filtro = request.GET.get('categoria', '').strip()
     stock_filtro = request.GET.get('stock', '').strip()
-    
+
+    filtro = Q()
     if query:
-        productos = productos.filter(
+        filtro &= (
             Q(nombre__icontains=query) |
             Q(id_producto__icontains=query) |
             Q(descripcion__icontains=query)
         )
-    
-    if categoria_filtro:
-        productos = productos.filter(categoria__id=categoria_filtro)
-    
+
+    if categoria_filtro.isdigit():
+        filtro &= Q(categoria_id=categoria_filtro)
+
     if stock_filtro == 'bajo':
-        productos = productos.filter(cantidad__lte=BAJO_STOCK_UMBRAL)
+        filtro &= Q(cantidad__lte=BAJO_STOCK_UMBRAL)
     elif stock_filtro == 'sin':
-        productos = productos.filter(cantidad=0)
+        filtro &= Q(cantidad=0)
     elif stock_filtro == 'disponible':
-        productos = productos.filter(cantidad__gt=0)
-    
+        filtro &= Q(cantidad__gt=0)
+
     # Obtener categorías para el filtro
     categorias = Categoria.objects.all()
-    
-    # 2. Calcular métricas para los cuadros (Info Boxes)
-    total_productos = Producto.objects.count()
-    
-    # Opcional: Calcular el valor total del inventario (si tienes precio_costo o precio_venta)
-    # Asumiendo que el campo de stock es 'cantidad' y el de precio es 'precio_venta'
-    valor_inventario = productos.aggregate(total=Sum('precio_venta', default=0))['total']
-    
-    # Calcular el total de unidades en stock
-    total_stock = productos.aggregate(total=Sum('cantidad', default=0))['total']
 
-    # Contar productos con bajo stock
-    productos_bajo_stock = productos.filter(cantidad__lte=BAJO_STOCK_UMBRAL).count()
-    
-    # Contar productos próximos a vencer
-    productos_proximos_a_vencer = get_productos_por_vencer(None).count()  # Ajusta la función para no filtrar por usuario
-    
+    # Métricas para los cuadros (Info Boxes) en una sola consulta: el total
+    # y los próximos a vencer son de todo el catálogo, el resto del filtro
+    fecha_limite = date.today() + timedelta(days=DIAS_ALERTA_CADUCIDAD)
+    metricas = Producto.objects.aggregate(
+        total_productos=Count('pk'),
+        resultados=Count('pk', filter=filtro),
+        valor_inventario=Sum('precio_venta', filter=filtro, default=0),
+        total_stock=Sum('cantidad', filter=filtro, default=0),
+        productos_bajo_stock=Count('pk', filter=filtro & Q(cantidad__lte=BAJO_STOCK_UMBRAL)),
+        productos_proximos_a_vencer=Count('pk', filter=Q(
+            fecha_caducidad__isnull=False, fecha_caducidad__lte=fecha_limite,
+        ) & ~Q(cantidad=0)),
+    )
+
+    orden = request.GET.get('orden', '')
+    if orden.lstrip('-') not in ORDEN_PRODUCTOS:
+        orden = 'nombre'
+    campo_orden = ORDEN_PRODUCTOS[orden.lstrip('-')]
+    if orden.startswith('-'):
+        campo_orden = '-' + campo_orden
+
+    productos = anotar_estado_caducidad(
+        Producto.objects.filter(filtro).select_related('categoria').order_by(campo_orden, 'pk')
+    )
+    paginator = Paginator(productos, PRODUCTOS_POR_PAGINA)
+    # El conteo ya vino en el aggregate: evita el COUNT(*) del Paginator
+    paginator.count = metricas['resultados']
+    page_obj = paginator.get_page(request.GET.get('page'))
+
     context = {
-        'productos': productos,
+        'productos': page_obj.object_list,
+        'page_obj': page_obj,
+        'paginator': paginator,
+        'is_paginated': page_obj.has_other_pages(),
+        'paginas': paginator.get_elided_page_range(page_obj.number),
+        'orden': orden,
         # Métricas para los cuadros
-        'total_productos': total_productos,
-        'valor_inventario': valor_inventario,
-        'total_stock': total_stock,
-        'productos_bajo_stock': productos_bajo_stock,
-        'productos_proximos_a_vencer': productos_proximos_a_vencer,
+        'total_productos': metricas['total_productos'],
+        'resultados': metricas['resultados'],
+        'valor_inventario': metricas['valor_inventario'],
+        'total_stock': metricas['total_stock'],
+        'productos_bajo_stock': metricas['productos_bajo_stock'],
+        'productos_proximos_a_vencer': metricas['productos_proximos_a_vencer'],
         # Búsqueda y filtros
         'query': query,
         'categorias': categorias,
         'categoria_filtro': categoria_filtro,
         'stock_filtro': stock_filtro,
     }
-    # Asegúrate de que tienes un template en inventario/templates/inventario/lista_productos.html
     return render(request, 'inventario/lista_productos.html', context)
 
 @login_required
@@ -193,6 +231,7 @@ def producto_crear(request):
             producto = form.save(commit=False)
             producto.user = request.user
             producto.save()
+            registrar_movimientos({producto.pk: producto.cantidad}, 'INICIAL', usuario=request.user)
             return redirect('inventario:lista')
     else:
         form = ProductoForm()
@@ -286,6 +325,44 @@ def detalle_producto(request, pk):
     return render(request, 'inventario/detalle_producto.html', {'producto': producto})
 
 
+@login_required
+@permission_required('inventario.view_producto', raise_exception=True)
+def kardex_producto(request, pk):
+    """
+    Kardex de un producto en un rango de fechas (por defecto, últimos 30 días).
+    El saldo inicial sale del último snapshot de stock más los movimientos
+    posteriores, sin recorrer todo el historial.
+    """
+    from datetime import datetime, time
+    from django.utils import timezone
+    from .services import kardex_producto as calcular_kardex
+
+    producto = get_object_or_404(Producto, pk=pk)
+    hoy = timezone.localdate()
+    try:
+        desde = date.fromisoformat(request.GET.get('desde', ''))
+    except ValueError:
+        desde = hoy - timedelta(days=30)
+    try:
+        hasta = date.fromisoformat(request.GET.get('hasta', ''))
+    except ValueError:
+        hasta = hoy
+
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta, time.max))
+    saldo_inicial, movimientos, saldo_final = calcular_kardex(producto, inicio, fin)
+
+    context = {
+        'producto': producto,
+        'desde': desde,
+        'hasta': hasta,
+        'saldo_inicial': saldo_inicial,
+        'movimientos': movimientos,
+        'saldo_final': saldo_final,
+    }
+    return render(request, 'inventario/kardex_producto.html', context)
+
+
 # 🛑 ÚNICA DEFINICIÓN DE LA VISTA QR 
 @login_required
 def generar_qr_producto(request, pk):
@@ -322,9 +399,15 @@ def editar_producto(request, pk):
     
     # Manejar el envío del formulario
     if request.method == 'POST':
+        cantidad_anterior = producto.cantidad
         form = ProductoForm(request.POST, instance=producto)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                producto = form.save()
+                registrar_movimientos(
+                    {producto.pk: producto.cantidad - cantidad_anterior}, 'AJUSTE',
+                    usuario=request.user, referencia='Edición de producto',
+                )
             # Si es AJAX (desde la modal), solo devolvemos una respuesta de éxito 200
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
                 return HttpResponse(status=200)
@@ -454,120 +537,26 @@ def dashboard_view(request):
     return render(request, 'base.html', context)
 
 @login_required
-def get_alertas_caducidad_ajax(request):
-    from datetime import date
-    if request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.method == 'GET':
-        dias_alerta = int(request.GET.get('dias_alerta', 30))
-        productos_por_vencer = get_productos_por_vencer(request.user, dias_alerta)
-        
-        alertas = []
-        for producto in productos_por_vencer:
-            if producto.fecha_caducidad:
-                dias_restantes = (producto.fecha_caducidad - date.today()).days
-                alertas.append({
-                    'id': producto.id_producto,
-                    'nombre': producto.nombre,
-                    'fecha_caducidad': str(producto.fecha_caducidad),
-                    'cantidad': producto.cantidad,
-                    'dias_restantes': dias_restantes
-                })
-        
-        return JsonResponse({
-            'count': len(alertas),
-            'alertas': alertas
-        })
-
-@login_required
-@permission_required('inventario.view_compra', raise_exception=True)
-def get_alertas_compras_ajax(request):
-    """Obtiene las compras pendientes de pago a través de AJAX."""
-    from datetime import date, timedelta
-    from .models import Compra
-    
-    try:
-        # Obtener compras que tengan fecha de pago proveedor asignada y NO estén en estado PAGADA o CANCELADA
-        compras_pendientes = Compra.objects.filter(
-            user=request.user,
-            fecha_pago_proveedor__isnull=False
-        ).exclude(
-            estado__in=['PAGADA', 'CANCELADA']
-        ).order_by('fecha_pago_proveedor')
-        
-        alertas = []
-        hoy = date.today()
-        
-        for compra in compras_pendientes:
-            dias_restantes = (compra.fecha_pago_proveedor - hoy).days
-            
-            # Mostrar todas las compras con fecha de pago, sin importar los días
-            alertas.append({
-                'id': compra.id_compra,
-                'numero': compra.numero_documento or f'Compra #{compra.id_compra}',
-                'proveedor': compra.proveedor.nombre if compra.proveedor else 'Sin proveedor',
-                'fecha_pago': str(compra.fecha_pago_proveedor),
-                'dias_restantes': dias_restantes,
-                'monto': str(compra.total),
-                'url_editar': f'/inventario/compras/{compra.id_compra}/editar/'
-            })
-        
-        return JsonResponse({
-            'count': len(alertas),
-            'alertas': alertas
-        })
-    except Exception as e:
-        import traceback
-        logger.error('Error en get_alertas_compras_ajax: %s', str(e), exc_info=True)
-        return JsonResponse({
-            'count': 0,
-            'alertas': [],
-            'error': str(e)
-        }, status=500)
-
-
-def get_alertas_bajo_stock_ajax(request):
-    """Obtiene los productos con bajo stock a través de AJAX."""
-    from .models import Producto
-    
-    try:
-        logger.debug('get_alertas_bajo_stock_ajax llamado')
-        
-        # Obtener productos con cantidad <= BAJO_STOCK_UMBRAL (definido al inicio del archivo)
-        # El umbral es consistente con el dashboard (5 unidades)
-        UMBRAL_BAJO_STOCK = BAJO_STOCK_UMBRAL  # 5 unidades
-        productos_bajo_stock = Producto.objects.filter(
-            estado='ACTIVO',
-            cantidad__lte=UMBRAL_BAJO_STOCK
-        ).order_by('cantidad')
-        
-        logger.debug('Productos encontrados (cantidad <= %d): %d', UMBRAL_BAJO_STOCK, productos_bajo_stock.count())
-        
-        productos_list = []
-        for producto in productos_bajo_stock:
-            productos_list.append({
-                'id': producto.id_producto,
-                'nombre': producto.nombre,
-                'sku': producto.id_producto,
-                'cantidad': producto.cantidad
-            })
-        
-        response_data = {
-            'count': len(productos_list),
-            'productos': productos_list
-        }
-        logger.debug('Respuesta count: %d', response_data['count'])
-        
-        return JsonResponse(response_data)
-    except Exception as e:
-        import traceback
-        error_msg = f"Error en get_alertas_bajo_stock_ajax: {str(e)}"
-        logger.error(error_msg, exc_info=True)
-        return JsonResponse({
-            'count': 0,
-            'productos': [],
-            'error': error_msg
-        }, status=500)
-
-
+def alertas_ajax(request):
+    """
+    Alertas de la barra superior (caducidad, compras por pagar y stock bajo)
+    en una sola respuesta, desde el resumen en caché del propietario (ver
+    inventario.alertas). Si el navegador envía el ETag vigente, responde 304.
+    """
+    from django.http import HttpResponseNotModified
+    from django.utils.cache import patch_cache_control
+    from django.utils.http import parse_etags
+    from .alertas import alertas_en_cache
+
+    contenido, etag = alertas_en_cache(request.user)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(contenido, content_type='application/json')
+    response['ETag'] = etag
+    # El navegador guarda la respuesta pero la revalida en cada consulta
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 # --- VISTAS PARA COMPRAS Y DETALLES DE COMPRAS ---
@@ -576,10 +565,10 @@ def get_alertas_bajo_stock_ajax(request):
 @permission_required('inventario.view_compra', raise_exception=True)
 def lista_compras(request):
     """Muestra el listado de todas las compras registradas."""
-    from django.core.paginator import Paginator
+    from possitema.paginacion import paginar_por_cursor
     from .models import Compra
     
-    compras_list = Compra.objects.all().order_by('-fecha_compra')
+    compras_list = Compra.objects.select_related('proveedor')
     
     # Motor de búsqueda
     query = request.GET.get('q', '').strip()
@@ -603,25 +592,16 @@ def lista_compras(request):
     if fecha_hasta:
         compras_list = compras_list.filter(fecha_compra__date__lte=fecha_hasta)
     
-    # Paginación
-    paginator = Paginator(compras_list, 10)
-    page_number = request.GET.get('page')
-    compras = paginator.get_page(page_number)
-    
-    # Query string sin 'page' para paginación
-    query_params = request.GET.copy()
-    if 'page' in query_params:
-        del query_params['page']
-    query_string = query_params.urlencode()
+    # Paginación por cursor sobre (fecha_compra, pk)
+    compras = paginar_por_cursor(compras_list, request, 'fecha_compra', 10)
     
     context = {
         'compras': compras,
-        'paginator': paginator,
         'query': query,
         'estado_filtro': estado_filtro,
         'fecha_desde': fecha_desde,
         'fecha_hasta': fecha_hasta,
-        'query_string': query_string,
+        'query_string': compras.query_string,
     }
     return render(request, 'inventario/lista_compras.html', context)
 
@@ -727,25 +707,51 @@ def crear_compra(request):
     from .models import Proveedor, MetodoPagoCompra
     
     proveedores = Proveedor.objects.all()
-    productos = Producto.objects.all()  # Mostrar todos los productos, incluso los agotados
+    # Los productos se buscan con productos_compra_ajax al escribir en cada línea
     metodos_pago = _obtener_metodos_pago_compra()
     
     context = {
         'proveedores': proveedores,
-        'productos': productos,
         'metodos_pago': metodos_pago,
     }
     return render(request, 'inventario/crear_compra.html', context)
 
 
+@login_required
+def productos_compra_ajax(request):
+    """
+    Productos para el selector de las líneas de compra (formato de Select2).
+
+    Parámetros GET: `q` (texto escrito) y `proveedor`; sin texto devuelve los
+    últimos productos comprados a ese proveedor. Incluye los agotados.
+    """
+    from django.utils import timezone
+
+    if not (request.user.has_perm('inventario.add_compra') or request.user.has_perm('inventario.change_compra')):
+        return JsonResponse({'error': 'Acceso denegado'}, status=403)
+
+    filas = productos_para_compra(request.GET.get('q', ''), request.GET.get('proveedor', '').strip() or None)
+    resultados = []
+    for fila in filas:
+        ultimo_costo = fila.get('ultimo_costo')
+        resultados.append({
+            'id': fila['id_producto'],
+            'text': f"{fila['nombre']} ({fila['id_producto']})",
+            'stock': fila['cantidad'],
+            'costo': float(ultimo_costo if ultimo_costo is not None else fila['precio_costo']),
+            'ultima_compra': timezone.localdate(fila['ultima_compra']).isoformat() if fila.get('ultima_compra') else None,
+        })
+    return JsonResponse({'results': resultados})
+
+
 @login_required
 @permission_required('inventario.view_detallecompra', raise_exception=True)
 def lista_detalles_compra(request):
     """Muestra el listado de todos los detalles de compra."""
-    from django.core.paginator import Paginator
+    from possitema.paginacion import paginar_por_cursor
     from .models import DetalleCompra
     
-    detalles_list = DetalleCompra.objects.select_related('compra', 'producto').order_by('-compra__fecha_compra')
+    detalles_list = DetalleCompra.objects.select_related('compra', 'producto')
     
     # Motor de búsqueda
     query = request.GET.get('q', '').strip()
@@ -766,24 +772,15 @@ def lista_detalles_compra(request):
     if fecha_hasta:
         detalles_list = detalles_list.filter(compra__fecha_compra__date__lte=fecha_hasta)
     
-    # Paginación
-    paginator = Paginator(detalles_list, 15)
-    page_number = request.GET.get('page')
-    detalles = paginator.get_page(page_number)
-    
-    # Query string sin 'page' para paginación
-    query_params = request.GET.copy()
-    if 'page' in query_params:
-        del query_params['page']
-    query_string = query_params.urlencode()
+    # Paginación por cursor sobre (fecha de la compra, pk del detalle)
+    detalles = paginar_por_cursor(detalles_list, request, 'compra__fecha_compra', 15)
     
     context = {
         'detalles': detalles,
-        'paginator': paginator,
         'query': query,
         'fecha_desde': fecha_desde,
         'fecha_hasta': fecha_hasta,
-        'query_string': query_string,
+        'query_string': detalles.query_string,
     }
     return render(request, 'inventario/lista_detalles_compra.html', context)
 
@@ -930,14 +927,13 @@ def editar_compra(request, pk):
     from .models import Proveedor, MetodoPagoCompra
     
     proveedores = Proveedor.objects.all()
-    productos = Producto.objects.all()  # Mostrar todos los productos, incluso los agotados
     metodos_pago = _obtener_metodos_pago_compra()
-    detalles = compra.detalles.all()
+    # Cada línea solo necesita su propio producto; el resto se busca por AJAX
+    detalles = compra.detalles.select_related('producto')
     
     context = {
         'compra': compra,
         'proveedores': proveedores,
-        'productos': productos,
         'metodos_pago': metodos_pago,
         'detalles': detalles,
         'es_edicion': True,
@@ -1127,9 +1123,17 @@ def importar_productos_excel(request):
                 count_creados = 0
                 count_actualizados = 0
                 errores = []
+                filas = list(ws.iter_rows(min_row=2, values_only=True))
+
+                # Stock previo de los productos del archivo (una consulta) para el kardex
+                ids_archivo = [str(row[0]).strip() for row in filas if row and row[0]]
+                stock_previo = dict(
+                    Producto.objects.filter(id_producto__in=ids_archivo).values_list('id_producto', 'cantidad')
+                )
+                movimientos = {}
 
                 # Iterar filas (asumiendo que la fila 1 es encabezado)
-                for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+                for row_idx, row in enumerate(filas, start=2):
                     if not row[0]: # Si no hay ID, saltar
                         continue
                     
@@ -1173,9 +1177,13 @@ def importar_productos_excel(request):
                             count_creados += 1
                         else:
                             count_actualizados += 1
+                        movimientos[id_prod] = movimientos.get(id_prod, 0) + cantidad - stock_previo.get(id_prod, 0)
+                        stock_previo[id_prod] = cantidad
                             
                     except Exception as e:
                         errores.append(f"Fila {row_idx}: {str(e)}")
+
+                registrar_movimientos(movimientos, 'IMPORTACION', usuario=request.user, referencia=excel_file.name)
                 
                 messages.success(request, f"Importación completada: {count_creados} creados, {count_actualizados} actualizados.")
                 if errores:
@@ -0,0 +1,108 @@
+# possitema/cache_busqueda.py
+"""
+Caché de resultados de la búsqueda en vivo de productos y clientes.
+
+Los cajeros de un mismo propietario repiten los mismos prefijos ("coca",
+"arroz") miles de veces al día. Se guarda, por propietario y consulta
+normalizada, solo la lista ordenada de claves primarias que devolvió la
+búsqueda; los datos (precio, stock) se leen frescos por clave primaria, así
+que un cambio de stock no obliga a vaciar la caché.
+
+Las búsquedas que solo muestran productos con stock guardan su propia
+variante, ya filtrada: si los candidatos se filtraran después, una consulta
+cuyos primeros CANDIDATOS_CACHE resultados están agotados no devolvería nada
+aunque existieran productos con stock más abajo.
+
+Cada propietario tiene un contador de generación por tipo ('productos',
+'clientes') que forma parte de la clave. Guardar, eliminar o importar un
+Producto/Cliente lo incrementa (ver inventario.signals y cliente.signals) y
+las entradas anteriores dejan de usarse hasta que expire su TTL.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Value, When
+
+from inventario.models import normalizar_busqueda
+
+# Segundos que se reutiliza un resultado
+BUSQUEDA_CACHE_TTL = 60
+# Claves primarias guardadas por consulta: más que el límite de las vistas
+# para que, al descartar lo reservado en otros carritos, sigan quedando
+# resultados
+CANDIDATOS_CACHE = 50
+TIPOS_BUSQUEDA = ('productos', 'clientes')
+
+_CLAVE_GENERACION = 'busqueda:generacion:{}:{}'
+_CLAVE_RESULTADO = 'busqueda:resultado:{}:{}:{}:{}:{}'
+_CLAVE_CONTADOR = 'busqueda:{}:{}'
+
+
+def _incrementar(clave):
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        cache.add(clave, 0, None)
+        return cache.incr(clave)
+
+
+def generacion(tipo, propietario_id):
+    """Generación vigente de los resultados del propietario (None = catálogo completo)."""
+    return cache.get_or_set(_CLAVE_GENERACION.format(tipo, propietario_id), 0, None)
+
+
+def invalidar_busquedas(tipo, propietario_id):
+    """Descarta los resultados del propietario y los del catálogo completo (staff)."""
+    for clave in (propietario_id, None):
+        _incrementar(_CLAVE_GENERACION.format(tipo, clave))
+
+
+def buscar_en_cache(tipo, propietario_id, consulta, buscar, variante=''):
+    """
+    Claves primarias de la búsqueda `consulta` para el propietario.
+
+    Args:
+        buscar: función sin argumentos que ejecuta la búsqueda y devuelve la
+            lista ordenada de claves primarias; solo se llama si no hay un
+            resultado vigente en la caché.
+        variante: distingue búsquedas de la misma consulta con filtros
+            distintos (p. ej. 'con_stock'), que se guardan por separado.
+    """
+    texto = normalizar_busqueda(consulta)
+    resumen = hashlib.md5(texto.encode('utf-8')).hexdigest()
+    clave = _CLAVE_RESULTADO.format(tipo, variante, propietario_id, generacion(tipo, propietario_id), resumen)
+    ids = cache.get(clave)
+    if ids is not None:
+        _incrementar(_CLAVE_CONTADOR.format('aciertos', tipo))
+        return ids
+    _incrementar(_CLAVE_CONTADOR.format('fallos', tipo))
+    ids = list(buscar())
+    cache.set(clave, ids, BUSQUEDA_CACHE_TTL)
+    return ids
+
+
+def en_orden(queryset, ids):
+    """Filas de `queryset` cuyas claves están en `ids`, en ese mismo orden."""
+    if not ids:
+        return queryset.none()
+    posicion = Case(
+        *[When(pk=pk, then=Value(i)) for i, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(posicion)
+
+
+def estadisticas_cache_busqueda():
+    """Aciertos, fallos y tasa de aciertos por tipo, para ajustar BUSQUEDA_CACHE_TTL."""
+    estadisticas = {}
+    for tipo in TIPOS_BUSQUEDA:
+        aciertos = cache.get(_CLAVE_CONTADOR.format('aciertos', tipo), 0)
+        fallos = cache.get(_CLAVE_CONTADOR.format('fallos', tipo), 0)
+        total = aciertos + fallos
+        estadisticas[tipo] = {
+            'aciertos': aciertos,
+            'fallos': fallos,
+            'tasa_aciertos': round(aciertos / total, 4) if total else None,
+        }
+    estadisticas['ttl'] = BUSQUEDA_CACHE_TTL
+    return estadisticas
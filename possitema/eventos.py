@@ -0,0 +1,116 @@
+# possitema/eventos.py
+"""
+Eventos en vivo del dashboard y de las alertas (Server-Sent Events).
+
+En lugar de que cada pestaña consulte los ingresos cada 30 segundos y las
+alertas cada 60, el navegador abre un solo stream (`eventos_dashboard`,
+servido por possitema/asgi.py) y el servidor avisa solo cuando algo cambió.
+
+Publicar un cambio es incrementar un contador en la caché por propietario y
+tema, al confirmarse la transacción:
+
+    ventas   venta registrada o anulada (por dueño y por cajero)
+    alertas  cambió el resumen de alertas del propietario (ver
+             inventario.alertas)
+    caja     caja abierta o cerrada (global, como su conteo en el dashboard)
+
+Cada stream revisa los contadores cada INTERVALO_REVISION segundos y manda
+un evento por tipo, no uno por cambio: veinte ventas seguidas del mismo
+propietario llegan como un solo evento `ingresos`. Los datos se calculan al
+enviar, así que siempre son los vigentes.
+
+Con varios procesos, CACHES debe apuntar a un backend compartido (igual que
+la caché de búsqueda). Bajo WSGI la vista responde 204 y el cliente vuelve
+al sondeo periódico (ver static/eventos_pos.js).
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+from .respuestas_json import serializar
+
+TEMAS_PROPIETARIO = ('ventas', 'alertas')
+TEMAS_GLOBALES = ('caja',)
+# Evento que se envía al cliente cuando cambia alguno de sus temas
+EVENTOS = {
+    'ingresos': ('ventas', 'caja'),
+    'alertas': ('alertas',),
+}
+# Segundos entre revisiones de los contadores
+INTERVALO_REVISION = 2
+# Comentario vacío para que los proxies no cierren el stream por inactividad
+INTERVALO_LATIDO = 20
+# El stream se cierra y el navegador se reconecta solo, liberando la conexión
+DURACION_STREAM = 300
+REINTENTO_MS = 5000
+
+_CLAVE_VERSION = 'eventos:{}:{}'
+
+
+def _clave(propietario_id, tema):
+    return _CLAVE_VERSION.format('global' if propietario_id is None else propietario_id, tema)
+
+
+def _incrementar(clave):
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        cache.add(clave, 0, None)
+        return cache.incr(clave)
+
+
+def publicar(propietario_id, *temas):
+    """
+    Avisa a los streams del propietario (None para los temas globales) que
+    cambiaron `temas`. Se aplica al confirmarse la transacción en curso.
+    """
+    claves = [_clave(propietario_id, tema) for tema in temas]
+
+    def incrementar():
+        for clave in claves:
+            _incrementar(clave)
+
+    transaction.on_commit(incrementar)
+
+
+def versiones(propietario_id):
+    """Contador actual de cada tema que ve el propietario."""
+    claves = {tema: _clave(propietario_id, tema) for tema in TEMAS_PROPIETARIO}
+    claves.update({tema: _clave(None, tema) for tema in TEMAS_GLOBALES})
+    valores = cache.get_many(claves.values())
+    return {tema: valores.get(clave, 0) for tema, clave in claves.items()}
+
+
+def _evento(nombre, datos):
+    return f'event: {nombre}\ndata: {serializar(datos).decode("utf-8")}\n\n'
+
+
+async def flujo_eventos(usuario, calcular_ingresos):
+    """
+    Generador del stream SSE de un usuario.
+
+    Args:
+        calcular_ingresos: Función síncrona usuario -> dict con los datos del
+            evento `ingresos` (los mismos que el sondeo por AJAX).
+    """
+    yield f'retry: {REINTENTO_MS}\n\n'
+    anteriores = await sync_to_async(versiones)(usuario.pk)
+    inicio = ultimo_envio = time.monotonic()
+    while time.monotonic() - inicio < DURACION_STREAM:
+        await asyncio.sleep(INTERVALO_REVISION)
+        actuales = await sync_to_async(versiones)(usuario.pk)
+        cambiados = {tema for tema, version in actuales.items() if version != anteriores[tema]}
+        anteriores = actuales
+        if cambiados.intersection(EVENTOS['ingresos']):
+            datos = await sync_to_async(calcular_ingresos)(usuario)
+            yield _evento('ingresos', datos)
+            ultimo_envio = time.monotonic()
+        if cambiados.intersection(EVENTOS['alertas']):
+            yield _evento('alertas', {tema: actuales[tema] for tema in EVENTOS['alertas']})
+            ultimo_envio = time.monotonic()
+        if time.monotonic() - ultimo_envio >= INTERVALO_LATIDO:
+            yield ': latido\n\n'
+            ultimo_envio = time.monotonic()
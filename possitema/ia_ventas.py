@@ -7,7 +7,7 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-from django.db.models import Sum, Count, F, Q, Avg
+from django.db.models import Sum, Count, Q, Avg
 from decimal import Decimal
 from datetime import timedelta, date
 
@@ -16,29 +16,31 @@ from datetime import timedelta, date
 
 def _get_resumen_ventas(user):
     """Ventas diarias, semanales y mensuales con tendencias."""
-    from ventas.models import Venta, DetalleVenta
+    from ventas.services import fecha_local, ventas_por_dia
 
-    ahora = timezone.now()
-    inicio_dia = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
-    inicio_semana = inicio_dia - timedelta(days=ahora.weekday())
-    inicio_mes = ahora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    hoy = fecha_local(timezone.now())
+    inicio_semana = hoy - timedelta(days=hoy.weekday())
+    inicio_mes = hoy.replace(day=1)
     inicio_mes_anterior = (inicio_mes - timedelta(days=1)).replace(day=1)
+    hace_7_dias = hoy - timedelta(days=6)
 
-    def _stats(qs):
-        agg = qs.aggregate(total=Sum('total'), cantidad=Count('id_venta'))
+    # Una sola lectura del resumen diario cubre todas las ventanas
+    por_dia = {
+        fila['fecha']: fila
+        for fila in ventas_por_dia(min(inicio_mes_anterior, hace_7_dias), hoy, cajero=user)
+    }
+
+    def _stats(desde, hasta):
+        filas = [fila for fecha, fila in por_dia.items() if desde <= fecha <= hasta]
         return {
-            'cantidad': agg['cantidad'] or 0,
-            'total': float(agg['total'] or 0),
+            'cantidad': sum(fila['cantidad_ventas'] for fila in filas),
+            'total': float(sum(fila['total'] for fila in filas)),
         }
 
-    ventas_hoy = _stats(Venta.objects.filter(antendido_por=user, fecha_venta__gte=inicio_dia))
-    ventas_semana = _stats(Venta.objects.filter(antendido_por=user, fecha_venta__gte=inicio_semana))
-    ventas_mes = _stats(Venta.objects.filter(antendido_por=user, fecha_venta__gte=inicio_mes))
-    ventas_mes_anterior = _stats(Venta.objects.filter(
-        antendido_por=user,
-        fecha_venta__gte=inicio_mes_anterior,
-        fecha_venta__lt=inicio_mes
-    ))
+    ventas_hoy = _stats(hoy, hoy)
+    ventas_semana = _stats(inicio_semana, hoy)
+    ventas_mes = _stats(inicio_mes, hoy)
+    ventas_mes_anterior = _stats(inicio_mes_anterior, inicio_mes - timedelta(days=1))
 
     # Tendencia mes vs mes anterior
     if ventas_mes_anterior['total'] > 0:
@@ -49,16 +51,10 @@ def _get_resumen_ventas(user):
     # Ventas últimos 7 días desglosadas
     ventas_7_dias = []
     for i in range(6, -1, -1):
-        dia = (ahora - timedelta(days=i)).date()
-        dia_inicio = timezone.make_aware(timezone.datetime.combine(dia, timezone.datetime.min.time()))
-        dia_fin = dia_inicio + timedelta(days=1)
-        agg = Venta.objects.filter(
-            antendido_por=user, fecha_venta__gte=dia_inicio, fecha_venta__lt=dia_fin
-        ).aggregate(total=Sum('total'), cantidad=Count('id_venta'))
+        dia = hoy - timedelta(days=i)
         ventas_7_dias.append({
             'fecha': dia.strftime('%Y-%m-%d'),
-            'total': float(agg['total'] or 0),
-            'cantidad': agg['cantidad'] or 0,
+            **_stats(dia, dia),
         })
 
     return {
@@ -73,7 +69,7 @@ def _get_resumen_ventas(user):
 
 def _get_productos_top(user, limite=10):
     """Productos más y menos vendidos."""
-    from ventas.models import DetalleVenta
+    from ventas.models import COSTO_DETALLE, DetalleVenta
 
     ahora = timezone.now()
     inicio_mes = ahora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
@@ -81,17 +77,17 @@ def _get_productos_top(user, limite=10):
     base_qs = DetalleVenta.objects.filter(
         venta__antendido_por=user,
         venta__fecha_venta__gte=inicio_mes
-    ).values('producto__nombre').annotate(
+    ).values('producto_nombre').annotate(
         total_vendido=Sum('cantidad'),
         ingresos=Sum('subtotal'),
-        costo_total=Sum(F('costo_al_vender') * F('cantidad')),
+        costo_total=Sum(COSTO_DETALLE),
     )
 
     mas_vendidos = list(base_qs.order_by('-total_vendido')[:limite].values(
-        'producto__nombre', 'total_vendido', 'ingresos', 'costo_total'
+        'producto_nombre', 'total_vendido', 'ingresos', 'costo_total'
     ))
     menos_vendidos = list(base_qs.order_by('total_vendido')[:5].values(
-        'producto__nombre', 'total_vendido', 'ingresos', 'costo_total'
+        'producto_nombre', 'total_vendido', 'ingresos', 'costo_total'
     ))
 
     # Calcular ganancia por producto
@@ -187,7 +183,7 @@ def _get_clientes_info(user):
 
 def _get_margenes_ganancia(user):
     """Rentabilidad del negocio: hoy, mes, margen."""
-    from ventas.models import DetalleVenta
+    from ventas.models import COSTO_DETALLE, DetalleVenta
 
     ahora = timezone.now()
     inicio_dia = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -197,7 +193,7 @@ def _get_margenes_ganancia(user):
     def _calc_ganancia(qs):
         datos = qs.aggregate(
             ingresos=Sum('subtotal'),
-            costos=Sum(F('costo_al_vender') * F('cantidad')),
+            costos=Sum(COSTO_DETALLE),
         )
         ingresos = float(datos['ingresos'] or 0)
         costos = float(datos['costos'] or 0)
@@ -254,14 +250,14 @@ def _get_gastos_vs_ingresos(user):
 
 def _get_stock_alertas(user):
     """Stock bajo y productos próximos a caducar."""
-    from inventario.models import Producto
+    from inventario.models import BAJO_STOCK_UMBRAL, Producto
 
     hoy = date.today()
     en_30_dias = hoy + timedelta(days=30)
 
-    # Productos con stock bajo (≤10 unidades)
+    # Productos con stock bajo
     bajo_stock = list(Producto.objects.filter(
-        user=user, cantidad__lte=10, estado='ACTIVO'
+        user=user, cantidad__lte=BAJO_STOCK_UMBRAL, estado='ACTIVO'
     ).order_by('cantidad').values('nombre', 'cantidad', 'precio_venta')[:15])
     for p in bajo_stock:
         p['precio_venta'] = float(p['precio_venta'])
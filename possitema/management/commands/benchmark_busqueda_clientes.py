@@ -0,0 +1,137 @@
+"""
+Comando Django para medir la latencia por tecla de la búsqueda de clientes.
+
+Crea N clientes para un usuario (y otros tantos para un segundo usuario, para
+que el filtro por propietario tenga trabajo), simula la escritura letra por
+letra de nombres, cédulas y teléfonos, y compara el filtro anterior (OR de
+icontains) con cliente.services.buscar_clientes. En PostgreSQL también
+muestra el plan de la última consulta.
+
+Los clientes se crean dentro de una transacción que se revierte al final,
+por lo que no deja rastros en la base de datos.
+
+Uso:
+    python manage.py benchmark_busqueda_clientes
+    python manage.py benchmark_busqueda_clientes --clientes 200000 --consultas "maria lopez" 0991234567
+"""
+
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+NOMBRES = ['María', 'José', 'Luis', 'Ana', 'Carlos', 'Lucía', 'Andrés', 'Verónica', 'Jorge', 'Patricia']
+APELLIDOS = ['López', 'Pérez', 'Zambrano', 'Vera', 'Mendoza', 'Cedeño', 'Chávez', 'Muñoz', 'Ortiz', 'Álava']
+
+
+class _Rollback(Exception):
+    """Fuerza la reversión de la transacción del benchmark."""
+
+
+def _buscar_legado(consulta, clientes):
+    """Réplica del filtro anterior de buscar_clientes_vivo/clientes_lista."""
+    from django.db.models import Q
+
+    return clientes.filter(
+        Q(nombre__icontains=consulta) | Q(apellido__icontains=consulta) | Q(id_cliente__icontains=consulta)
+        | Q(ruc_cedula__icontains=consulta) | Q(email__icontains=consulta) | Q(telefono__icontains=consulta)
+    ).order_by('nombre')
+
+
+class Command(BaseCommand):
+    help = 'Medir la latencia por tecla de la búsqueda de clientes (antes/después)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clientes',
+            type=int,
+            default=200000,
+            help='Clientes simulados por usuario (por defecto 200000)'
+        )
+        parser.add_argument(
+            '--consultas',
+            nargs='+',
+            default=['maria lopez', 'cedeño', '0900012345', '0990012345'],
+            help='Consultas que se escriben letra por letra'
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=3,
+            help='Veces que se repite cada pulsación'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._ejecutar(options['clientes'], options['consultas'], options['repeticiones'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+        self.stdout.write(self.style.SUCCESS('Benchmark finalizado (datos revertidos).'))
+
+    def _crear_clientes(self, user, total, prefijo, provincia, operadora):
+        from cliente.models import Cliente, solo_digitos
+
+        lote = []
+        for i in range(total):
+            cliente = Cliente(
+                id_cliente=f'{prefijo}{i:07d}', user=user,
+                nombre=NOMBRES[i % len(NOMBRES)], apellido=APELLIDOS[(i // 7) % len(APELLIDOS)],
+                ruc_cedula=f'{provincia}{i:08d}', email=f'{prefijo.lower()}{i}@correo.ec',
+                telefono=f'{operadora}{i:07d}',
+            )
+            # bulk_create no pasa por save(): las columnas de búsqueda se arman aquí
+            cliente.busqueda = cliente.texto_busqueda()
+            cliente.telefono_digitos = solo_digitos(cliente.telefono)
+            lote.append(cliente)
+            if len(lote) == 5000:
+                Cliente.objects.bulk_create(lote)
+                lote = []
+        Cliente.objects.bulk_create(lote)
+
+    def _ejecutar(self, total, consultas, repeticiones):
+        from django.contrib.auth.models import User
+        from cliente.models import Cliente
+        from cliente.services import buscar_clientes
+
+        user = User.objects.create_user(username='__benchmark_clientes__')
+        otro = User.objects.create_user(username='__benchmark_clientes_otro__')
+        inicio = time.perf_counter()
+        self._crear_clientes(user, total, 'A', '09', '099')
+        self._crear_clientes(otro, total, 'B', '13', '098')
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE cliente_cliente')
+        self.stdout.write(
+            f'Motor: {connection.vendor} | clientes por usuario: {total} | '
+            f'datos creados en {time.perf_counter() - inicio:.1f}s'
+        )
+
+        propios = Cliente.objects.filter(user=user)
+        modos = [
+            ('antes', _buscar_legado),
+            ('despues', buscar_clientes),
+        ]
+        self.stdout.write(f"{'consulta':>16} {'modo':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for consulta in consultas:
+            # Cada prefijo es una pulsación: 'm', 'ma', 'mar', ...
+            prefijos = [consulta[:n] for n in range(1, len(consulta) + 1)]
+            for nombre, buscar in modos:
+                tiempos = []
+                for prefijo in prefijos:
+                    for _ in range(repeticiones):
+                        inicio = time.perf_counter()
+                        list(buscar(prefijo, propios).values_list('id_cliente', flat=True)[:15])
+                        tiempos.append((time.perf_counter() - inicio) * 1000)
+                tiempos.sort()
+                p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+                self.stdout.write(
+                    f'{consulta[:16]:>16} {nombre:>8} {statistics.median(tiempos):>9.2f} '
+                    f'{p95:>9.2f} {tiempos[-1]:>9.2f}'
+                )
+
+        if connection.vendor == 'postgresql' and consultas:
+            self.stdout.write('\nPlan de la búsqueda nueva:')
+            self.stdout.write(buscar_clientes(consultas[0], propios).values('id_cliente')[:15].explain(analyze=True))
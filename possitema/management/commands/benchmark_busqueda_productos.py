@@ -0,0 +1,135 @@
+"""
+Comando Django para medir la latencia por tecla de la búsqueda de productos.
+
+Simula a un cajero escribiendo letra por letra varias consultas (nombres con
+y sin tildes y códigos de barras) sobre un catálogo de N productos, y compara
+el filtro anterior (icontains sobre nombre e id_producto) con
+inventario.services.buscar_productos. En PostgreSQL también muestra el plan
+de la última consulta para confirmar que usa el índice trigram.
+
+Los productos se crean dentro de una transacción que se revierte al final,
+por lo que no deja rastros en la base de datos.
+
+Uso:
+    python manage.py benchmark_busqueda_productos
+    python manage.py benchmark_busqueda_productos --productos 100000 --consultas "leche entera" 7861234
+"""
+
+import itertools
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+MARCAS = ['La Lechera', 'Nestlé', 'Toni', 'Pronaca', 'Facundo', 'Supermaxi', 'Real', 'Oriental']
+PRODUCTOS = ['Leche', 'Café', 'Arroz', 'Azúcar', 'Atún', 'Jabón', 'Aceite', 'Galletas', 'Fideos', 'Avena']
+VARIANTES = ['entera', 'descremada', 'integral', 'premium', 'light', 'familiar', 'clásico', 'orgánico']
+
+
+class _Rollback(Exception):
+    """Fuerza la reversión de la transacción del benchmark."""
+
+
+def _buscar_legado(consulta):
+    """Réplica del filtro anterior de buscar_productos_vivo."""
+    from django.db.models import Q
+    from inventario.models import Producto
+
+    return Producto.objects.filter(Q(id_producto__icontains=consulta) | Q(nombre__icontains=consulta))
+
+
+class Command(BaseCommand):
+    help = 'Medir la latencia por tecla de la búsqueda de productos (antes/después)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--productos',
+            type=int,
+            default=100000,
+            help='Tamaño del catálogo simulado (por defecto 100000)'
+        )
+        parser.add_argument(
+            '--consultas',
+            nargs='+',
+            default=['leche entera', 'azucar', 'cafe organico', '78600000123'],
+            help='Consultas que se escriben letra por letra'
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=3,
+            help='Veces que se repite cada pulsación'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._ejecutar(options['productos'], options['consultas'], options['repeticiones'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+        self.stdout.write(self.style.SUCCESS('Benchmark finalizado (datos revertidos).'))
+
+    def _crear_catalogo(self, user, total):
+        from inventario.models import Producto
+
+        nombres = itertools.cycle(
+            f'{producto} {variante} {marca}'
+            for producto in PRODUCTOS for variante in VARIANTES for marca in MARCAS
+        )
+        lote = []
+        for i in range(total):
+            producto = Producto(
+                id_producto=f'786{i:08d}', user=user, nombre=f'{next(nombres)} {i % 997}g',
+                precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=10,
+            )
+            # bulk_create no pasa por save(): el texto de búsqueda se arma aquí
+            producto.busqueda = producto.texto_busqueda()
+            lote.append(producto)
+            if len(lote) == 5000:
+                Producto.objects.bulk_create(lote)
+                lote = []
+        Producto.objects.bulk_create(lote)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE inventario_producto')
+
+    def _ejecutar(self, total, consultas, repeticiones):
+        from django.contrib.auth.models import User
+        from inventario.services import buscar_productos
+
+        user = User.objects.create_user(username='__benchmark_busqueda__')
+        inicio = time.perf_counter()
+        self._crear_catalogo(user, total)
+        self.stdout.write(
+            f'Motor: {connection.vendor} | productos: {total} | '
+            f'catálogo creado en {time.perf_counter() - inicio:.1f}s'
+        )
+
+        modos = [
+            ('antes', _buscar_legado),
+            ('despues', buscar_productos),
+        ]
+        self.stdout.write(f"{'consulta':>16} {'modo':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for consulta in consultas:
+            # Cada prefijo es una pulsación: 'l', 'le', 'lec', ...
+            prefijos = [consulta[:n] for n in range(1, len(consulta) + 1)]
+            for nombre, buscar in modos:
+                tiempos = []
+                for prefijo in prefijos:
+                    for _ in range(repeticiones):
+                        inicio = time.perf_counter()
+                        list(buscar(prefijo).values_list('id_producto', flat=True)[:10])
+                        tiempos.append((time.perf_counter() - inicio) * 1000)
+                tiempos.sort()
+                p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+                self.stdout.write(
+                    f'{consulta[:16]:>16} {nombre:>8} {statistics.median(tiempos):>9.2f} '
+                    f'{p95:>9.2f} {tiempos[-1]:>9.2f}'
+                )
+
+        if connection.vendor == 'postgresql' and consultas:
+            self.stdout.write('\nPlan de la búsqueda nueva:')
+            self.stdout.write(buscar_productos(consultas[0]).values('id_producto')[:10].explain(analyze=True))
@@ -0,0 +1,89 @@
+"""
+Comando Django para medir el rendimiento de ventas concurrentes sobre un
+mismo producto, con el stock en una sola fila y con stock fragmentado.
+
+Cada hilo simula un cajero que registra ventas de una unidad del mismo
+producto. Los datos se crean con un usuario temporal y se eliminan al final.
+Requiere PostgreSQL: con SQLite las escrituras se serializan a nivel de
+archivo y la comparación no es representativa.
+
+Uso:
+    python manage.py benchmark_stock_fragmentado
+    python manage.py benchmark_stock_fragmentado --cajeros 16 --ventas 100 --fragmentos 8
+"""
+
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+
+class Command(BaseCommand):
+    help = 'Comparar ventas/s con stock en una fila vs. stock fragmentado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cajeros', type=int, default=8, help='Hilos que venden en paralelo')
+        parser.add_argument('--ventas', type=int, default=50, help='Ventas por cajero')
+        parser.add_argument('--fragmentos', type=int, default=8, help='Fragmentos del producto caliente')
+
+    def handle(self, *args, **options):
+        from django.contrib.auth.models import User
+        from inventario.models import Producto
+        from inventario.services import activar_stock_fragmentado, reconciliar_stock_fragmentado
+
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite serializa las escrituras: los resultados no son representativos.'))
+
+        cajeros, ventas = options['cajeros'], options['ventas']
+        total_ventas = cajeros * ventas
+        user = User.objects.create_user(username='__benchmark_stock__')
+        try:
+            self.stdout.write(f'Motor: {connection.vendor} | cajeros: {cajeros} | ventas por cajero: {ventas}')
+            self.stdout.write(f"{'modo':>12} {'ventas/s':>10} {'errores':>8} {'stock final':>12}")
+            for modo in ('una_fila', 'fragmentado'):
+                producto = Producto.objects.create(
+                    id_producto=f'BENCHSTK-{modo}', user=user, nombre=f'Producto caliente {modo}',
+                    precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=total_ventas,
+                )
+                if modo == 'fragmentado':
+                    activar_stock_fragmentado(producto, options['fragmentos'])
+
+                segundos, errores = self._ejecutar(user, producto.pk, cajeros, ventas)
+                reconciliar_stock_fragmentado([producto.pk])
+                stock_final = Producto.objects.values_list('cantidad', flat=True).get(pk=producto.pk)
+                self.stdout.write(
+                    f'{modo:>12} {(total_ventas - errores) / segundos:>10.1f} {errores:>8} {stock_final:>12}'
+                )
+        finally:
+            # Las ventas y sus detalles se eliminan en cascada con el usuario
+            Producto.objects.filter(user=user).delete()
+            user.delete()
+        self.stdout.write(self.style.SUCCESS('Benchmark finalizado (datos eliminados).'))
+
+    def _ejecutar(self, user, producto_pk, cajeros, ventas):
+        from possitema.services import registrar_venta_completa
+
+        carrito = [{'id': producto_pk, 'cantidad': 1, 'precio': '1.50'}]
+        errores = []
+        barrera = threading.Barrier(cajeros)
+
+        def cajero():
+            barrera.wait()
+            try:
+                for _ in range(ventas):
+                    try:
+                        registrar_venta_completa(user, carrito, Decimal('1.50'))
+                    except Exception:
+                        errores.append(1)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=cajero) for _ in range(cajeros)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return time.perf_counter() - inicio, len(errores)
@@ -0,0 +1,129 @@
+"""
+Comando Django para medir la latencia de registrar_venta_completa según el
+tamaño del carrito.
+
+Compara el bloqueo anterior (un SELECT ... FOR UPDATE por línea y un
+bulk_update) con el actual (un único SELECT ordenado y un UPDATE condicional).
+Todos los datos se crean dentro de una transacción que se revierte al final,
+por lo que no deja rastros en la base de datos.
+
+Uso:
+    python manage.py benchmark_venta
+    python manage.py benchmark_venta --tamanos 1 10 40 --repeticiones 50
+"""
+
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+class _Rollback(Exception):
+    """Fuerza la reversión de la transacción del benchmark."""
+
+
+def _registrar_venta_legado(user, carrito_data, total, caja=None):
+    """Réplica del flujo anterior: un bloqueo por línea del carrito."""
+    from inventario.models import Producto
+    from ventas.models import Venta, DetalleVenta
+
+    with transaction.atomic():
+        venta = Venta.objects.create(
+            antendido_por=user, owner=user, total=total, caja=caja,
+            monto_pagado=total, estado_credito='PAGADA',
+        )
+        detalles = []
+        productos = []
+        for item in carrito_data:
+            cantidad = int(item['cantidad'])
+            precio = Decimal(str(item['precio']))
+            producto = Producto.objects.select_for_update().get(pk=item['id'])
+            if producto.cantidad < cantidad:
+                raise Exception(f"Stock insuficiente para {producto.nombre}.")
+            detalles.append(DetalleVenta(
+                venta=venta, producto=producto, producto_codigo=producto.pk,
+                producto_nombre=producto.nombre, cantidad=cantidad, precio_unitario=precio, subtotal=precio * cantidad,
+                costo_al_vender=producto.precio_costo,
+            ))
+            producto.cantidad -= cantidad
+            productos.append(producto)
+        DetalleVenta.objects.bulk_create(detalles)
+        Producto.objects.bulk_update(productos, ['cantidad'])
+        return venta
+
+
+class Command(BaseCommand):
+    help = 'Medir la latencia de venta vs. tamaño de carrito (antes/después)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamanos',
+            type=int,
+            nargs='+',
+            default=[1, 5, 10, 20, 40],
+            help='Tamaños de carrito (líneas) a medir'
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=20,
+            help='Ventas registradas por cada tamaño y modo'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._ejecutar(options['tamanos'], options['repeticiones'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+        self.stdout.write(self.style.SUCCESS('Benchmark finalizado (datos revertidos).'))
+
+    def _ejecutar(self, tamanos, repeticiones):
+        from django.contrib.auth.models import User
+        from inventario.models import Producto
+        from ventas.models import Caja
+        from possitema.services import registrar_venta_completa
+
+        user = User.objects.create_user(username='__benchmark_venta__')
+        caja = Caja.objects.create(usuario_apertura=user, monto_inicial=Decimal('0.00'))
+        max_lineas = max(tamanos)
+        Producto.objects.bulk_create([
+            Producto(
+                id_producto=f'BENCH{i:05d}', user=user, nombre=f'Producto benchmark {i}',
+                precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'),
+                cantidad=10 ** 7,
+            )
+            for i in range(max_lineas)
+        ])
+
+        modos = [
+            ('antes', lambda carrito, total: _registrar_venta_legado(user, carrito, total, caja)),
+            ('despues', lambda carrito, total: registrar_venta_completa(user, carrito, total, caja=caja)),
+        ]
+
+        self.stdout.write(f'Motor: {connection.vendor} | repeticiones por caso: {repeticiones}')
+        self.stdout.write(f"{'lineas':>7} {'modo':>8} {'p50 ms':>9} {'p95 ms':>9} {'consultas':>10}")
+        for tamano in tamanos:
+            carrito = [
+                {'id': f'BENCH{i:05d}', 'cantidad': 1, 'precio': '1.50'}
+                for i in range(tamano)
+            ]
+            total = Decimal('1.50') * tamano
+            for nombre, registrar in modos:
+                tiempos = []
+                consultas = 0
+                for _ in range(repeticiones):
+                    with CaptureQueriesContext(connection) as ctx:
+                        inicio = time.perf_counter()
+                        registrar(carrito, total)
+                        tiempos.append((time.perf_counter() - inicio) * 1000)
+                    consultas = len(ctx.captured_queries)
+                tiempos.sort()
+                p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+                self.stdout.write(
+                    f'{tamano:>7} {nombre:>8} {statistics.median(tiempos):>9.2f} {p95:>9.2f} {consultas:>10}'
+                )
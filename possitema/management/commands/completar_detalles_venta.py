@@ -0,0 +1,32 @@
+"""
+Comando Django para copiar código y nombre del producto en los detalles de
+venta registrados antes de que DetalleVenta guardara esos datos.
+
+La migración ventas 0016 ya completa los existentes al desplegar; el comando
+repite ese relleno por lotes, sin bloquear la tabla, y volver a ejecutarlo
+solo toca los que sigan pendientes.
+
+Uso:
+    python manage.py completar_detalles_venta
+    python manage.py completar_detalles_venta --lote 5000
+"""
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Completar código y nombre del producto en los detalles de venta antiguos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=1000,
+            help='Detalles actualizados por transacción (por defecto 1000)'
+        )
+
+    def handle(self, *args, **options):
+        from possitema.services import completar_snapshot_detalles_venta
+
+        completados = completar_snapshot_detalles_venta(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Detalles de venta completados: {completados}'))
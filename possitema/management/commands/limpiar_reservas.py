@@ -0,0 +1,37 @@
+"""
+Comando Django para borrar las reservas de stock vencidas.
+
+Las reservas vencidas ya no descuentan stock en las búsquedas; este comando
+solo elimina las filas en un único DELETE. Conviene programarlo cada pocos
+minutos (cron / tarea programada).
+
+Uso:
+    python manage.py limpiar_reservas
+    python manage.py limpiar_reservas --intervalo 300   # Repetir cada 5 min
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Eliminar las reservas de stock de carritos vencidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=0,
+            help='Segundos entre ejecuciones (0 = ejecutar una sola vez)'
+        )
+
+    def handle(self, *args, **options):
+        from inventario.services import limpiar_reservas_vencidas
+
+        while True:
+            eliminadas = limpiar_reservas_vencidas()
+            self.stdout.write(self.style.SUCCESS(f'Reservas vencidas eliminadas: {eliminadas}'))
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,398 @@
+"""
+Comando Django para medir cuántos cajeros simultáneos soporta el despliegue.
+
+Crea N cajeros con su caja abierta y un catálogo de prueba; cada cajero (un
+hilo) busca productos con `buscar_productos_vivo`, cobra carritos con
+`procesar_venta_ajax` y, de vez en cuando, un supervisor anula una venta con
+`anular_venta`. Al final informa rendimiento, latencias p50/p95/p99, esperas
+por bloqueo y verifica que ningún producto se haya sobrevendido y que el
+stock descontado coincida con las cantidades vendidas.
+
+Por defecto usa el cliente de pruebas de Django en este mismo proceso. Con
+--url las peticiones van por HTTP a un servidor local que use la misma base
+de datos (p. ej. `python manage.py runserver` o gunicorn). Los datos de
+prueba se eliminan al terminar salvo que se indique --conservar.
+
+Uso:
+    python manage.py prueba_carga_cajeros
+    python manage.py prueba_carga_cajeros --cajeros 20 --ventas 50 --stock 200
+    python manage.py prueba_carga_cajeros --url http://127.0.0.1:8000
+"""
+
+import http.cookiejar
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+PREFIJO = '__carga__'
+CLAVE_USUARIOS = 'carga-cajeros'
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+class _ClienteDjango:
+    """Peticiones con el cliente de pruebas de Django (sin red)."""
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def get_json(self, ruta, params):
+        resp = self.client.get(ruta, params, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return resp.status_code, resp.json() if resp.status_code < 500 else None
+
+    def post_json(self, ruta, payload):
+        resp = self.client.post(ruta, json.dumps(payload), content_type='application/json',
+                                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return resp.status_code, resp.json() if resp.status_code < 500 else None
+
+    def post_form(self, ruta):
+        return self.client.post(ruta).status_code, None
+
+
+class _ClienteHTTP:
+    """Peticiones HTTP reales con sesión y token CSRF."""
+
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        ruta_login = reverse('usuarios:login')
+        self.opener.open(self.base_url + ruta_login).read()
+        self._enviar(ruta_login, urllib.parse.urlencode({'username': username, 'password': password}).encode(),
+                     'application/x-www-form-urlencoded')
+
+    def _csrf(self):
+        return next((c.value for c in self.cookies if c.name == 'csrftoken'), '')
+
+    def _enviar(self, ruta, cuerpo, tipo):
+        peticion = urllib.request.Request(self.base_url + ruta, data=cuerpo, method='POST', headers={
+            'Content-Type': tipo,
+            'X-CSRFToken': self._csrf(),
+            'X-Requested-With': 'XMLHttpRequest',
+            'Referer': self.base_url + ruta,
+        })
+        try:
+            with self.opener.open(peticion) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def get_json(self, ruta, params):
+        peticion = urllib.request.Request(
+            f'{self.base_url}{ruta}?{urllib.parse.urlencode(params)}',
+            headers={'X-Requested-With': 'XMLHttpRequest'},
+        )
+        try:
+            with self.opener.open(peticion) as resp:
+                return resp.status, json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def post_json(self, ruta, payload):
+        estado, cuerpo = self._enviar(ruta, json.dumps(payload).encode(), 'application/json')
+        try:
+            return estado, json.loads(cuerpo)
+        except ValueError:
+            return estado, None
+
+    def post_form(self, ruta):
+        return self._enviar(ruta, b'', 'application/x-www-form-urlencoded')[0], None
+
+
+class _MuestreoBloqueos(threading.Thread):
+    """Cuenta cada 50 ms las sesiones de PostgreSQL que esperan un bloqueo."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.detener = threading.Event()
+        self.muestras = []
+
+    def run(self):
+        try:
+            with connections['default'].cursor() as cursor:
+                while not self.detener.is_set():
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity "
+                        "WHERE wait_event_type = 'Lock' AND datname = current_database()"
+                    )
+                    self.muestras.append(cursor.fetchone()[0])
+                    time.sleep(0.05)
+        finally:
+            connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga con cajeros simultáneos (ventas, búsquedas y anulaciones)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cajeros', type=int, default=8, help='Cajeros simultáneos')
+        parser.add_argument('--ventas', type=int, default=30, help='Ventas que intenta cada cajero')
+        parser.add_argument('--productos', type=int, default=40, help='Productos del catálogo de prueba')
+        parser.add_argument('--stock', type=int, default=100, help='Stock inicial de cada producto')
+        parser.add_argument('--lineas-max', type=int, default=6, help='Líneas máximas por carrito')
+        parser.add_argument('--busquedas', type=int, default=2, help='Búsquedas en vivo antes de cada venta')
+        parser.add_argument('--anulaciones', type=float, default=0.05, help='Fracción de ventas que se anulan')
+        parser.add_argument('--url', type=str, default=None, help='Servidor local a probar (por defecto, cliente de Django)')
+        parser.add_argument('--semilla', type=int, default=None, help='Semilla para reproducir los carritos')
+        parser.add_argument('--conservar', action='store_true', help='No eliminar los datos de prueba')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite serializa las escrituras: espere rechazos por "database is locked".'))
+        random.seed(options['semilla'])
+        datos = self._crear_datos(options)
+        try:
+            # El cliente de pruebas usa el host 'testserver'
+            with override_settings(ALLOWED_HOSTS=['*']):
+                metricas, segundos, bloqueos = self._ejecutar(datos, options)
+            self._informe(metricas, segundos, bloqueos, options)
+            self._verificar(datos)
+        finally:
+            if not options['conservar']:
+                self._eliminar_datos(datos)
+
+    # ------------------------------------------------------------------
+    # Preparación
+    # ------------------------------------------------------------------
+    def _crear_datos(self, options):
+        from django.contrib.auth.models import User
+        from inventario.models import Producto
+        from ventas.models import Caja
+
+        sufijo = uuid.uuid4().hex[:6]
+        cajeros = []
+        for i in range(options['cajeros']):
+            user = User.objects.create_user(username=f'{PREFIJO}{sufijo}_cajero{i}', password=CLAVE_USUARIOS)
+            Caja.objects.create(usuario_apertura=user, monto_inicial=Decimal('0.00'))
+            cajeros.append(user)
+        supervisor = User.objects.create_user(
+            username=f'{PREFIJO}{sufijo}_supervisor', password=CLAVE_USUARIOS, is_staff=True
+        )
+
+        productos = [
+            Producto(
+                id_producto=f'CARGA{sufijo}{i:04d}', user=cajeros[0], nombre=f'Producto carga {sufijo} {i}',
+                precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=options['stock'],
+            )
+            for i in range(options['productos'])
+        ]
+        # bulk_create no pasa por save(): el texto de búsqueda se arma aquí
+        for producto in productos:
+            producto.busqueda = producto.texto_busqueda()
+        Producto.objects.bulk_create(productos)
+        return {
+            'sufijo': sufijo,
+            'cajeros': cajeros,
+            'supervisor': supervisor,
+            'productos': [p.pk for p in productos],
+            'stock_inicial': {p.pk: options['stock'] for p in productos},
+        }
+
+    def _nuevo_cliente(self, user, options):
+        if options['url']:
+            return _ClienteHTTP(options['url'], user.username, CLAVE_USUARIOS)
+        return _ClienteDjango(user)
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+    def _ejecutar(self, datos, options):
+        from ventas.views import ERROR_STOCK_INSUFICIENTE
+
+        metricas = {'venta': [], 'busqueda': [], 'anulacion': [], 'exitosas': 0, 'rechazadas': 0, 'errores': 0,
+                    'motivos': Counter()}
+        candado = threading.Lock()
+        ventas_para_anular = []
+        barrera = threading.Barrier(len(datos['cajeros']))
+        # Los productos "calientes" concentran la mitad de las líneas
+        calientes = datos['productos'][:max(1, len(datos['productos']) // 10)]
+
+        ruta_venta = reverse('ventas:procesar_venta_ajax')
+        ruta_busqueda = reverse('ventas:buscar_productos_vivo')
+
+        def registrar(tipo, inicio):
+            with candado:
+                metricas[tipo].append((time.perf_counter() - inicio) * 1000)
+
+        def cajero(user):
+            try:
+                cliente = self._nuevo_cliente(user, options)
+                barrera.wait()
+                for _ in range(options['ventas']):
+                    for _ in range(options['busquedas']):
+                        inicio = time.perf_counter()
+                        cliente.get_json(ruta_busqueda, {'q': f'carga {datos["sufijo"]} {random.randint(0, 9)}'})
+                        registrar('busqueda', inicio)
+
+                    lineas = random.randint(1, options['lineas_max'])
+                    carrito = [
+                        {
+                            'id': random.choice(calientes if random.random() < 0.5 else datos['productos']),
+                            'cantidad': random.randint(1, 3),
+                            'precio': '1.50',
+                        }
+                        for _ in range(lineas)
+                    ]
+                    total = sum(Decimal(item['precio']) * item['cantidad'] for item in carrito)
+                    payload = {
+                        'carrito': carrito,
+                        'total': str(total),
+                        'metodo_pago': 'efectivo',
+                        'clave_idempotencia': uuid.uuid4().hex,
+                    }
+                    inicio = time.perf_counter()
+                    estado, respuesta = cliente.post_json(ruta_venta, payload)
+                    registrar('venta', inicio)
+                    with candado:
+                        if respuesta and respuesta.get('success'):
+                            metricas['exitosas'] += 1
+                            if random.random() < options['anulaciones']:
+                                ventas_para_anular.append(respuesta['venta_id'])
+                        elif respuesta and respuesta.get('codigo') == ERROR_STOCK_INSUFICIENTE:
+                            metricas['rechazadas'] += 1
+                        else:
+                            # Cualquier otro fallo (4xx o 5xx) es un error de la prueba
+                            metricas['errores'] += 1
+                            motivo = (respuesta or {}).get('error') or f'HTTP {estado}'
+                            metricas['motivos'][f'{estado}: {motivo[:80]}'] += 1
+            except Exception as e:
+                with candado:
+                    metricas['errores'] += 1
+                    metricas['motivos'][f'excepción: {str(e)[:80]}'] += 1
+                self.stderr.write(f'Cajero {user.username}: {e}')
+            finally:
+                connections.close_all()
+
+        def supervisor():
+            try:
+                cliente = self._nuevo_cliente(datos['supervisor'], options)
+                while not fin.is_set() or ventas_para_anular:
+                    with candado:
+                        venta_id = ventas_para_anular.pop() if ventas_para_anular else None
+                    if venta_id is None:
+                        time.sleep(0.02)
+                        continue
+                    inicio = time.perf_counter()
+                    cliente.post_form(reverse('ventas:anular_venta', kwargs={'pk': venta_id}))
+                    registrar('anulacion', inicio)
+            finally:
+                connections.close_all()
+
+        muestreo = _MuestreoBloqueos() if connection.vendor == 'postgresql' else None
+        fin = threading.Event()
+        hilos = [threading.Thread(target=cajero, args=(user,)) for user in datos['cajeros']]
+        hilo_supervisor = threading.Thread(target=supervisor)
+
+        if muestreo:
+            muestreo.start()
+        inicio = time.perf_counter()
+        hilo_supervisor.start()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        fin.set()
+        hilo_supervisor.join()
+        segundos = time.perf_counter() - inicio
+        if muestreo:
+            muestreo.detener.set()
+            muestreo.join()
+        return metricas, segundos, (muestreo.muestras if muestreo else None)
+
+    # ------------------------------------------------------------------
+    # Resultados
+    # ------------------------------------------------------------------
+    def _informe(self, metricas, segundos, bloqueos, options):
+        objetivo = options['url'] or 'cliente de pruebas Django'
+        self.stdout.write(f'Motor: {connection.vendor} | objetivo: {objetivo} | cajeros: {options["cajeros"]}')
+        self.stdout.write(f'Duración: {segundos:.2f} s')
+        exitosas = metricas['exitosas']
+        self.stdout.write(
+            f'Ventas: {exitosas} exitosas, {metricas["rechazadas"]} rechazadas (stock), '
+            f'{metricas["errores"]} errores | {exitosas / segundos:.1f} ventas/s'
+        )
+        for motivo, veces in metricas['motivos'].most_common(5):
+            self.stdout.write(f'  error x{veces}: {motivo}')
+        self.stdout.write(f"{'operación':>10} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9}")
+        for tipo in ('venta', 'busqueda', 'anulacion'):
+            tiempos = metricas[tipo]
+            if not tiempos:
+                continue
+            self.stdout.write(
+                f'{tipo:>10} {len(tiempos):>6} {statistics.median(tiempos):>9.2f} '
+                f'{_percentil(tiempos, 0.95):>9.2f} {_percentil(tiempos, 0.99):>9.2f} {max(tiempos):>9.2f}'
+            )
+        if bloqueos is None:
+            self.stdout.write('Esperas por bloqueo: solo se miden en PostgreSQL.')
+        elif bloqueos:
+            con_espera = sum(1 for m in bloqueos if m)
+            self.stdout.write(
+                f'Esperas por bloqueo: {100 * con_espera / len(bloqueos):.1f}% de las muestras, '
+                f'máximo {max(bloqueos)} sesiones esperando, promedio {statistics.mean(bloqueos):.2f}'
+            )
+
+    def _verificar(self, datos):
+        from inventario.models import MovimientoInventario, Producto
+        from inventario.services import reconciliar_stock_fragmentado
+        from ventas.models import DetalleVenta
+
+        reconciliar_stock_fragmentado(datos['productos'])
+        stock_final = dict(Producto.objects.filter(pk__in=datos['productos']).values_list('pk', 'cantidad'))
+        vendido = dict(
+            DetalleVenta.objects.filter(producto_id__in=datos['productos'], venta__estado='ACT')
+            .values('producto_id').annotate(total=Sum('cantidad')).values_list('producto_id', 'total')
+        )
+        kardex = dict(
+            MovimientoInventario.objects.filter(producto_id__in=datos['productos'])
+            .values('producto_id').annotate(total=Sum('cantidad')).values_list('producto_id', 'total')
+        )
+
+        sobrevendidos = [pk for pk, cantidad in stock_final.items() if cantidad < 0]
+        descuadres = [
+            pk for pk in datos['productos']
+            if datos['stock_inicial'][pk] - stock_final[pk] != vendido.get(pk, 0)
+            or kardex.get(pk, 0) != -vendido.get(pk, 0)
+        ]
+        if sobrevendidos:
+            self.stdout.write(self.style.ERROR(f'Productos sobrevendidos: {", ".join(sobrevendidos)}'))
+        if descuadres:
+            self.stdout.write(self.style.ERROR(
+                f'Stock descontado distinto de lo vendido en: {", ".join(descuadres)}'
+            ))
+        if not sobrevendidos and not descuadres:
+            self.stdout.write(self.style.SUCCESS(
+                'Verificación OK: sin sobreventa y el stock descontado coincide con DetalleVenta y el kardex.'
+            ))
+
+    def _eliminar_datos(self, datos):
+        from django.contrib.auth.models import User
+        from inventario.models import Producto
+        from ventas.models import Caja, Venta
+
+        usuarios = datos['cajeros'] + [datos['supervisor']]
+        Venta.objects.filter(owner__in=usuarios).delete()
+        Caja.objects.filter(usuario_apertura__in=usuarios).delete()
+        Producto.objects.filter(pk__in=datos['productos']).delete()
+        User.objects.filter(pk__in=[u.pk for u in usuarios]).delete()
+        self.stdout.write('Datos de prueba eliminados.')
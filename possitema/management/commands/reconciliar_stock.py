@@ -0,0 +1,47 @@
+"""
+Comando Django para consolidar el stock fragmentado.
+
+Copia a Producto.cantidad la suma de los fragmentos de cada producto de alta
+rotación. Búsquedas del POS, reservas, catálogo local y alertas ya suman los
+fragmentos al leer (inventario.services.STOCK_ACTUAL); el listado de
+productos, los reportes y las deltas del catálogo local dependen de esta
+consolidación, así que conviene programarlo cada pocos minutos (cron / tarea
+programada o `--intervalo`).
+
+Uso:
+    python manage.py reconciliar_stock
+    python manage.py reconciliar_stock --productos P001 P002
+    python manage.py reconciliar_stock --intervalo 60   # Repetir cada 60 s
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Consolidar en Producto.cantidad el stock de los productos fragmentados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--productos',
+            nargs='+',
+            default=None,
+            help='Reconciliar solo estos id_producto'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=0,
+            help='Segundos entre ejecuciones (0 = ejecutar una sola vez)'
+        )
+
+    def handle(self, *args, **options):
+        from inventario.services import reconciliar_stock_fragmentado
+
+        while True:
+            actualizados = reconciliar_stock_fragmentado(options['productos'])
+            self.stdout.write(self.style.SUCCESS(f'Productos reconciliados: {actualizados}'))
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
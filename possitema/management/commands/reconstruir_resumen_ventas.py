@@ -0,0 +1,49 @@
+"""
+Comando Django para recalcular el resumen diario de ventas
+(ResumenVentaDiaria) a partir de Venta y DetalleVenta.
+
+Debe ejecutarse una vez después de la migración que crea la tabla, para
+cargar el historial, y puede repetirse cuando haga falta corregir un rango:
+las filas de los días indicados se reemplazan, no se suman.
+
+Uso:
+    python manage.py reconstruir_resumen_ventas
+    python manage.py reconstruir_resumen_ventas --desde 2026-01-01 --hasta 2026-01-31
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Recalcular el resumen diario de ventas desde las ventas registradas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=str,
+            default=None,
+            help='Primer día (AAAA-MM-DD, fecha local). Por defecto, desde la primera venta.'
+        )
+        parser.add_argument(
+            '--hasta',
+            type=str,
+            default=None,
+            help='Último día (AAAA-MM-DD, fecha local). Por defecto, hasta la última venta.'
+        )
+
+    def handle(self, *args, **options):
+        from ventas.services import reconstruir_resumen
+
+        fechas = {}
+        for opcion in ('desde', 'hasta'):
+            fechas[opcion] = None
+            if options[opcion]:
+                try:
+                    fechas[opcion] = date.fromisoformat(options[opcion])
+                except ValueError:
+                    raise CommandError(f'--{opcion} debe tener formato AAAA-MM-DD.')
+
+        creadas = reconstruir_resumen(fechas['desde'], fechas['hasta'])
+        self.stdout.write(self.style.SUCCESS(f'Filas de resumen diario creadas: {creadas}'))
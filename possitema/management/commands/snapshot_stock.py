@@ -0,0 +1,42 @@
+"""
+Comando Django para guardar un snapshot del stock de todos los productos.
+
+El stock a una fecha y los reportes de kardex parten del último snapshot y
+solo suman los movimientos posteriores, así que conviene programarlo a
+diario (cron / tarea programada), por ejemplo al cierre del día.
+
+Uso:
+    python manage.py snapshot_stock
+    python manage.py snapshot_stock --fecha 2026-01-31   # Stock al cierre de ese día
+"""
+
+from datetime import date, datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Guardar un snapshot del stock de todos los productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha',
+            type=str,
+            default=None,
+            help='Día (AAAA-MM-DD) cuyo cierre se guarda. Por defecto, el momento actual.'
+        )
+
+    def handle(self, *args, **options):
+        from inventario.services import generar_snapshots_stock
+
+        fecha = None
+        if options['fecha']:
+            try:
+                dia = date.fromisoformat(options['fecha'])
+            except ValueError:
+                raise CommandError('La fecha debe tener formato AAAA-MM-DD.')
+            fecha = timezone.make_aware(datetime.combine(dia, time.max))
+
+        creados = generar_snapshots_stock(fecha)
+        self.stdout.write(self.style.SUCCESS(f'Snapshots de stock creados: {creados}'))
@@ -1 +1,20 @@
 # Middleware de suscripción eliminado — no se implementará
+
+
+class PresenciaMiddleware:
+    """
+    Mantiene al día la presencia (usuarios.SesionActiva) de los usuarios
+    autenticados. Solo escribe cuando la última marca de la sesión tiene más
+    de usuarios.services.INTERVALO_ACTIVIDAD, no en cada petición.
+    Debe ir después de AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.user.is_authenticated:
+            from usuarios.services import marcar_actividad
+
+            marcar_actividad(request)
+        return self.get_response(request)
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _codigo(valor):
+    return str(valor or '001').zfill(3)
+
+
+def continuar_numeracion_existente(apps, schema_editor):
+    """
+    Hasta ahora el secuencial era el id de la venta: las ventas existentes lo
+    conservan (con el establecimiento y punto de emisión de la configuración
+    de su propietario), para que reimprimirlas no cambie su clave de acceso,
+    y las secuencias de los puntos de emisión configurados continúan después
+    del mayor id emitido.
+    """
+    from django.db.models import F, Max
+    ConfiguracionEmpresa = apps.get_model('possitema', 'ConfiguracionEmpresa')
+    SecuenciaComprobante = apps.get_model('possitema', 'SecuenciaComprobante')
+    Venta = apps.get_model('ventas', 'Venta')
+
+    # Si un usuario tiene varias configuraciones se usaba la primera
+    for config in ConfiguracionEmpresa.objects.exclude(user=None).order_by('pk'):
+        Venta.objects.filter(owner_id=config.user_id, secuencial_sri__isnull=True).update(
+            secuencial_sri=F('id_venta'),
+            establecimiento_sri=_codigo(config.codigo_establecimiento_emisor),
+            punto_emision_sri=_codigo(config.codigo_punto_emision),
+        )
+    Venta.objects.filter(secuencial_sri__isnull=True).update(
+        secuencial_sri=F('id_venta'), establecimiento_sri='001', punto_emision_sri='001',
+    )
+
+    ultimo = Venta.objects.aggregate(m=Max('id_venta'))['m'] or 0
+    for config in ConfiguracionEmpresa.objects.exclude(ruc=''):
+        SecuenciaComprobante.objects.get_or_create(
+            ruc=str(config.ruc).zfill(13),
+            establecimiento=_codigo(config.codigo_establecimiento_emisor),
+            punto_emision=_codigo(config.codigo_punto_emision),
+            tipo_comprobante='01',
+            defaults={'siguiente': ultimo + 1},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('possitema', '0023_remove_plan_suscripcion_registropago'),
+        ('ventas', '0010_venta_establecimiento_sri_venta_punto_emision_sri_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaComprobante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ruc', models.CharField(max_length=13)),
+                ('establecimiento', models.CharField(max_length=3)),
+                ('punto_emision', models.CharField(max_length=3)),
+                ('tipo_comprobante', models.CharField(default='01', max_length=2)),
+                ('siguiente', models.PositiveBigIntegerField(default=1)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Comprobante',
+                'verbose_name_plural': 'Secuencias de Comprobantes',
+                'constraints': [models.UniqueConstraint(fields=('ruc', 'establecimiento', 'punto_emision', 'tipo_comprobante'), name='secuencia_comprobante_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BloqueSecuencial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('siguiente', models.PositiveBigIntegerField()),
+                ('fin', models.PositiveBigIntegerField()),
+                ('secuencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bloques', to='possitema.secuenciacomprobante')),
+            ],
+            options={
+                'verbose_name': 'Bloque de Secuenciales',
+                'verbose_name_plural': 'Bloques de Secuenciales',
+                'indexes': [models.Index(fields=['secuencia', 'siguiente'], name='bloque_secuencia_sig_idx')],
+            },
+        ),
+        migrations.RunPython(continuar_numeracion_existente, migrations.RunPython.noop),
+    ]
@@ -122,6 +122,52 @@ class ConfiguracionEmpresa(models.Model):
         return self.gmail_app_password or None
 
 
+class SecuenciaComprobante(models.Model):
+    """
+    Numeración SRI de un tipo de comprobante en un punto de emisión.
+    `siguiente` es el primer número que aún no se entregó a ningún bloque.
+    """
+    ruc = models.CharField(max_length=13)
+    establecimiento = models.CharField(max_length=3)
+    punto_emision = models.CharField(max_length=3)
+    tipo_comprobante = models.CharField(max_length=2, default='01')
+    siguiente = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Secuencia de Comprobante"
+        verbose_name_plural = "Secuencias de Comprobantes"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ruc', 'establecimiento', 'punto_emision', 'tipo_comprobante'],
+                name='secuencia_comprobante_unica',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.ruc} {self.establecimiento}-{self.punto_emision} ({self.tipo_comprobante}): {self.siguiente}"
+
+
+class BloqueSecuencial(models.Model):
+    """
+    Rango de números reservado de una secuencia: [siguiente, fin] aún sin usar.
+    Cada emisión bloquea un bloque libre (los demás emisores toman otro), así
+    que la fila de la secuencia solo se bloquea al reservar un bloque nuevo.
+    """
+    secuencia = models.ForeignKey(SecuenciaComprobante, on_delete=models.CASCADE, related_name='bloques')
+    siguiente = models.PositiveBigIntegerField()
+    fin = models.PositiveBigIntegerField()
+
+    class Meta:
+        verbose_name = "Bloque de Secuenciales"
+        verbose_name_plural = "Bloques de Secuenciales"
+        indexes = [
+            models.Index(fields=['secuencia', 'siguiente'], name='bloque_secuencia_sig_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.secuencia_id}: {self.siguiente}-{self.fin}"
+
+
 class RespaldoDB(models.Model):
     """Modelo para registrar y gestionar respaldos de la base de datos."""
     
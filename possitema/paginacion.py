@@ -0,0 +1,173 @@
+# possitema/paginacion.py
+"""
+Paginación por cursor (keyset) para los historiales grandes.
+
+Paginator de Django hace un COUNT(*) completo en cada página y salta filas
+con OFFSET, así que la página 500 del historial de ventas recorre todas las
+anteriores. Aquí cada página continúa desde la última fila de la anterior
+con una condición sobre (fecha, pk), que el índice resuelve igual de rápido
+en la primera página que en la última.
+
+Las vistas reciben `?despues=<cursor>` (filas más antiguas) o
+`?antes=<cursor>` (más recientes). El total solo se calcula si la plantilla
+lo pide: `total_estimado` usa la estimación del planificador en PostgreSQL y
+`total` hace el COUNT exacto.
+"""
+import base64
+import json
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+POR_PAGINA_MAXIMO = 100
+PARAMETROS_CURSOR = ('despues', 'antes', 'page')
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no se pudo decodificar."""
+
+
+def _codificar(valores):
+    texto = json.dumps(valores, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decodificar(cursor):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        fecha, pk = json.loads(texto)
+    except (ValueError, TypeError) as e:
+        raise CursorInvalido(cursor) from e
+    # Un cursor propio siempre trae la fecha en texto y un pk escalar
+    if not isinstance(fecha, str) or isinstance(pk, bool) or not isinstance(pk, (str, int)):
+        raise CursorInvalido(cursor)
+    return fecha, pk
+
+
+def _campo_modelo(modelo, ruta):
+    """Campo del modelo al final de una ruta 'relacion__campo'."""
+    *relaciones, nombre = ruta.split('__')
+    for relacion in relaciones:
+        modelo = modelo._meta.get_field(relacion).related_model
+    return modelo._meta.get_field(nombre)
+
+
+def contar_estimado(queryset):
+    """
+    Número aproximado de filas: en PostgreSQL, la estimación del plan (sin
+    recorrer la tabla); en otros motores, un COUNT normal.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class PaginaCursor:
+    """Página de resultados con enlaces a la anterior y a la siguiente."""
+
+    def __init__(self, filas, queryset, campo_fecha, hay_anterior, hay_siguiente, parametros):
+        self.object_list = filas
+        self._queryset = queryset
+        self._campo_fecha = campo_fecha
+        self.has_previous = hay_anterior
+        self.has_next = hay_siguiente
+        self._parametros = parametros
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+    @property
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    def _cursor(self, fila):
+        fecha = reduce(getattr, self._campo_fecha.split('__'), fila)
+        # isoformat completo: DjangoJSONEncoder recorta a milisegundos
+        return _codificar([fecha.isoformat(), fila.pk])
+
+    @property
+    def cursor_siguiente(self):
+        return self._cursor(self.object_list[-1]) if self.has_next and self.object_list else ''
+
+    @property
+    def cursor_anterior(self):
+        return self._cursor(self.object_list[0]) if self.has_previous and self.object_list else ''
+
+    @property
+    def query_string(self):
+        """Parámetros de la petición sin el cursor, para armar los enlaces."""
+        parametros = self._parametros.copy()
+        for nombre in PARAMETROS_CURSOR:
+            parametros.pop(nombre, None)
+        return parametros.urlencode()
+
+    @cached_property
+    def total_estimado(self):
+        return contar_estimado(self._queryset)
+
+    @cached_property
+    def total(self):
+        return self._queryset.count()
+
+
+def paginar_por_cursor(queryset, request, campo_fecha, por_pagina):
+    """
+    Página de `queryset` ordenada de la fila más reciente a la más antigua
+    por (`campo_fecha`, pk), según el cursor de la petición.
+
+    Args:
+        campo_fecha: Ruta del campo de fecha, p. ej. 'fecha_venta' o
+            'venta__fecha_venta' (la relación debe ir en select_related).
+        por_pagina: Filas por página (máximo POR_PAGINA_MAXIMO).
+
+    Un cursor inválido o manipulado devuelve la primera página.
+    """
+    por_pagina = max(1, min(por_pagina, POR_PAGINA_MAXIMO))
+    campo = _campo_modelo(queryset.model, campo_fecha)
+    base = queryset.order_by()
+    parametros = request.GET
+
+    direccion, cursor = None, None
+    for nombre in ('despues', 'antes'):
+        if parametros.get(nombre):
+            try:
+                fecha, valor_pk = _decodificar(parametros[nombre])
+                cursor = (campo.to_python(fecha), queryset.model._meta.pk.to_python(valor_pk))
+                if None not in cursor:
+                    direccion = nombre
+            except (CursorInvalido, ValidationError, TypeError, ValueError):
+                cursor = None
+            break
+
+    if direccion == 'antes':
+        # Filas más recientes que el cursor, de la más cercana hacia atrás
+        fecha, valor_pk = cursor
+        filas = list(
+            base.filter(Q(**{f'{campo_fecha}__gt': fecha}) | Q(**{campo_fecha: fecha, 'pk__gt': valor_pk}))
+            .order_by(campo_fecha, 'pk')[:por_pagina + 1]
+        )
+        if len(filas) > por_pagina:
+            return PaginaCursor(filas[:por_pagina][::-1], queryset, campo_fecha, True, True, parametros)
+        # Se llegó al inicio: se muestra la primera página completa
+        direccion = None
+
+    ordenado = base.order_by(f'-{campo_fecha}', '-pk')
+    if direccion == 'despues':
+        fecha, valor_pk = cursor
+        ordenado = ordenado.filter(
+            Q(**{f'{campo_fecha}__lt': fecha}) | Q(**{campo_fecha: fecha, 'pk__lt': valor_pk})
+        )
+    filas = list(ordenado[:por_pagina + 1])
+    hay_siguiente = len(filas) > por_pagina
+    return PaginaCursor(filas[:por_pagina], queryset, campo_fecha, direccion == 'despues', hay_siguiente, parametros)
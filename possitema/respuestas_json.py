@@ -0,0 +1,52 @@
+# possitema/respuestas_json.py
+"""
+Respuestas JSON compactas para los endpoints AJAX del POS.
+
+Cada endpoint declara su esquema: un tuple de pares (clave en el JSON,
+campo o anotación del queryset). Las filas se leen con `values_list`, sin
+instanciar modelos ni seguir relaciones fila por fila, y se serializan con
+orjson (incluido en requirements.txt); si falta, por ejemplo en un entorno
+de desarrollo instalado a mano, con json en su forma compacta. Los Decimal
+se envían como número, igual que el `float()` que hacían las vistas.
+
+La compresión no se decide aquí: las vistas usan `gzip_page`, que deja sin
+comprimir las respuestas de menos de 200 bytes.
+"""
+import json
+from decimal import Decimal
+
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _convertir(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    raise TypeError(f'{type(valor).__name__} no es serializable a JSON')
+
+
+def serializar(datos):
+    """Bytes JSON de `datos`, sin espacios y con UTF-8 sin escapar."""
+    if orjson is not None:
+        return orjson.dumps(datos, default=_convertir)
+    return json.dumps(datos, default=_convertir, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def filas(queryset, esquema):
+    """Lista de diccionarios con las claves de `esquema` leída en una sola consulta."""
+    claves = [clave for clave, _ in esquema]
+    return [dict(zip(claves, valores)) for valores in queryset.values_list(*(campo for _, campo in esquema))]
+
+
+class RespuestaJSON(HttpResponse):
+    """Como JsonResponse, pero con el serializador compacto y listas permitidas."""
+
+    def __init__(self, datos, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=serializar(datos), **kwargs)
@@ -1,13 +1,21 @@
 
+from datetime import timedelta
+
 from django.db import transaction
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 # Importaciones NECESARIAS para el servicio
-from ventas.models import Venta, DetalleVenta
+from ventas.models import (
+    CAMPOS_BASE_POR_TARIFA, CAMPOS_IVA_POR_TARIFA, CODIGOS_PORCENTAJE_IVA_SRI, PORCENTAJES_IVA, TARIFA_IVA_DEFECTO, DetalleVenta, Venta,
+)
+from ventas.services import acumular_venta
 from inventario.models import Producto
+from inventario.services import StockInsuficienteError, descontar_stock, liberar_reservas, registrar_movimientos
 from cliente.models import Cliente
-from .models import ConfiguracionEmpresa
+from .models import BloqueSecuencial, ConfiguracionEmpresa, SecuenciaComprobante
 
 
 def obtener_configuracion_empresa(user=None):
@@ -20,10 +28,95 @@ def obtener_configuracion_empresa(user=None):
     return None
 
 
-def registrar_venta_completa(user, carrito_data, total_venta_calculado, cliente_id=None, caja=None, metodo_pago='efectivo'):
+def _agrupar_cantidades_carrito(carrito_data):
+    """
+    Suma las cantidades solicitadas por producto.
+    Un mismo producto puede aparecer en varias líneas del carrito.
+    """
+    cantidades = {}
+    for item in carrito_data:
+        producto_pk = str(item.get('id'))
+        cantidades[producto_pk] = cantidades.get(producto_pk, 0) + int(item.get('cantidad'))
+    return cantidades
+
+
+def bloquear_productos(producto_pks):
+    """
+    Bloquea todos los productos indicados con un único SELECT ... FOR UPDATE.
+    Las filas se bloquean ordenadas por id_producto para que dos cajeros que
+    venden los mismos productos nunca se bloqueen mutuamente (deadlock).
+
+    Los productos con stock fragmentado no se bloquean: su stock se descuenta
+    de los fragmentos y solo se leen si forman parte del carrito.
+
+    Returns:
+        dict: {id_producto: Producto}
+    """
+    productos = {
+        p.pk: p for p in Producto.objects.select_for_update().filter(
+            pk__in=producto_pks, stock_fragmentado=False
+        ).order_by('id_producto')
+    }
+    faltantes = set(producto_pks) - productos.keys()
+    if faltantes:
+        productos.update(
+            (p.pk, p) for p in Producto.objects.filter(pk__in=faltantes, stock_fragmentado=True)
+        )
+    return productos
+
+
+def _redondear_centavos(valor):
+    return valor.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def calcular_impuestos_detalles(detalles):
+    """
+    Congela en cada DetalleVenta la tarifa, el porcentaje y el valor de IVA
+    (el subtotal de la línea es su base imponible) y devuelve los totales por
+    tarifa listos para crear la Venta. Todo se calcula en memoria.
+
+    El IVA de cada tarifa se redondea sobre la base acumulada, como lo valida
+    el SRI; el de cada línea se redondea por separado.
+    """
+    totales = {campo: Decimal('0.00') for campo in CAMPOS_BASE_POR_TARIFA.values()}
+    for detalle in detalles:
+        tarifa = detalle.tarifa_iva if detalle.tarifa_iva in PORCENTAJES_IVA else TARIFA_IVA_DEFECTO
+        porcentaje = PORCENTAJES_IVA[tarifa]
+        detalle.tarifa_iva = tarifa
+        detalle.porcentaje_iva = porcentaje
+        detalle.valor_iva = _redondear_centavos(detalle.subtotal * porcentaje / Decimal('100'))
+        totales[CAMPOS_BASE_POR_TARIFA[tarifa]] += detalle.subtotal
+
+    for tarifa, campo_iva in CAMPOS_IVA_POR_TARIFA.items():
+        base = totales[CAMPOS_BASE_POR_TARIFA[tarifa]]
+        totales[campo_iva] = _redondear_centavos(base * PORCENTAJES_IVA[tarifa] / Decimal('100'))
+    totales['subtotal_sin_impuestos'] = sum(totales[c] for c in CAMPOS_BASE_POR_TARIFA.values())
+    totales['iva_total'] = sum(totales[c] for c in CAMPOS_IVA_POR_TARIFA.values())
+    return totales
+
+
+def buscar_venta_idempotente(user, clave_idempotencia):
+    """
+    Retorna la venta ya registrada por el cajero con esa clave de idempotencia,
+    o None. Es una sola lectura por índice único: no bloquea ni escribe.
+    """
+    if not clave_idempotencia:
+        return None
+    return Venta.objects.filter(
+        antendido_por=user,
+        clave_idempotencia=clave_idempotencia
+    ).only('id_venta', 'es_credito', 'total').first()
+
+
+def registrar_venta_completa(user, carrito_data, total_venta_calculado, cliente_id=None, caja=None, metodo_pago='efectivo', clave_idempotencia=None, fecha_venta=None):
     """
     Procesa la venta completa dentro de una transacción atómica.
     Crea la Venta, los DetalleVenta y actualiza el stock de Productos.
+
+    Todos los productos del carrito se bloquean en una sola consulta, el
+    stock se valida en memoria y se descuenta con un único UPDATE. La base
+    imponible y el IVA de cada línea, y los totales por tarifa, se guardan en
+    los mismos INSERT para que los comprobantes no tengan que recalcularlos.
     
     Args:
         user: Usuario que realiza la venta
@@ -32,6 +125,11 @@ def registrar_venta_completa(user, carrito_data, total_venta_calculado, cliente_
         cliente_id: ID del cliente (opcional)
         caja: Instancia de Caja activa (opcional pero recomendado)
         metodo_pago: Método de pago (efectivo, tarjeta, credito, etc.)
+        clave_idempotencia: Clave única generada por el POS (opcional). Si otra
+            petición ya registró la venta con la misma clave, el INSERT falla
+            con IntegrityError y la transacción se revierte.
+        fecha_venta: Momento real de la venta (opcional), para las ventas
+            hechas sin conexión; por defecto, el momento del registro.
     """
     
     # Iniciar la transacción atómica: si algo falla, todo se revierte
@@ -51,8 +149,44 @@ def registrar_venta_completa(user, carrito_data, total_venta_calculado, cliente_
                 cliente = Cliente.objects.get(pk=cliente_id)
             except Cliente.DoesNotExist:
                 raise Exception("Cliente no encontrado o ID inválido.")
+
+        # 2. Bloquear todos los productos del carrito en un solo round-trip
+        cantidades = _agrupar_cantidades_carrito(carrito_data)
+        productos = bloquear_productos(list(cantidades.keys()))
+
+        # 3. Validar existencia y stock en memoria
+        for producto_pk, cantidad_vendida in cantidades.items():
+            producto = productos.get(producto_pk)
+            if producto is None:
+                raise Exception(f"Producto ID {producto_pk} no encontrado en el inventario.")
+            # El stock fragmentado se valida al descontar de los fragmentos
+            if not producto.stock_fragmentado and producto.cantidad < cantidad_vendida:
+                raise StockInsuficienteError(f"Stock insuficiente para {producto.nombre}. Disponible: {producto.cantidad}, Solicitado: {cantidad_vendida}.")
         
-        # 2. Crear la instancia de Venta (usando 'antendido_por', 'total' y 'caja')
+        # 4. Preparar los DetalleVenta y su IVA antes de crear la venta
+        detalles_a_crear = []
+        for item in carrito_data:
+            producto = productos[str(item.get('id'))]
+            cantidad_vendida = int(item.get('cantidad'))
+            precio_unitario = Decimal(str(item.get('precio')))
+            subtotal = precio_unitario * cantidad_vendida
+            detalles_a_crear.append(DetalleVenta(
+                producto=producto,
+                producto_codigo=producto.pk,
+                producto_nombre=producto.nombre,
+                cantidad=cantidad_vendida,
+                precio_unitario=precio_unitario,
+                subtotal=subtotal,
+                costo_al_vender=producto.precio_costo,  # Guardar el costo al momento de venta
+                tarifa_iva=producto.tarifa_iva,
+            ))
+        impuestos = calcular_impuestos_detalles(detalles_a_crear)
+
+        # Secuencial SRI del punto de emisión, en la misma transacción: si la
+        # venta se revierte, el número vuelve a su bloque
+        numeracion = numeracion_sri(obtener_configuracion_empresa(user))
+
+        # 5. Crear la instancia de Venta (usando 'antendido_por', 'total' y 'caja')
         es_credito = metodo_pago == 'credito'
         venta = Venta.objects.create(
             antendido_por=user,
@@ -65,48 +199,34 @@ def registrar_venta_completa(user, carrito_data, total_venta_calculado, cliente_
             monto_credito=total_venta_calculado if es_credito else Decimal('0.00'),
             monto_pagado=Decimal('0.00') if es_credito else total_venta_calculado,
             estado_credito='PENDIENTE' if es_credito else 'PAGADA',
+            clave_idempotencia=clave_idempotencia or None,
+            **impuestos,
+            **numeracion,
         )
-        
-        detalles_a_crear = []
-        productos_a_actualizar = []
-
-        # 3. Procesar cada ítem del carrito
-        for item in carrito_data:
-            producto_pk = item.get('id') 
-            cantidad_vendida = int(item.get('cantidad'))
-            precio_unitario = Decimal(str(item.get('precio')))
-
-            try:
-                # Bloquear la fila del producto para asegurar consistencia de stock
-                # Asumo que el campo de stock en Producto es 'cantidad'
-                producto = Producto.objects.select_for_update().get(pk=producto_pk)
-            except Producto.DoesNotExist:
-                raise Exception(f"Producto ID {producto_pk} no encontrado en el inventario.")
-
-            # Validación de stock 
-            if producto.cantidad < cantidad_vendida: 
-                raise Exception(f"Stock insuficiente para {producto.nombre}. Disponible: {producto.cantidad}, Solicitado: {cantidad_vendida}.")
-
-            # Preparar DetalleVenta
-            subtotal = precio_unitario * cantidad_vendida
-            detalles_a_crear.append(DetalleVenta(
-                venta=venta,
-                producto=producto,
-                cantidad=cantidad_vendida,
-                precio_unitario=precio_unitario,
-                subtotal=subtotal,
-                costo_al_vender=producto.precio_costo  # Guardar el costo al momento de venta
-            ))
-            
-            # Descontar stock
-            producto.cantidad -= cantidad_vendida 
-            productos_a_actualizar.append(producto)
+        if fecha_venta is not None:
+            # fecha_venta es auto_now_add: se corrige después del INSERT,
+            # antes de que el resumen diario y el kardex la lean
+            Venta.objects.filter(pk=venta.pk).update(fecha_venta=fecha_venta)
+            venta.fecha_venta = fecha_venta
+        for detalle in detalles_a_crear:
+            detalle.venta = venta
 
-        # 4. Guardar todos los detalles y actualizar stock en masa
+        # 6. Guardar detalles, descontar stock y registrar el kardex en masa
         DetalleVenta.objects.bulk_create(detalles_a_crear)
-        Producto.objects.bulk_update(productos_a_actualizar, ['cantidad']) 
+        acumular_venta(
+            venta,
+            subtotal=sum((d.subtotal for d in detalles_a_crear), Decimal('0')),
+            costo=sum((d.costo_al_vender * d.cantidad for d in detalles_a_crear), Decimal('0')),
+        )
+        descontar_stock(cantidades, fragmentados={pk for pk, p in productos.items() if p.stock_fragmentado})
+        registrar_movimientos(
+            {pk: -cantidad for pk, cantidad in cantidades.items()},
+            'VENTA', usuario=user, referencia=f"Venta #{venta.id_venta}", fecha=venta.fecha_venta,
+        )
+        # El carrito ya se cobró: sus reservas dejan de apartar stock
+        liberar_reservas(user, list(cantidades.keys()))
 
-        # 5. Crear CuentaPorCobrar si la venta es a crédito
+        # 7. Crear CuentaPorCobrar si la venta es a crédito
         if hasattr(venta, 'es_credito') and venta.es_credito:
             # Usar monto_credito si está definido, si no usar total
             monto_credito = venta.monto_credito if venta.monto_credito > 0 else venta.total
@@ -122,6 +242,305 @@ def registrar_venta_completa(user, carrito_data, total_venta_calculado, cliente_
         return venta
 
 
+NOMBRE_PRODUCTO_ELIMINADO = 'Producto eliminado'
+
+
+def completar_snapshot_detalles_venta(tamano_lote=1000):
+    """
+    Copia código y nombre del producto en los DetalleVenta registrados antes
+    de que existieran esas columnas. Recorre los detalles pendientes por lotes
+    de `tamano_lote` en orden de pk, con una lectura (unida a Producto) y un
+    UPDATE en bloque por lote, cada uno en su propia transacción.
+
+    Los detalles cuyo producto ya fue eliminado quedan como
+    NOMBRE_PRODUCTO_ELIMINADO: el FK ya no permite recuperar el original.
+
+    Returns:
+        int: Número de detalles completados.
+    """
+    pendientes = DetalleVenta.objects.filter(producto_nombre='').order_by('pk')
+    completados = 0
+    ultimo_pk = 0
+    while True:
+        lote = list(
+            pendientes.filter(pk__gt=ultimo_pk).values('pk', 'producto_id', 'producto__nombre')[:tamano_lote]
+        )
+        if not lote:
+            return completados
+        ultimo_pk = lote[-1]['pk']
+        detalles = [
+            DetalleVenta(
+                pk=fila['pk'],
+                producto_codigo=fila['producto_id'] or '',
+                producto_nombre=fila['producto__nombre'] or NOMBRE_PRODUCTO_ELIMINADO,
+            )
+            for fila in lote
+        ]
+        with transaction.atomic():
+            DetalleVenta.objects.bulk_update(detalles, ['producto_codigo', 'producto_nombre'])
+        completados += len(detalles)
+
+
+# Margen para la diferencia de reloj entre el POS y el servidor
+TOLERANCIA_RELOJ_OFFLINE = timedelta(minutes=5)
+
+
+def _fecha_venta_offline(valor, caja, ahora):
+    """
+    Fecha en que el POS registró la venta sin conexión (ISO 8601), validada
+    contra el turno de la caja.
+
+    Returns:
+        (datetime o None, error o None). Sin `valor` se usa la hora del
+        registro, como las ventas en línea.
+    """
+    if not valor:
+        return None, None
+    try:
+        fecha = parse_datetime(valor) if isinstance(valor, str) else None
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        return None, 'Fecha de la venta offline inválida.'
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    if fecha > ahora + TOLERANCIA_RELOJ_OFFLINE:
+        return None, 'La fecha de la venta offline está en el futuro.'
+    if caja is not None and fecha < caja.fecha_apertura:
+        return None, 'La venta offline es anterior a la apertura de la caja.'
+    return min(fecha, ahora), None
+
+
+def _clave_offline_invalida(clave):
+    """Error si la clave no es un texto no vacío que quepa en Venta.clave_idempotencia."""
+    largo = Venta._meta.get_field('clave_idempotencia').max_length
+    if not isinstance(clave, str) or not clave.strip():
+        return 'La venta offline no tiene una clave de idempotencia válida.'
+    if len(clave) > largo:
+        return f'La clave de idempotencia supera los {largo} caracteres.'
+    return None
+
+
+def _ventas_por_clave(user, claves):
+    """
+    {clave: id_venta} de las claves ya registradas. La clave es única en
+    toda la tabla, así que se busca sin filtrar por cajero; la de otro
+    cajero también es duplicada, pero sin exponer su venta (id None).
+    """
+    if not claves:
+        return {}
+    return {
+        clave: id_venta if cajero_id == user.pk else None
+        for clave, id_venta, cajero_id in Venta.objects.filter(
+            clave_idempotencia__in=claves
+        ).values_list('clave_idempotencia', 'id_venta', 'antendido_por_id')
+    }
+
+
+def sincronizar_ventas_offline(user, ventas_data, caja=None, tamano_lote=50):
+    """
+    Registra en bloque las ventas que el POS acumuló sin conexión.
+
+    Cada venta pasa por registrar_venta_completa (mismas validaciones y
+    bloqueos) con la fecha en que se hizo (`fecha_offline`), que debe caer
+    dentro del turno de la caja, y se confirma en su propia transacción:
+    los bloqueos de stock no se retienen mientras se procesa el resto de la
+    cola y un conflicto solo descarta esa venta. Las claves de idempotencia
+    ya registradas se resuelven con una consulta por cada `tamano_lote`
+    ventas, de modo que reenviar la cola después de un corte es seguro.
+
+    Args:
+        user: Cajero que registró las ventas
+        ventas_data: Lista de dicts con clave_idempotencia (obligatoria),
+            carrito, total, cliente_id, metodo_pago (mismo formato que
+            procesar_venta_ajax) y fecha_offline
+        caja: Caja abierta a la que se asignan las ventas
+        tamano_lote: Ventas cuyas claves se consultan juntas
+
+    Returns:
+        list: Un dict por venta con clave_idempotencia, estado
+            ('registrada', 'duplicada', 'conflicto' o 'error'), venta_id y error.
+    """
+    from django.db import IntegrityError
+
+    resultados = []
+    for inicio in range(0, len(ventas_data), tamano_lote):
+        lote = ventas_data[inicio:inicio + tamano_lote]
+        existentes = _ventas_por_clave(user, [
+            v['clave_idempotencia'] for v in lote
+            if isinstance(v, dict) and not _clave_offline_invalida(v.get('clave_idempotencia'))
+        ])
+
+        for venta_data in lote:
+            if not isinstance(venta_data, dict):
+                resultados.append({
+                    'clave_idempotencia': None, 'venta_id': None,
+                    'estado': 'error', 'error': 'Formato de venta inválido.',
+                })
+                continue
+            clave = venta_data.get('clave_idempotencia')
+            resultado = {'clave_idempotencia': clave, 'venta_id': None, 'error': None}
+
+            error = _clave_offline_invalida(clave)
+            if error:
+                resultado.update(estado='error', error=error)
+                resultados.append(resultado)
+                continue
+            if clave in existentes:
+                resultado.update(estado='duplicada', venta_id=existentes[clave])
+                resultados.append(resultado)
+                continue
+            if not venta_data.get('carrito'):
+                resultado.update(estado='error', error='El carrito está vacío.')
+                resultados.append(resultado)
+                continue
+            fecha_venta, error = _fecha_venta_offline(venta_data.get('fecha_offline'), caja, timezone.now())
+            if error:
+                resultado.update(estado='error', error=error)
+                resultados.append(resultado)
+                continue
+
+            try:
+                venta = registrar_venta_completa(
+                    user=user,
+                    carrito_data=venta_data['carrito'],
+                    total_venta_calculado=venta_data.get('total', 0),
+                    cliente_id=venta_data.get('cliente_id'),
+                    caja=caja,
+                    metodo_pago=venta_data.get('metodo_pago', 'efectivo'),
+                    clave_idempotencia=clave,
+                    fecha_venta=fecha_venta,
+                )
+                resultado.update(estado='registrada', venta_id=venta.id_venta)
+                existentes[clave] = venta.id_venta
+            except StockInsuficienteError as e:
+                resultado.update(estado='conflicto', error=str(e))
+            except IntegrityError:
+                # Otra petición registró la misma clave entre la consulta y el INSERT
+                previas = _ventas_por_clave(user, [clave])
+                if clave in previas:
+                    resultado.update(estado='duplicada', venta_id=previas[clave])
+                else:
+                    resultado.update(estado='error', error='No se pudo registrar la venta.')
+            except Exception as e:
+                resultado.update(estado='error', error=str(e))
+            resultados.append(resultado)
+
+    return resultados
+
+
+# ===== NUMERACIÓN SECUENCIAL DE COMPROBANTES SRI =====
+
+TAMANO_BLOQUE_SECUENCIAL = 20
+
+
+def asignar_secuencial(ruc, establecimiento, punto_emision, tipo_comprobante='01', tamano_bloque=TAMANO_BLOQUE_SECUENCIAL):
+    """
+    Entrega el siguiente secuencial libre de un punto de emisión sin huecos
+    ni duplicados.
+
+    Cada emisor toma el bloque reservado más bajo que nadie esté usando
+    (SELECT ... FOR UPDATE SKIP LOCKED) y consume su primer número; solo si
+    todos están ocupados o agotados bloquea la secuencia para reservar un
+    bloque nuevo. Debe llamarse dentro de la misma transacción que guarda el
+    número en el comprobante: si esa transacción se revierte, el número
+    vuelve a su bloque y lo usa la próxima emisión.
+
+    Returns:
+        int: secuencial asignado
+    """
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError("asignar_secuencial debe ejecutarse dentro de transaction.atomic().")
+
+    secuencia, _ = SecuenciaComprobante.objects.get_or_create(
+        ruc=ruc, establecimiento=establecimiento,
+        punto_emision=punto_emision, tipo_comprobante=tipo_comprobante,
+    )
+    bloque = BloqueSecuencial.objects.select_for_update(skip_locked=True).filter(
+        secuencia=secuencia
+    ).order_by('siguiente').first()
+
+    if bloque is None:
+        # Reservar un bloque nuevo: único momento en que se bloquea la secuencia
+        secuencia = SecuenciaComprobante.objects.select_for_update().get(pk=secuencia.pk)
+        inicio = secuencia.siguiente
+        secuencia.siguiente = inicio + tamano_bloque
+        secuencia.save(update_fields=['siguiente'])
+        bloque = BloqueSecuencial.objects.create(secuencia=secuencia, siguiente=inicio, fin=inicio + tamano_bloque - 1)
+
+    numero = bloque.siguiente
+    if numero >= bloque.fin:
+        bloque.delete()
+    else:
+        BloqueSecuencial.objects.filter(pk=bloque.pk).update(siguiente=numero + 1)
+    return numero
+
+
+def _codigos_emision(config_empresa):
+    """RUC (13), establecimiento (3) y punto de emisión (3) de la configuración."""
+    return (
+        str(config_empresa.ruc).zfill(13),
+        str(config_empresa.codigo_establecimiento_emisor or '001').zfill(3),
+        str(config_empresa.codigo_punto_emision or '001').zfill(3),
+    )
+
+
+def numeracion_sri(config_empresa, tipo_comprobante='01'):
+    """
+    Campos secuencial_sri, establecimiento_sri y punto_emision_sri para una
+    venta nueva; vacío si el propietario no tiene RUC configurado. Debe
+    llamarse dentro de la transacción que crea la venta.
+    """
+    if not config_empresa or not config_empresa.ruc:
+        return {}
+    ruc, establecimiento, punto_emision = _codigos_emision(config_empresa)
+    return {
+        'secuencial_sri': asignar_secuencial(ruc, establecimiento, punto_emision, tipo_comprobante),
+        'establecimiento_sri': establecimiento,
+        'punto_emision_sri': punto_emision,
+    }
+
+
+def asignar_secuencial_venta(venta, config_empresa, tipo_comprobante='01'):
+    """
+    Asigna (una sola vez) el secuencial SRI de una venta registrada sin él
+    (antes de configurar el RUC) y lo guarda junto con el establecimiento y
+    punto de emisión usados. La llaman la clave de acceso y el XML al emitir
+    el comprobante; para las ventas que ya tienen número no consulta la base
+    de datos, y llamadas posteriores devuelven el mismo número.
+
+    Returns:
+        int: secuencial de la venta
+
+    Raises:
+        ValueError: si la venta está anulada y no tiene secuencial.
+    """
+    if venta.secuencial_sri:
+        return venta.secuencial_sri
+    if venta.estado == 'ANU':
+        raise ValueError(f"La venta #{venta.pk} está anulada: no se le asigna secuencial.")
+
+    ruc, establecimiento, punto_emision = _codigos_emision(config_empresa)
+    with transaction.atomic():
+        actual = Venta.objects.select_for_update().only(
+            'secuencial_sri', 'establecimiento_sri', 'punto_emision_sri'
+        ).get(pk=venta.pk)
+        if not actual.secuencial_sri:
+            actual.secuencial_sri = asignar_secuencial(ruc, establecimiento, punto_emision, tipo_comprobante)
+            actual.establecimiento_sri = establecimiento
+            actual.punto_emision_sri = punto_emision
+            Venta.objects.filter(pk=venta.pk).update(
+                secuencial_sri=actual.secuencial_sri,
+                establecimiento_sri=establecimiento,
+                punto_emision_sri=punto_emision,
+            )
+
+    venta.secuencial_sri = actual.secuencial_sri
+    venta.establecimiento_sri = actual.establecimiento_sri
+    venta.punto_emision_sri = actual.punto_emision_sri
+    return venta.secuencial_sri
+
+
 # ===== FUNCIONES PARA GENERACIÓN DE CLAVE DE ACCESO DEL SRI =====
 
 def calcular_digito_verificador_modulo11(clave_sin_digito: str) -> int:
@@ -268,14 +687,14 @@ def generar_clave_acceso_desde_venta(venta, config_empresa):
         # Ambiente: obtener de config
         ambiente = config_empresa.tipo_ambiente if config_empresa.tipo_ambiente else '2'
         
-        # Establecimiento (3 dígitos)
-        establecimiento = str(config_empresa.codigo_establecimiento_emisor or '001').zfill(3)
+        # Secuencial (9 dígitos) propio del punto de emisión: el asignado al
+        # registrar la venta, o uno nuevo si se registró antes de configurar
+        # el RUC (nunca para una venta anulada)
+        secuencial = str(asignar_secuencial_venta(venta, config_empresa, tipo_comprobante)).zfill(9)
         
-        # Punto de emisión (3 dígitos)
-        punto_emision = str(config_empresa.codigo_punto_emision or '001').zfill(3)
-        
-        # Secuencial: usar ID de venta como base (9 dígitos)
-        secuencial = str(venta.id_venta).zfill(9)
+        # Establecimiento y punto de emisión con los que se numeró la venta (3 dígitos)
+        establecimiento = venta.establecimiento_sri
+        punto_emision = venta.punto_emision_sri
         
         # Tipo de emisión: '1' para normal
         tipo_emision = config_empresa.tipo_emision if config_empresa.tipo_emision else '1'
@@ -349,15 +768,17 @@ def generar_xml_factura_sri(venta, config_empresa, clave_acceso):
         tipo_emision = etree.SubElement(info_tributaria, 'tipoEmision')
         tipo_emision.text = '1'
         
-        # Establecimiento, punto de emisión y secuencial
+        # Establecimiento, punto de emisión y secuencial (los mismos de la clave de acceso)
+        numero_secuencial = asignar_secuencial_venta(venta, config_empresa)
+
         establecimiento = etree.SubElement(info_tributaria, 'estab')
-        establecimiento.text = '001'
+        establecimiento.text = venta.establecimiento_sri
         
         punto_emision = etree.SubElement(info_tributaria, 'ptoEmi')
-        punto_emision.text = '001'
+        punto_emision.text = venta.punto_emision_sri
         
         secuencial = etree.SubElement(info_tributaria, 'secuencial')
-        secuencial.text = str(venta.id_venta).zfill(9)
+        secuencial.text = str(numero_secuencial).zfill(9)
         
         # Dirección matriz
         dir_matriz = etree.SubElement(info_tributaria, 'dirMatriz')
@@ -401,29 +822,22 @@ def generar_xml_factura_sri(venta, config_empresa, clave_acceso):
         # Totales
         totales = etree.SubElement(info_factura, 'totales')
         
-        # Calcular subtotal e IVA
-        subtotal = Decimal('0.00')
-        iva_total = Decimal('0.00')
-        
-        for detalle in venta.detalles.all():
-            subtotal += detalle.subtotal
-            tarifa_iva = getattr(detalle.producto, 'tarifa_iva', 15)
-            iva_item = (detalle.subtotal * Decimal(str(tarifa_iva))) / Decimal('100')
-            iva_total += iva_item
-        
-        # Si no hay detalles, calcular del total
-        if not venta.detalles.exists():
-            total_decimal = Decimal(str(venta.total))
-            subtotal = total_decimal / Decimal('1.15')
-            iva_total = total_decimal - subtotal
+        # Subtotal e IVA guardados al registrar la venta
+        subtotal = venta.subtotal_sin_impuestos
+        iva_total = venta.iva_total
         
         # Total sin IVA
         total_sin_impuestos = etree.SubElement(totales, 'totalSinImpuestos')
         total_sin_impuestos.text = f"{subtotal:.2f}"
         
-        # Desglose de IVA
-        detalles_iva = etree.SubElement(totales, 'totalIva')
-        detalles_iva.text = f"{iva_total:.2f}"
+        # Desglose de IVA por tarifa
+        total_con_impuestos = etree.SubElement(totales, 'totalConImpuestos')
+        for tarifa, _etiqueta, base, iva in venta.desglose_iva:
+            total_impuesto = etree.SubElement(total_con_impuestos, 'totalImpuesto')
+            etree.SubElement(total_impuesto, 'codigo').text = '2'  # IVA
+            etree.SubElement(total_impuesto, 'codigoPorcentaje').text = CODIGOS_PORCENTAJE_IVA_SRI[tarifa]
+            etree.SubElement(total_impuesto, 'baseImponible').text = f"{base:.2f}"
+            etree.SubElement(total_impuesto, 'valor').text = f"{iva:.2f}"
         
         # Propina (0)
         propina = etree.SubElement(totales, 'propina')
@@ -444,16 +858,16 @@ def generar_xml_factura_sri(venta, config_empresa, clave_acceso):
             linea.text = str(i)
             
             codigo = etree.SubElement(detalle_elem, 'codigoPrincipal')
-            codigo.text = str(detalle.producto.id)
+            codigo.text = detalle.producto_codigo
             
             descripcion = etree.SubElement(detalle_elem, 'descripcion')
-            descripcion.text = detalle.producto.nombre
+            descripcion.text = detalle.producto_nombre
             
             cantidad = etree.SubElement(detalle_elem, 'cantidad')
             cantidad.text = str(detalle.cantidad)
             
             precio_unitario = etree.SubElement(detalle_elem, 'precioUnitario')
-            precio_unitario.text = f"{detalle.precio:.4f}"
+            precio_unitario.text = f"{detalle.precio_unitario:.4f}"
             
             descuento = etree.SubElement(detalle_elem, 'descuento')
             descuento.text = '0.00'
@@ -461,24 +875,24 @@ def generar_xml_factura_sri(venta, config_empresa, clave_acceso):
             precio_total_sin_impuesto = etree.SubElement(detalle_elem, 'precioTotalSinImpuesto')
             precio_total_sin_impuesto.text = f"{detalle.subtotal:.2f}"
             
-            # IVA del detalle
-            tarifa_iva = getattr(detalle.producto, 'tarifa_iva', 15)
-            iva_detalle = (detalle.subtotal * Decimal(str(tarifa_iva))) / Decimal('100')
-            
+            # IVA del detalle (congelado al vender)
             impuestos = etree.SubElement(detalle_elem, 'impuestos')
             impuesto = etree.SubElement(impuestos, 'impuesto')
             
             codigo_impuesto = etree.SubElement(impuesto, 'codigo')
             codigo_impuesto.text = '2'  # IVA
             
-            coeficiente_iva = etree.SubElement(impuesto, 'coeficiente')
-            coeficiente_iva.text = '0'  # Tarifa (0=0%, 1=5%, 2=12%, 3=14%, etc.)
+            codigo_porcentaje = etree.SubElement(impuesto, 'codigoPorcentaje')
+            codigo_porcentaje.text = CODIGOS_PORCENTAJE_IVA_SRI.get(detalle.tarifa_iva, '4')
+            
+            tarifa_iva = etree.SubElement(impuesto, 'tarifa')
+            tarifa_iva.text = f"{detalle.porcentaje_iva:.0f}"
             
             base_imponible = etree.SubElement(impuesto, 'baseImponible')
             base_imponible.text = f"{detalle.subtotal:.2f}"
             
             valor_impuesto = etree.SubElement(impuesto, 'valor')
-            valor_impuesto.text = f"{iva_detalle:.2f}"
+            valor_impuesto.text = f"{detalle.valor_iva:.2f}"
         
         # Convertir a string
         xml_str = etree.tostring(
@@ -1,3 +1,468 @@
-from django.test import TestCase
+import threading
+from decimal import Decimal
+from unittest import skipUnless
 
-# Tests de suscripciones/webhooks eliminados — funcionalidad no implementada
\ No newline at end of file
+from django.contrib.auth.models import User
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+
+from inventario.models import Producto
+from ventas.models import DetalleVenta, Venta
+from .models import BloqueSecuencial, ConfiguracionEmpresa
+from .services import asignar_secuencial, asignar_secuencial_venta, registrar_venta_completa
+
+# Tests de suscripciones/webhooks eliminados — funcionalidad no implementada
+
+
+class RegistrarVentaCompletaTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+        Producto.objects.create(id_producto='A1', user=self.user, nombre='Arroz',
+                                precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=10)
+        Producto.objects.create(id_producto='B2', user=self.user, nombre='Azúcar',
+                                precio_costo=Decimal('2.00'), precio_venta=Decimal('3.00'), cantidad=5)
+
+    def test_descuenta_stock_de_todas_las_lineas(self):
+        carrito = [
+            {'id': 'A1', 'cantidad': 2, 'precio': '1.50'},
+            {'id': 'B2', 'cantidad': 1, 'precio': '3.00'},
+            {'id': 'A1', 'cantidad': 3, 'precio': '1.50'},
+        ]
+        venta = registrar_venta_completa(self.user, carrito, Decimal('10.50'))
+        self.assertEqual(venta.detalles.count(), 3)
+        self.assertEqual(Producto.objects.get(pk='A1').cantidad, 5)
+        self.assertEqual(Producto.objects.get(pk='B2').cantidad, 4)
+
+    def test_stock_insuficiente_revierte_la_venta(self):
+        carrito = [
+            {'id': 'A1', 'cantidad': 1, 'precio': '1.50'},
+            {'id': 'B2', 'cantidad': 6, 'precio': '3.00'},
+        ]
+        with self.assertRaisesMessage(Exception, 'Stock insuficiente para Azúcar'):
+            registrar_venta_completa(self.user, carrito, Decimal('19.50'))
+        self.assertFalse(Venta.objects.exists())
+        self.assertEqual(Producto.objects.get(pk='A1').cantidad, 10)
+
+    def test_bloquea_productos_en_una_sola_consulta(self):
+        carrito = [{'id': 'A1', 'cantidad': 1, 'precio': '1.50'},
+                   {'id': 'B2', 'cantidad': 1, 'precio': '3.00'}]
+        # La primera venta del día crea la fila del resumen diario
+        registrar_venta_completa(self.user, carrito, Decimal('4.50'))
+        # SAVEPOINT + SELECT FOR UPDATE + SELECT configuración (sin RUC, sin secuencial)
+        # + INSERT venta + INSERT detalles + UPDATE resumen + UPDATE stock
+        # + SELECT propietarios + UPDATE contador de catálogo + UPDATE versión
+        # + INSERT kardex + DELETE reservas + RELEASE; en Postgres, además el
+        # bloqueo consultivo compartido del resumen
+        with self.assertNumQueries(14 if connection.vendor == 'postgresql' else 13):
+            registrar_venta_completa(self.user, carrito, Decimal('4.50'))
+
+    def test_detalles_conservan_el_producto_aunque_se_elimine(self):
+        from .services import completar_snapshot_detalles_venta
+
+        venta = registrar_venta_completa(self.user, [{'id': 'A1', 'cantidad': 1, 'precio': '1.50'}], Decimal('1.50'))
+        venta.detalles.update(producto_nombre='', producto_codigo='')  # Detalle anterior a las columnas
+        DetalleVenta.objects.create(venta=venta, producto=None, cantidad=1,
+                                    precio_unitario=Decimal('3.00'), subtotal=Decimal('3.00'))
+        self.assertEqual(completar_snapshot_detalles_venta(tamano_lote=1), 2)
+
+        Producto.objects.filter(pk='A1').delete()
+        nombres = sorted(venta.detalles.values_list('producto_codigo', 'producto_nombre'))
+        self.assertEqual(nombres, [('', 'Producto eliminado'), ('A1', 'Arroz')])
+
+
+class StockFragmentadoTestCase(TestCase):
+    def setUp(self):
+        from inventario.services import activar_stock_fragmentado
+        self.user = User.objects.create_user(username='cajero', password='x')
+        self.producto = Producto.objects.create(id_producto='H1', user=self.user, nombre='Agua',
+                                                precio_costo=Decimal('0.30'), precio_venta=Decimal('0.50'), cantidad=10)
+        activar_stock_fragmentado(self.producto, num_fragmentos=4)
+
+    def _stock_fragmentos(self):
+        from django.db.models import Sum
+        return self.producto.fragmentos_stock.aggregate(total=Sum('cantidad'))['total']
+
+    def test_venta_descuenta_de_varios_fragmentos(self):
+        # Ningún fragmento tiene 7 unidades: el descuento se reparte
+        registrar_venta_completa(self.user, [{'id': 'H1', 'cantidad': 7, 'precio': '0.50'}], Decimal('3.50'))
+        self.assertEqual(self._stock_fragmentos(), 3)
+        with self.assertRaisesMessage(Exception, 'Stock insuficiente para Agua'):
+            registrar_venta_completa(self.user, [{'id': 'H1', 'cantidad': 4, 'precio': '0.50'}], Decimal('2.00'))
+        self.assertEqual(self._stock_fragmentos(), 3)
+
+    def test_reconciliar_y_edicion_manual(self):
+        from inventario.services import reconciliar_stock_fragmentado
+        registrar_venta_completa(self.user, [{'id': 'H1', 'cantidad': 2, 'precio': '0.50'}], Decimal('1.00'))
+        self.assertEqual(reconciliar_stock_fragmentado(), 1)
+        producto = Producto.objects.get(pk='H1')
+        self.assertEqual(producto.cantidad, 8)
+        # Una edición manual del stock es el total deseado de los fragmentos
+        producto.cantidad = 20
+        producto.save()
+        self.assertEqual(self._stock_fragmentos(), 20)
+
+    def test_lecturas_de_venta_usan_la_suma_de_fragmentos(self):
+        from inventario.alertas import calcular_alertas
+        from django.core.cache import cache
+        from inventario.services import anotar_stock_disponible, buscar_productos_cacheado, catalogo_pos
+
+        cache.clear()
+        registrar_venta_completa(self.user, [{'id': 'H1', 'cantidad': 10, 'precio': '0.50'}], Decimal('5.00'))
+        # Sin reconciliar, la columna consolidada todavía dice 10
+        self.assertEqual(Producto.objects.get(pk='H1').cantidad, 10)
+        self.assertFalse(buscar_productos_cacheado('agua', self.user.pk, con_stock=True).exists())
+        disponible = anotar_stock_disponible(Producto.objects.filter(pk='H1')).values_list('disponible', flat=True)
+        self.assertEqual(list(disponible), [0])
+        self.assertEqual(catalogo_pos(self.user.pk)['productos'][0][4], 0)
+        self.assertEqual(calcular_alertas(self.user)['bajo_stock']['productos'][0]['cantidad'], 0)
+
+    def test_edicion_sobre_columna_desactualizada(self):
+        registrar_venta_completa(self.user, [{'id': 'H1', 'cantidad': 5, 'precio': '0.50'}], Decimal('2.50'))
+        # Los fragmentos suman 5 y la columna consolidada aún dice 10
+        producto = Producto.objects.get(pk='H1')
+        producto.nombre = 'Agua 500ml'
+        producto.save()
+        self.assertEqual(self._stock_fragmentos(), 5)
+        producto.precio_venta = Decimal('0.60')
+        producto.save(update_fields=['precio_venta'])
+        self.assertEqual(self._stock_fragmentos(), 5)
+
+        producto.cantidad = 20
+        producto.save(update_fields=['cantidad'])
+        self.assertEqual(self._stock_fragmentos(), 20)
+        self.assertEqual(sorted(self.producto.fragmentos_stock.values_list('cantidad', flat=True)), [5, 5, 5, 5])
+
+
+class _Rollback(Exception):
+    pass
+
+
+class SecuencialSRITestCase(TestCase):
+    def _emitir(self, punto='001', revertir=False):
+        try:
+            with transaction.atomic():
+                numero = asignar_secuencial('0999999999001', '001', punto, tamano_bloque=3)
+                if revertir:
+                    raise _Rollback()
+                return numero
+        except _Rollback:
+            return None
+
+    def test_numeros_revertidos_se_reutilizan(self):
+        self.assertEqual([self._emitir(), self._emitir()], [1, 2])
+        self.assertIsNone(self._emitir(revertir=True))
+        self.assertEqual([self._emitir(), self._emitir(), self._emitir()], [3, 4, 5])
+        # Cada punto de emisión numera por separado
+        self.assertEqual(self._emitir(punto='002'), 1)
+
+    def test_la_venta_conserva_su_secuencial(self):
+        user = User.objects.create_user(username='emisor', password='x')
+        config = ConfiguracionEmpresa.objects.create(user=user, nombre_empresa='Tienda', ruc='0999999999001',
+                                                     codigo_establecimiento_emisor='2', codigo_punto_emision='7')
+        venta = Venta.objects.create(owner=user, antendido_por=user, total=Decimal('1.00'))
+        self.assertEqual(asignar_secuencial_venta(venta, config), 1)
+        venta.refresh_from_db()
+        self.assertEqual((venta.establecimiento_sri, venta.punto_emision_sri), ('002', '007'))
+        self.assertEqual(asignar_secuencial_venta(Venta.objects.get(pk=venta.pk), config), 1)
+
+    def test_se_numera_al_registrar_y_no_al_consultar(self):
+        from .services import generar_clave_acceso_desde_venta
+
+        user = User.objects.create_user(username='emisor', password='x')
+        config = ConfiguracionEmpresa.objects.create(user=user, nombre_empresa='Tienda', ruc='0999999999001')
+        Producto.objects.create(id_producto='A1', user=user, nombre='Arroz',
+                                precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=10)
+        carrito = [{'id': 'A1', 'cantidad': 1, 'precio': '1.50'}]
+        ventas = [registrar_venta_completa(user, carrito, Decimal('1.50')) for _ in range(2)]
+        self.assertEqual([v.secuencial_sri for v in ventas], [1, 2])
+        self.assertEqual(generar_clave_acceso_desde_venta(ventas[0], config)[30:39], '000000001')
+
+        # Una venta anulada sin número (anterior al RUC) no lo recibe al emitirla
+        anulada = Venta.objects.create(owner=user, antendido_por=user, total=Decimal('1.00'), estado='ANU')
+        self.assertIsNone(generar_clave_acceso_desde_venta(anulada, config))
+        with self.assertRaises(ValueError):
+            asignar_secuencial_venta(anulada, config)
+        anulada.refresh_from_db()
+        self.assertIsNone(anulada.secuencial_sri)
+        # Una activa lo recibe al emitir su comprobante, una sola vez
+        sin_numero = Venta.objects.create(owner=user, antendido_por=user, total=Decimal('1.00'))
+        clave = generar_clave_acceso_desde_venta(sin_numero, config)
+        self.assertEqual(clave[30:39], '000000003')
+        self.assertEqual(generar_clave_acceso_desde_venta(Venta.objects.get(pk=sin_numero.pk), config), clave)
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class SecuencialSRIConcurrenteTestCase(TransactionTestCase):
+    HILOS = 8
+    EMISIONES = 25
+
+    def test_emision_paralela_sin_huecos_ni_duplicados(self):
+        emitidos = []
+        errores = []
+        candado = threading.Lock()
+        barrera = threading.Barrier(self.HILOS)
+
+        def emisor(indice):
+            barrera.wait()
+            try:
+                for i in range(self.EMISIONES):
+                    try:
+                        with transaction.atomic():
+                            numero = asignar_secuencial('0999999999001', '001', '001', tamano_bloque=5)
+                            # Algunas emisiones fallan después de tomar el número
+                            if (indice + i) % 7 == 0:
+                                raise _Rollback()
+                        with candado:
+                            emitidos.append(numero)
+                    except _Rollback:
+                        pass
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=emisor, args=(i,)) for i in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(emitidos), len(set(emitidos)), "Secuenciales duplicados")
+        # Lo que no se emitió sigue reservado en algún bloque: nada se pierde
+        pendientes = [n for b in BloqueSecuencial.objects.all() for n in range(b.siguiente, b.fin + 1)]
+        self.assertEqual(sorted(emitidos + pendientes), list(range(1, len(emitidos) + len(pendientes) + 1)))
+        # Las siguientes emisiones consumen primero los números pendientes
+        with transaction.atomic():
+            siguiente = asignar_secuencial('0999999999001', '001', '001', tamano_bloque=5)
+        self.assertEqual(siguiente, min(pendientes) if pendientes else max(emitidos) + 1)
+
+
+class PlanesConsultaTestCase(TestCase):
+    """
+    Las consultas frecuentes del dashboard, la IA, los reportes y las alertas
+    deben resolverse con el índice pensado para cada una (no basta con que el
+    plan use algún índice: los de las FK también servirían). En PostgreSQL se
+    desactiva el Seq Scan: con pocas filas el planificador lo preferiría
+    aunque exista el índice.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from datetime import date, timedelta
+        from finanzas.models import CuentaPorCobrar
+        from usuarios.models import RegistroAcceso
+
+        cls.user = User.objects.create_user(username='dueno', password='x')
+        hoy = date.today()
+        Producto.objects.bulk_create([
+            Producto(id_producto=f'P{i:04d}', user=cls.user, nombre=f'Producto {i}', precio_costo=Decimal('1.00'),
+                     precio_venta=Decimal('1.50'), cantidad=i % 40, estado='ACTIVO' if i % 5 else 'INACTIVO',
+                     fecha_caducidad=hoy + timedelta(days=i) if i % 3 == 0 else None)
+            for i in range(300)
+        ])
+        ventas = Venta.objects.bulk_create([
+            Venta(owner=cls.user, antendido_por=cls.user, total=Decimal('10.00'), estado='ACT' if i % 9 else 'ANU')
+            for i in range(300)
+        ])
+        DetalleVenta.objects.bulk_create([
+            DetalleVenta(venta=venta, producto_id='P0001', cantidad=1, precio_unitario=Decimal('10.00'),
+                         subtotal=Decimal('10.00'))
+            for venta in ventas
+        ])
+        CuentaPorCobrar.objects.bulk_create([
+            CuentaPorCobrar(owner=cls.user, monto_total=Decimal('5.00'), saldo=Decimal('5.00'),
+                            estado=['PENDIENTE', 'PARCIAL', 'PAGADA'][i % 3])
+            for i in range(300)
+        ])
+        RegistroAcceso.objects.bulk_create([
+            RegistroAcceso(user=cls.user, tipo_evento='LOGIN' if i % 2 else 'LOGOUT') for i in range(300)
+        ])
+
+    def assertUsaIndice(self, queryset, indice, sin_ordenar=False):
+        """El plan usa `indice`; con `sin_ordenar`, el orden sale del índice sin un paso de Sort."""
+        import re
+        from django.db import connection
+
+        postgres = connection.vendor == 'postgresql'
+        if postgres:
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        if postgres:
+            self.assertRegex(plan, rf'\b(Index|Index Only|Bitmap Index) Scan (using|on) {indice}\b')
+            if sin_ordenar:
+                self.assertNotIn('Sort', plan)
+        else:
+            self.assertRegex(plan, rf'USING (COVERING )?INDEX {indice}\b')
+            if sin_ordenar:
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def _desde(self, dias):
+        from datetime import timedelta
+        from django.utils import timezone
+        return timezone.now() - timedelta(days=dias)
+
+    def test_ventas_dashboard_ia_y_reportes(self):
+        self.assertUsaIndice(
+            Venta.objects.filter(antendido_por=self.user, fecha_venta__gte=self._desde(1), estado='ACT')
+            .values('total'),
+            'venta_cajero_activa_idx',
+        )
+        self.assertUsaIndice(
+            Venta.objects.filter(owner=self.user, fecha_venta__gte=self._desde(30), fecha_venta__lte=self._desde(0)),
+            'venta_owner_fecha_idx',
+        )
+        self.assertUsaIndice(
+            DetalleVenta.objects.filter(venta__antendido_por=self.user, venta__fecha_venta__gte=self._desde(30),
+                                        venta__estado='ACT'),
+            'venta_cajero_activa_idx',
+        )
+        # Historial paginado por cursor y últimas ventas: recorren el índice sin ordenar la tabla
+        self.assertUsaIndice(
+            Venta.objects.filter(owner=self.user).order_by('-fecha_venta', '-pk')[:11], 'venta_owner_fecha_idx',
+            sin_ordenar=True,
+        )
+        self.assertUsaIndice(
+            Venta.objects.filter(antendido_por=self.user).order_by('-fecha_venta')[:5], 'venta_cajero_fecha_idx',
+            sin_ordenar=True,
+        )
+
+    def test_alertas_de_productos(self):
+        from inventario.views import get_productos_por_vencer
+
+        self.assertUsaIndice(
+            Producto.objects.filter(user=self.user, estado='ACTIVO', cantidad__lte=10), 'producto_user_estado_cant_idx'
+        )
+        self.assertUsaIndice(get_productos_por_vencer(self.user, 30), 'producto_user_caducidad_idx')
+
+    @skipUnless(connections['default'].vendor == 'postgresql',
+                'SQLite no usa índices parciales cuando la condición llega como parámetro')
+    def test_indices_parciales(self):
+        from inventario.views import BAJO_STOCK_UMBRAL
+
+        self.assertUsaIndice(
+            Producto.objects.filter(estado='ACTIVO', cantidad__lte=BAJO_STOCK_UMBRAL), 'producto_activo_bajo_idx'
+        )
+        self.assertUsaIndice(
+            Venta.objects.filter(antendido_por=self.user, es_credito=True, estado_credito__in=['PENDIENTE', 'PARCIAL']),
+            'venta_cajero_credito_idx',
+        )
+
+    def test_cuentas_y_accesos(self):
+        from finanzas.models import CuentaPorCobrar
+        from usuarios.models import RegistroAcceso
+
+        self.assertUsaIndice(
+            CuentaPorCobrar.objects.filter(owner=self.user, estado__in=['PENDIENTE', 'PARCIAL']),
+            'cxc_owner_estado_idx',
+        )
+        # Listado de accesos paginado por cursor
+        self.assertUsaIndice(
+            RegistroAcceso.objects.order_by('-fecha_hora', '-id')[:11], 'registro_fecha_id_idx', sin_ordenar=True,
+        )
+
+
+class EventosDashboardTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='cajero', password='x')
+        Producto.objects.create(id_producto='A1', user=self.user, nombre='Arroz',
+                                precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=10)
+
+    def _vender(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_venta_completa(self.user, [{'id': 'A1', 'cantidad': 1, 'precio': '1.50'}], Decimal('1.50'))
+
+    def test_ventas_seguidas_se_agrupan_en_un_evento(self):
+        from unittest import mock
+        from asgiref.sync import async_to_sync
+        from .eventos import flujo_eventos
+
+        @async_to_sync
+        async def leer(total):
+            flujo = flujo_eventos(self.user, lambda usuario: {'ok': True})
+            partes = [await flujo.__anext__() for _ in range(total)]
+            await flujo.aclose()
+            return partes
+
+        with mock.patch('possitema.eventos.INTERVALO_REVISION', 0), \
+                mock.patch('possitema.eventos.versiones') as versiones:
+            sin_cambios = {'ventas': 0, 'alertas': 0, 'caja': 0}
+            versiones.side_effect = [sin_cambios, {**sin_cambios, 'ventas': 3, 'alertas': 3}]
+            partes = leer(3)
+        self.assertEqual(partes[0], 'retry: 5000\n\n')
+        self.assertEqual(partes[1], 'event: ingresos\ndata: {"ok":true}\n\n')
+        self.assertEqual(partes[2], 'event: alertas\ndata: {"alertas":3}\n\n')
+
+    def test_venta_publica_ingresos_y_alertas(self):
+        from .eventos import versiones
+
+        antes = versiones(self.user.pk)
+        self._vender()
+        self._vender()
+        despues = versiones(self.user.pk)
+        self.assertEqual(despues['ventas'] - antes['ventas'], 2)
+        self.assertEqual(despues['alertas'] - antes['alertas'], 2)
+        self.assertEqual(despues['caja'], antes['caja'])
+
+    def test_sin_asgi_responde_204_para_volver_al_sondeo(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/eventos/').status_code, 204)
+
+
+class DashboardMargenesTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+        Producto.objects.create(id_producto='A1', user=self.user, nombre='Arroz',
+                                precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=100)
+        for _ in range(2):
+            registrar_venta_completa(self.user, [{'id': 'A1', 'cantidad': 2, 'precio': '1.50'}], Decimal('3.00'))
+        self.client.force_login(self.user)
+
+    def _agregar_detalles(self, cantidad):
+        from ventas.services import reconstruir_resumen
+
+        venta = Venta.objects.create(owner=self.user, antendido_por=self.user, total=Decimal(cantidad) * Decimal('1.50'))
+        DetalleVenta.objects.bulk_create(
+            DetalleVenta(venta=venta, producto_id='A1', producto_nombre='Arroz', cantidad=1,
+                         precio_unitario=Decimal('1.50'), subtotal=Decimal('1.50'), costo_al_vender=Decimal('1.00'))
+            for _ in range(cantidad)
+        )
+        reconstruir_resumen()
+
+    def test_margenes_del_dia_y_del_mes_en_una_consulta(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/')
+        self.assertEqual(respuesta.context['ganancia_dia'], Decimal('2.00'))
+        self.assertEqual(respuesta.context['margen_porcentaje_mes'], Decimal('2.00') / Decimal('6.00') * 100)
+        self.assertEqual(respuesta.context['total_ventas_7dias'], 2)
+        sql = [c['sql'] for c in consultas.captured_queries]
+        self.assertEqual(sum('ventas_resumenventadiaria' in s for s in sql), 1)
+        self.assertFalse(any('FROM "ventas_detalleventa"' in s and 'costo_al_vender' in s and 'GROUP BY' not in s
+                             for s in sql))
+        self.assertEqual(len(sql), 21)
+
+    def test_memoria_no_crece_con_los_detalles_del_mes(self):
+        import tracemalloc
+
+        def pico():
+            tracemalloc.start()
+            self.client.get('/')
+            _, maximo = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return maximo
+
+        pico()  # Plantillas y caches de Django ya cargadas
+        antes = pico()
+        self._agregar_detalles(3000)
+        despues = pico()
+        self.assertEqual(self.client.get('/').context['ganancia_mes'], Decimal('1502.00'))
+        # 3000 DetalleVenta en memoria ocuparían varios MB
+        self.assertLess(despues - antes, 256 * 1024)
@@ -4,7 +4,10 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
-from .views import dashboardPOSView, configuracion_empresa_view, actualizar_ingresos_ajax
+from .views import (
+    dashboardPOSView, configuracion_empresa_view, actualizar_ingresos_ajax, estadisticas_cache_busqueda_ajax,
+    eventos_dashboard,
+)
 
 # Nota: El nombre del proyecto principal puede ser diferente.
 
@@ -17,6 +20,8 @@ urlpatterns = [
     
     # 2. AJAX para actualizar ingresos en tiempo real
     path('ajax/actualizar-ingresos/', actualizar_ingresos_ajax, name='actualizar_ingresos_ajax'),
+    path('eventos/', eventos_dashboard, name='eventos_dashboard'),
+    path('ajax/cache-busqueda/', estadisticas_cache_busqueda_ajax, name='estadisticas_cache_busqueda'),
     
     # 3. Ruta del Administrador
     path('admin/', admin.site.urls),
@@ -39,7 +39,7 @@ from django.contrib.auth import get_user_model
 from django.conf import settings
 
 from ventas.models import Venta, Caja, DetalleVenta
-from inventario.models import Producto
+from inventario.models import BAJO_STOCK_UMBRAL, Producto
 from cliente.models import Cliente
 from gasto.models import Gasto
 from .models import ConfiguracionEmpresa
@@ -92,56 +92,26 @@ class dashboardPOSView(View):
         """Muestra el dashboard con estadísticas del POS."""
         from usuarios.models import EstadoCaja
         
-        # Calcular estadísticas con rango de fechas timezone-aware
-        ahora = timezone.now()
-        hoy = ahora.date()
-        
-        # Inicio y fin del día actual (en UTC)
-        inicio_dia = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
-        fin_dia = inicio_dia + timedelta(days=1)
-        
-        # Inicio del mes
-        inicio_mes_dt = ahora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        # Inicio de hace 7 días
-        hace_7_dias_dt = ahora - timedelta(days=7)
-        
-        # Ventas del mes
-        ventas_mes = Venta.objects.filter(
-            antendido_por=request.user,
-            fecha_venta__gte=inicio_mes_dt,
-            estado='ACT'
-        ).aggregate(
-            total=Sum('total'),
-            cantidad=Count('id_venta')
-        )
-        
-        # Ventas del día
-        ventas_dia = Venta.objects.filter(
-            antendido_por=request.user,
-            fecha_venta__gte=inicio_dia,
-            fecha_venta__lt=fin_dia,
-            estado='ACT'
-        ).aggregate(
-            total=Sum('total'),
-            cantidad=Count('id_venta')
-        )
+        from ventas.services import fecha_local, resumen_ventas_periodos
+
+        # Día local (America/Guayaquil): los totales salen del resumen diario
+        hoy = fecha_local(timezone.now())
+        inicio_mes = hoy.replace(day=1)
         
-        # Ventas últimos 7 días
-        ventas_7dias = Venta.objects.filter(
-            antendido_por=request.user,
-            fecha_venta__gte=hace_7_dias_dt,
-            estado='ACT'
-        ).aggregate(
-            total=Sum('total'),
-            cantidad=Count('id_venta')
-        )
+        # Ventas, ingresos y ganancia del día, de los últimos 7 días (hoy
+        # incluido) y del mes, en una sola consulta con sumas condicionales
+        periodos = resumen_ventas_periodos({
+            'dia': (hoy, hoy),
+            'semana': (hoy - timedelta(days=6), hoy),
+            'mes': (inicio_mes, hoy),
+        }, cajero=request.user)
+        ventas_dia, ventas_7dias, ventas_mes = periodos['dia'], periodos['semana'], periodos['mes']
         
         # Productos con stock bajo (usando 'cantidad' en lugar de 'stock_actual')
         productos_bajo_stock_list = Producto.objects.filter(
             user=request.user,
             estado='ACTIVO',
-            cantidad__lte=10
+            cantidad__lte=BAJO_STOCK_UMBRAL
         ).order_by('cantidad')
         
         productos_bajo_stock = productos_bajo_stock_list.count()
@@ -158,50 +128,23 @@ class dashboardPOSView(View):
             abierta=True
         ).first()
         
-        # Últimas 5 ventas
-        ultimas_ventas = Venta.objects.filter(antendido_por=request.user).order_by('-fecha_venta')[:5]
+        # Últimas 5 ventas (la plantilla muestra el cliente de cada una)
+        ultimas_ventas = Venta.objects.filter(antendido_por=request.user).select_related('cliente').order_by('-fecha_venta')[:5]
         
         # Top 5 productos más vendidos
         productos_vendidos = DetalleVenta.objects.filter(venta__antendido_por=request.user).values(
-            'producto__nombre'
+            'producto_nombre'
         ).annotate(
             total_vendido=Sum('cantidad')
         ).order_by('-total_vendido')[:5]
         
         # ========== MARGEN DE GANANCIAS ==========
-        # Ganancia = (precio_venta - precio_costo) × cantidad
-        # Calculamos en Python en lugar de ORM debido a precisión decimal
-        
-        # Calcular ganancia de hoy
-        detalles_dia = DetalleVenta.objects.filter(
-            venta__antendido_por=request.user,
-            venta__fecha_venta__gte=inicio_dia,
-            venta__fecha_venta__lt=fin_dia,
-            venta__estado='ACT'
-        )
-        
-        total_venta_dia = Decimal('0')
-        ganancia_dia = Decimal('0')
-        
-        for detalle in detalles_dia:
-            total_venta_dia += Decimal(str(detalle.subtotal))
-            ganancia_unitaria = Decimal(str(detalle.precio_unitario)) - Decimal(str(detalle.costo_al_vender))
-            ganancia_dia += ganancia_unitaria * Decimal(str(detalle.cantidad))
-        
-        # Calcular ganancia de mes
-        detalles_mes = DetalleVenta.objects.filter(
-            venta__antendido_por=request.user,
-            venta__fecha_venta__gte=inicio_mes_dt,
-            venta__estado='ACT'
-        )
-        
-        total_venta_mes = Decimal('0')
-        ganancia_mes = Decimal('0')
-        
-        for detalle in detalles_mes:
-            total_venta_mes += Decimal(str(detalle.subtotal))
-            ganancia_unitaria = Decimal(str(detalle.precio_unitario)) - Decimal(str(detalle.costo_al_vender))
-            ganancia_mes += ganancia_unitaria * Decimal(str(detalle.cantidad))
+        # Ganancia = subtotal - costo_al_vender × cantidad (GANANCIA_DETALLE,
+        # la misma expresión de Venta.ganancia_total), ya acumulada por día
+        ganancia_dia = ventas_dia['ganancia']
+        ganancia_mes = ventas_mes['ganancia']
+        total_venta_dia = ventas_dia['subtotal']
+        total_venta_mes = ventas_mes['subtotal']
         
         # Calcular porcentaje de margen
         margen_porcentaje_dia = ((ganancia_dia / total_venta_dia) * 100) if total_venta_dia > 0 else Decimal('0')
@@ -210,7 +153,7 @@ class dashboardPOSView(View):
         # ========== GASTOS DEL MES ==========
         gastos_mes = Gasto.objects.filter(
             owner=request.user,
-            fecha_gasto__gte=inicio_mes_dt.date(),
+            fecha_gasto__gte=inicio_mes,
             estado__in=['APROBADO', 'PAGADO']  # Solo contar gastos aprobados o pagados
         ).aggregate(
             total=Sum('monto')
@@ -218,44 +161,10 @@ class dashboardPOSView(View):
         total_gastos_mes = gastos_mes['total'] or Decimal('0')
         
         # ========== ESTADÍSTICAS DE PERSONAL ==========
-        # Usuarios conectados hoy (con login pero sin logout o login más reciente que logout)
-        from usuarios.models import RegistroAcceso
-        from django.db.models import Q
-        
-        # Obtener la fecha de hoy en la zona horaria local
-        ahora = timezone.now()
-        inicio_dia = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
-        fin_dia = inicio_dia + timedelta(days=1)
-        
-        # Obtener todos los usuarios que hicieron login hoy (sin duplicados)
-        usuarios_con_login = RegistroAcceso.objects.filter(
-            tipo_evento='LOGIN',
-            fecha_hora__gte=inicio_dia,
-            fecha_hora__lt=fin_dia
-        ).values_list('user_id', flat=True).distinct()
-        
-        # Contar usuarios conectados actualmente (tienen login pero no logout después)
-        usuarios_conectados_set = set()
-        for user_id in usuarios_con_login:
-            ultimo_login = RegistroAcceso.objects.filter(
-                user_id=user_id,
-                tipo_evento='LOGIN',
-                fecha_hora__gte=inicio_dia,
-                fecha_hora__lt=fin_dia
-            ).order_by('-fecha_hora').first()
-            
-            ultimo_logout = RegistroAcceso.objects.filter(
-                user_id=user_id,
-                tipo_evento='LOGOUT',
-                fecha_hora__gte=inicio_dia,
-                fecha_hora__lt=fin_dia
-            ).order_by('-fecha_hora').first()
-            
-            # Si no hay logout o el login es más reciente que el logout, está conectado
-            if ultimo_login and (not ultimo_logout or ultimo_login.fecha_hora > ultimo_logout.fecha_hora):
-                usuarios_conectados_set.add(user_id)
-        
-        usuarios_conectados = len(usuarios_conectados_set)
+        # Usuarios conectados ahora: sesiones activas con actividad reciente
+        from usuarios.services import usuarios_conectados as conectados
+
+        usuarios_conectados = conectados().count()
         
         # Cajas abiertas hoy
         cajas_abiertas_hoy = Caja.objects.filter(
@@ -299,12 +208,12 @@ class dashboardPOSView(View):
         
         context = {
             'nombre_usuario': request.user.get_full_name() or request.user.username,
-            'total_ventas_hoy': ventas_dia['cantidad'] or 0,
-            'ingresos_hoy': ventas_dia['total'] or 0,
-            'total_ventas_mes': ventas_mes['cantidad'] or 0,
-            'ingresos_mes': ventas_mes['total'] or 0,
-            'total_ventas_7dias': ventas_7dias['cantidad'] or 0,
-            'ingresos_7dias': ventas_7dias['total'] or 0,
+            'total_ventas_hoy': ventas_dia['cantidad_ventas'],
+            'ingresos_hoy': ventas_dia['total'],
+            'total_ventas_mes': ventas_mes['cantidad_ventas'],
+            'ingresos_mes': ventas_mes['total'],
+            'total_ventas_7dias': ventas_7dias['cantidad_ventas'],
+            'ingresos_7dias': ventas_7dias['total'],
             'productos_bajo_stock': productos_bajo_stock,
             'productos_bajo_stock_list': productos_bajo_stock_list,
             'total_productos': total_productos,
@@ -518,9 +427,29 @@ def buscar_por_codigo_ajax(request):
 @login_required
 @permission_required('possitema.can_access_pos', raise_exception=True)
 def procesar_venta_ajax(request):
-    """Procesa una venta completa vía AJAX, incluyendo ventas a crédito."""
+    """
+    Procesa una venta completa vía AJAX, incluyendo ventas a crédito.
+    Un reintento con la misma `clave_idempotencia` devuelve la venta original.
+    """
+    from django.db import IntegrityError
+    from .services import buscar_venta_idempotente
+
     try:
         data = json.loads(request.body)
+
+        # Reintento de una venta ya registrada: responder sin bloquear ni escribir
+        clave_idempotencia = str(
+            data.get('clave_idempotencia') or request.headers.get('X-Idempotency-Key') or ''
+        ).strip()[:64] or None
+        venta_previa = buscar_venta_idempotente(request.user, clave_idempotencia)
+        if venta_previa:
+            return JsonResponse({
+                'success': True,
+                'venta_id': venta_previa.id_venta,
+                'total': str(venta_previa.total),
+                'es_credito': venta_previa.es_credito,
+                'duplicada': True,
+            }, status=200)
         
         # Obtener items del carrito
         carrito = data.get('carrito', [])
@@ -559,7 +488,8 @@ def procesar_venta_ajax(request):
                 es_credito=es_credito,
                 monto_credito=total if es_credito else Decimal('0.00'),
                 monto_pagado=Decimal('0.00') if es_credito else total,
-                estado_credito='PENDIENTE' if es_credito else 'PAGADA'
+                estado_credito='PENDIENTE' if es_credito else 'PAGADA',
+                clave_idempotencia=clave_idempotencia,
             )
             
             # Si es a crédito, registrar en CuentaPorCobrar
@@ -597,6 +527,8 @@ def procesar_venta_ajax(request):
                 DetalleVenta.objects.create(
                     venta=venta,
                     producto=producto,
+                    producto_codigo=producto.pk,
+                    producto_nombre=producto.nombre,
                     cantidad=cantidad,
                     precio_unitario=precio,
                     subtotal=subtotal,
@@ -614,6 +546,18 @@ def procesar_venta_ajax(request):
                 'es_credito': es_credito
             }, status=201)
     
+    except IntegrityError as e:
+        # Dos peticiones simultáneas con la misma clave: gana la primera
+        venta_previa = buscar_venta_idempotente(request.user, clave_idempotencia)
+        if venta_previa:
+            return JsonResponse({
+                'success': True,
+                'venta_id': venta_previa.id_venta,
+                'total': str(venta_previa.total),
+                'es_credito': venta_previa.es_credito,
+                'duplicada': True,
+            }, status=200)
+        return JsonResponse({'error': str(e), 'success': False}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e), 'success': False}, status=400)
 
@@ -678,71 +622,25 @@ def configuracion_empresa_view(request):
 # =========================================================================
 # AJAX PARA ACTUALIZAR INGRESOS EN TIEMPO REAL
 # =========================================================================
-@login_required
-def actualizar_ingresos_ajax(request):
+def datos_ingresos(usuario):
     """
-    Vista AJAX que retorna los ingresos actualizados de hoy y del mes.
-    Se ejecuta periódicamente desde el dashboard para reflejar cambios en tiempo real.
+    Ingresos de hoy y del mes del usuario, usuarios conectados y cajas del
+    día. Los usa el sondeo por AJAX y el evento `ingresos` del stream.
     """
+    from ventas.services import fecha_local, resumen_ventas_periodos
+
     ahora = timezone.now()
     
-    # Rango de hoy
-    inicio_dia = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
-    fin_dia = inicio_dia + timedelta(days=1)
-    hoy = ahora.date()
-    
-    # Rango del mes
-    inicio_mes_dt = ahora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # Consultar ventas completadas de hoy
-    ventas_hoy = Venta.objects.filter(
-        antendido_por=request.user,
-        fecha_venta__gte=inicio_dia,
-        fecha_venta__lt=fin_dia
-    ).aggregate(
-        total=Sum('total'),
-        cantidad=Count('id_venta')
-    )
+    hoy = fecha_local(ahora)
     
-    # Consultar ventas completadas del mes
-    ventas_mes = Venta.objects.filter(
-        antendido_por=request.user,
-        fecha_venta__gte=inicio_mes_dt
-    ).aggregate(
-        total=Sum('total'),
-        cantidad=Count('id_venta')
-    )
+    # Ventas activas de hoy y del mes, desde el resumen diario (una consulta)
+    periodos = resumen_ventas_periodos({'hoy': (hoy, hoy), 'mes': (hoy.replace(day=1), hoy)}, cajero=usuario)
+    ventas_hoy, ventas_mes = periodos['hoy'], periodos['mes']
     
     # ========== ESTADÍSTICAS DE PERSONAL (Usuarios Conectados) ==========
-    from usuarios.models import RegistroAcceso
-    
-    # Obtener todos los usuarios que hicieron login hoy (sin duplicados)
-    usuarios_con_login = RegistroAcceso.objects.filter(
-        tipo_evento='LOGIN',
-        fecha_hora__gte=inicio_dia,
-        fecha_hora__lt=fin_dia
-    ).values_list('user_id', flat=True).distinct()
-    
-    # Contar usuarios conectados actualmente (tienen login pero no logout después)
-    usuarios_conectados = 0
-    for user_id in usuarios_con_login:
-        ultimo_login = RegistroAcceso.objects.filter(
-            user_id=user_id,
-            tipo_evento='LOGIN',
-            fecha_hora__gte=inicio_dia,
-            fecha_hora__lt=fin_dia
-        ).order_by('-fecha_hora').first()
-        
-        ultimo_logout = RegistroAcceso.objects.filter(
-            user_id=user_id,
-            tipo_evento='LOGOUT',
-            fecha_hora__gte=inicio_dia,
-            fecha_hora__lt=fin_dia
-        ).order_by('-fecha_hora').first()
-        
-        # Si no hay logout o el login es más reciente que el logout, está conectado
-        if ultimo_login and (not ultimo_logout or ultimo_login.fecha_hora > ultimo_logout.fecha_hora):
-            usuarios_conectados += 1
+    from usuarios.services import usuarios_conectados as conectados
+
+    usuarios_conectados = conectados(ahora).count()
     
     # ========== ESTADÍSTICAS DE CAJAS ==========
     # Cajas abiertas hoy
@@ -757,16 +655,55 @@ def actualizar_ingresos_ajax(request):
         abierta=False
     ).count()
     
-    # Preparar respuesta JSON
-    data = {
+    return {
         'success': True,
-        'ingresos_hoy': float(ventas_hoy['total'] or 0),
-        'total_ventas_hoy': ventas_hoy['cantidad'] or 0,
-        'ingresos_mes': float(ventas_mes['total'] or 0),
-        'total_ventas_mes': ventas_mes['cantidad'] or 0,
+        'ingresos_hoy': float(ventas_hoy['total']),
+        'total_ventas_hoy': ventas_hoy['cantidad_ventas'],
+        'ingresos_mes': float(ventas_mes['total']),
+        'total_ventas_mes': ventas_mes['cantidad_ventas'],
         'usuarios_conectados': usuarios_conectados,
         'cajas_abiertas': cajas_abiertas_hoy,
         'cajas_cerradas': cajas_cerradas_hoy,
     }
-    
-    return JsonResponse(data)
+
+
+@login_required
+def actualizar_ingresos_ajax(request):
+    """
+    Vista AJAX que retorna los ingresos actualizados de hoy y del mes.
+    El dashboard la consulta cuando no puede recibir el stream de eventos.
+    """
+    return JsonResponse(datos_ingresos(request.user))
+
+
+@login_required
+async def eventos_dashboard(request):
+    """
+    Stream SSE con los cambios de ingresos, cajas y alertas del usuario
+    (ver possitema/eventos.py). Solo bajo ASGI: con WSGI un stream abierto
+    ocuparía un worker entero, así que se responde 204 y el navegador deja
+    de reconectarse y vuelve al sondeo.
+    """
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import StreamingHttpResponse
+    from .eventos import flujo_eventos
+
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    usuario = await request.auser()
+    response = StreamingHttpResponse(flujo_eventos(usuario, datos_ingresos), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Nginx y similares no deben acumular el stream en su búfer
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# =========================================================================
+# ESTADÍSTICAS DE LA CACHÉ DE BÚSQUEDA
+# =========================================================================
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def estadisticas_cache_busqueda_ajax(request):
+    """Aciertos y fallos de la caché de búsqueda en vivo, para ajustar su TTL."""
+    from .cache_busqueda import estadisticas_cache_busqueda
+    return JsonResponse(estadisticas_cache_busqueda())
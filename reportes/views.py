@@ -40,9 +40,10 @@ from datetime import date, datetime, timedelta
 from decimal import Decimal
 import logging
 
-from inventario.models import Producto
+from inventario.models import BAJO_STOCK_UMBRAL, Producto
 from cliente.models import Cliente
-from ventas.models import Venta, DetalleVenta
+from ventas.models import Venta, DetalleVenta, ResumenVentaDiaria
+from ventas.services import rango_local, resumen_ventas
 from control.models import RegistroAsistencia
 from usuarios.models import EstadoCaja
 from django.contrib.auth.models import User
@@ -165,6 +166,14 @@ def reporte_caja(request):
 
 # ==================== REPORTES DE VENTAS ====================
 
+def _rango_fechas(fecha_inicio, fecha_fin, hoy):
+    """Fechas del filtro como date; si no son válidas, los últimos 30 días."""
+    try:
+        return date.fromisoformat(fecha_inicio), date.fromisoformat(fecha_fin)
+    except ValueError:
+        return hoy - timedelta(days=30), hoy
+
+
 @login_required
 def reporte_ventas(request):
     """Reporte de ventas por periodo"""
@@ -178,21 +187,18 @@ def reporte_ventas(request):
         fecha_inicio = (hoy - timedelta(days=30)).isoformat()
     if not fecha_fin:
         fecha_fin = hoy.isoformat()
-    
-    # Construir query base
-    ventas = Venta.objects.filter(
-        owner=request.user,
-        fecha_venta__gte=fecha_inicio,
-        fecha_venta__lte=fecha_fin
-    )
+    desde, hasta = _rango_fechas(fecha_inicio, fecha_fin, hoy)
+    # Mismos días locales y ventas activas que los totales del resumen diario
+    inicio, fin = rango_local(desde, hasta)
     
     if tipo_reporte == 'producto':
         # Agrupar por producto
         ventas_agrupadas = DetalleVenta.objects.filter(
             venta__owner=request.user,
-            venta__fecha_venta__gte=fecha_inicio,
-            venta__fecha_venta__lte=fecha_fin
-        ).values('producto__nombre').annotate(
+            venta__estado='ACT',
+            venta__fecha_venta__gte=inicio,
+            venta__fecha_venta__lt=fin
+        ).values('producto_nombre').annotate(
             total_cantidad=Sum('cantidad'),
             total_monto=Sum(F('cantidad') * F('precio_unitario'), output_field=FloatField()),
             cantidad_ventas=Count('venta_id', distinct=True)
@@ -210,8 +216,9 @@ def reporte_ventas(request):
         # Agrupar por cliente
         ventas_agrupadas = Venta.objects.filter(
             owner=request.user,
-            fecha_venta__gte=fecha_inicio,
-            fecha_venta__lte=fecha_fin
+            estado='ACT',
+            fecha_venta__gte=inicio,
+            fecha_venta__lt=fin
         ).values('cliente__nombre').annotate(
             total_monto=Sum('total'),
             cantidad_compras=Count('id_venta')
@@ -226,17 +233,15 @@ def reporte_ventas(request):
         }
     
     else:  # diario
-        # Agrupar por día
-        ventas_agrupadas = Venta.objects.filter(
+        # Agrupar por día local: una fila del resumen diario por cajero y día
+        ventas_agrupadas = ResumenVentaDiaria.objects.filter(
             owner=request.user,
-            fecha_venta__gte=fecha_inicio,
-            fecha_venta__lte=fecha_fin
-        ).extra(
-            select={'fecha': 'DATE(fecha_venta)'}
+            fecha__gte=desde,
+            fecha__lte=hasta
         ).values('fecha').annotate(
             total_monto=Sum('total'),
-            cantidad_ventas=Count('id_venta')
-        ).order_by('-fecha')
+            cantidad_ventas=Sum('cantidad_ventas')
+        ).filter(cantidad_ventas__gt=0).order_by('-fecha')
         
         context = {
             'titulo': 'Reporte de Ventas Diario',
@@ -246,14 +251,11 @@ def reporte_ventas(request):
             'fecha_fin': fecha_fin,
         }
     
-    # Totales generales
-    total_ventas = ventas.aggregate(
-        cantidad=Count('id_venta'),
-        monto=Sum('total')
-    )
+    # Totales generales (ventas activas, desde el resumen diario)
+    total_ventas = resumen_ventas(desde, hasta, owner=request.user)
     
-    context['total_cantidad'] = total_ventas['cantidad'] or 0
-    context['total_monto'] = total_ventas['monto'] or 0
+    context['total_cantidad'] = total_ventas['cantidad_ventas']
+    context['total_monto'] = total_ventas['total']
     
     return render(request, 'reportes/ventas.html', context)
 
@@ -325,7 +327,7 @@ def reporte_inventario(request):
     
     if tipo_reporte == 'bajo_stock':
         # Productos con bajo stock
-        productos = Producto.objects.filter(user=request.user, cantidad__lte=10).order_by('cantidad')
+        productos = Producto.objects.filter(user=request.user, cantidad__lte=BAJO_STOCK_UMBRAL).order_by('cantidad')
         titulo = 'Reporte de Productos con Bajo Stock'
     else:
         # Todos los productos
@@ -334,7 +336,7 @@ def reporte_inventario(request):
     
     # Calcular estadísticas
     total_productos = productos.count()
-    bajo_stock = Producto.objects.filter(user=request.user, cantidad__lte=10).count()
+    bajo_stock = Producto.objects.filter(user=request.user, cantidad__lte=BAJO_STOCK_UMBRAL).count()
     sin_stock = Producto.objects.filter(user=request.user, cantidad=0).count()
     valor_total_inventario = sum(
         (p.cantidad * (p.precio_costo or 0)) for p in productos
@@ -368,14 +370,10 @@ def reporte_financiero(request):
         fecha_inicio = (hoy - timedelta(days=30)).isoformat()
     if not fecha_fin:
         fecha_fin = hoy.isoformat()
+    desde, hasta = _rango_fechas(fecha_inicio, fecha_fin, hoy)
     
     # Ingresos por ventas (solo ventas activas, excluyendo anuladas)
-    ingresos = Venta.objects.filter(
-        owner=request.user,
-        fecha_venta__gte=fecha_inicio,
-        fecha_venta__lte=fecha_fin,
-        estado='ACT'
-    ).aggregate(total=Sum('total'))['total'] or 0
+    ingresos = resumen_ventas(desde, hasta, owner=request.user)['total']
     
     # Gastos del período
     from gasto.models import Gasto
@@ -554,7 +552,7 @@ def exportar_inventario_excel(request):
         ws.cell(row=row, column=2, value=str(p.categoria) if hasattr(p, 'categoria') and p.categoria else '-').border = border
         cell_stock = ws.cell(row=row, column=3, value=p.cantidad)
         cell_stock.border = border
-        if p.cantidad <= 10:
+        if p.cantidad <= BAJO_STOCK_UMBRAL:
             cell_stock.fill = alert_fill
 
         costo = float(p.precio_costo or 0)
@@ -0,0 +1,75 @@
+// static/compra_productos.js
+// Selector de productos de las líneas de compra. En lugar de poner todo el
+// catálogo en cada <select>, busca con `productos_compra_ajax` mientras se
+// escribe; sin texto sugiere lo último que se le compró al proveedor
+// elegido y, al seleccionar, prellena el costo con el último pagado.
+(function ($) {
+    var config = {
+        url: null,
+        proveedor: '#proveedor'
+    };
+
+    function formatear(item) {
+        if (!item.id || item.stock === undefined) {
+            return item.text;
+        }
+        var extra = 'Stock: ' + item.stock;
+        if (item.ultima_compra) {
+            extra += ' · Última compra ' + item.ultima_compra + ' a $' + item.costo.toFixed(2);
+        }
+        return $('<div>').text(item.text).append($('<small class="d-block text-muted">').text(extra));
+    }
+
+    function iniciar(select) {
+        var $select = $(select);
+        $select.select2({
+            theme: 'bootstrap4',
+            width: '100%',
+            placeholder: '-- Busca un producto --',
+            ajax: {
+                url: config.url,
+                dataType: 'json',
+                delay: 250,
+                data: function (params) {
+                    return { q: params.term || '', proveedor: $(config.proveedor).val() || '' };
+                }
+            },
+            templateResult: formatear
+        });
+        $select.on('select2:select', function (e) {
+            var $costo = $select.closest('tr').find('.costo-input');
+            if (!$costo.val()) {
+                $costo.val(e.params.data.costo.toFixed(2)).trigger('change');
+            }
+        });
+    }
+
+    // La fila clonada trae el contenedor de Select2 de la original: se quita
+    // y se deja el <select> vacío para volver a iniciarlo
+    function limpiar(fila) {
+        var $fila = $(fila);
+        $fila.find('.select2-container').remove();
+        $fila.find('.producto-select')
+            .removeClass('select2-hidden-accessible')
+            .removeAttr('data-select2-id aria-hidden tabindex')
+            .empty()
+            .append('<option value=""></option>');
+    }
+
+    function agregarFila(fila) {
+        limpiar(fila);
+        iniciar($(fila).find('.producto-select'));
+    }
+
+    function init(opciones) {
+        $.extend(config, opciones);
+        $('.producto-select').each(function () {
+            iniciar(this);
+        });
+    }
+
+    window.SelectorProductosCompra = {
+        init: init,
+        agregarFila: agregarFila
+    };
+})(jQuery);
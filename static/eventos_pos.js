@@ -0,0 +1,67 @@
+// static/eventos_pos.js
+// Canal de eventos del servidor (SSE) para el dashboard y las alertas. Cada
+// parte de la página se suscribe a un evento con la función que pinta los
+// datos recibidos y la función de sondeo que usaba antes; si el navegador no
+// tiene EventSource o el servidor no ofrece el stream (responde 204 bajo
+// WSGI), se vuelve al sondeo periódico de siempre.
+(function () {
+    var suscripciones = [];
+    var sondeoActivo = false;
+
+    // opciones: { alRecibir(datos), sondear(), intervalo (ms) }
+    function suscribir(evento, opciones) {
+        suscripciones.push({ evento: evento, opciones: opciones });
+    }
+
+    function iniciarSondeo() {
+        if (sondeoActivo) {
+            return;
+        }
+        sondeoActivo = true;
+        suscripciones.forEach(function (s) {
+            setInterval(s.opciones.sondear, s.opciones.intervalo);
+        });
+    }
+
+    // Tras una reconexión se pudo perder algún evento: se consulta una vez
+    function sincronizar() {
+        suscripciones.forEach(function (s) {
+            s.opciones.sondear();
+        });
+    }
+
+    function iniciar(url) {
+        if (!suscripciones.length) {
+            return;
+        }
+        if (!window.EventSource) {
+            iniciarSondeo();
+            return;
+        }
+        var fuente = new EventSource(url);
+        var conectado = false;
+
+        suscripciones.forEach(function (s) {
+            fuente.addEventListener(s.evento, function (e) {
+                s.opciones.alRecibir(JSON.parse(e.data));
+            });
+        });
+        fuente.onopen = function () {
+            if (conectado) {
+                sincronizar();
+            }
+            conectado = true;
+        };
+        fuente.onerror = function () {
+            // CLOSED: el servidor rechazó el stream; CONNECTING: reintenta solo
+            if (fuente.readyState === EventSource.CLOSED) {
+                iniciarSondeo();
+            }
+        };
+    }
+
+    window.EventosPOS = {
+        suscribir: suscribir,
+        iniciar: iniciar
+    };
+})();
@@ -0,0 +1,144 @@
+// static/pos_catalogo.js
+// Copia local del catálogo de productos para que la búsqueda del POS no
+// haga una petición por tecla. Se descarga una vez (`catalogo_pos_ajax`) y
+// luego solo se piden los cambios desde la última versión; si nada cambió,
+// el servidor responde 304 gracias al ETag.
+(function () {
+    var INTERVALO_MS = 30000;
+
+    var config = {
+        url: null,
+        clave: 'pos_catalogo',
+        onCambio: function () {}
+    };
+    var estado = { version: null, etag: null, productos: {} };
+    var sincronizando = false;
+
+    // Minúsculas y sin tildes, igual que Producto.busqueda en el servidor
+    function normalizar(texto) {
+        return String(texto || '').normalize('NFD').replace(/[\u0300-\u036f]/g, '')
+            .toLowerCase().split(/\s+/).filter(Boolean).join(' ');
+    }
+
+    function cargarLocal() {
+        try {
+            var guardado = JSON.parse(localStorage.getItem(config.clave));
+            if (guardado && guardado.productos) {
+                estado = guardado;
+            }
+        } catch (e) {
+            estado = { version: null, etag: null, productos: {} };
+        }
+    }
+
+    function guardarLocal() {
+        try {
+            localStorage.setItem(config.clave, JSON.stringify(estado));
+        } catch (e) {
+            // Catálogo demasiado grande para localStorage: queda solo en memoria
+            localStorage.removeItem(config.clave);
+        }
+    }
+
+    function aplicar(data) {
+        if (data.completo) {
+            estado.productos = {};
+        }
+        (data.bajas || []).forEach(function (id) {
+            delete estado.productos[id];
+        });
+        data.productos.forEach(function (fila) {
+            var producto = {};
+            data.campos.forEach(function (campo, i) {
+                producto[campo] = fila[i];
+            });
+            producto.busqueda = normalizar(producto.nombre + ' ' + producto.id);
+            estado.productos[producto.id] = producto;
+        });
+        estado.version = data.version;
+    }
+
+    function sincronizar() {
+        if (sincronizando || !config.url || !navigator.onLine) {
+            return Promise.resolve();
+        }
+        sincronizando = true;
+        var url = config.url + (estado.version !== null ? '?desde=' + estado.version : '');
+        var headers = estado.etag ? { 'If-None-Match': estado.etag } : {};
+        return fetch(url, { credentials: 'same-origin', headers: headers, cache: 'no-store' })
+            .then(function (resp) {
+                if (resp.status === 304) {
+                    return;
+                }
+                if (!resp.ok) {
+                    throw new Error('HTTP ' + resp.status);
+                }
+                return resp.json().then(function (data) {
+                    aplicar(data);
+                    estado.etag = resp.headers.get('ETag');
+                    guardarLocal();
+                    config.onCambio(Object.keys(estado.productos).length);
+                });
+            })
+            .catch(function (err) {
+                console.warn('Catálogo local sin actualizar:', err);
+            })
+            .then(function () {
+                sincronizando = false;
+            });
+    }
+
+    // Misma relevancia que inventario.services.buscar_productos
+    function relevancia(producto, texto, codigo) {
+        var id = String(producto.id).toLowerCase();
+        if (id === codigo) return 0;
+        if (id.indexOf(codigo) === 0) return 1;
+        if (producto.busqueda.indexOf(texto) === 0) return 2;
+        if (producto.busqueda.indexOf(' ' + texto) !== -1) return 3;
+        return 4;
+    }
+
+    function buscar(consulta, limite) {
+        var texto = normalizar(consulta);
+        var codigo = String(consulta || '').trim().toLowerCase();
+        if (!texto) {
+            return [];
+        }
+        var palabras = texto.split(' ');
+        var resultados = [];
+        for (var id in estado.productos) {
+            var producto = estado.productos[id];
+            if (producto.stock <= 0) {
+                continue;
+            }
+            var coincide = palabras.every(function (p) { return producto.busqueda.indexOf(p) !== -1; });
+            if (coincide) {
+                resultados.push({ producto: producto, rango: relevancia(producto, texto, codigo) });
+            }
+        }
+        resultados.sort(function (a, b) {
+            return a.rango - b.rango || a.producto.nombre.localeCompare(b.producto.nombre);
+        });
+        return resultados.slice(0, limite || 10).map(function (r) {
+            var p = r.producto;
+            return { id: p.id, id_producto: p.id, nombre: p.nombre, precio: p.precio, stock: p.stock, tarifa_iva: p.tarifa_iva };
+        });
+    }
+
+    function init(opciones) {
+        for (var k in opciones) {
+            config[k] = opciones[k];
+        }
+        cargarLocal();
+        window.addEventListener('online', sincronizar);
+        setInterval(sincronizar, INTERVALO_MS);
+        return sincronizar();
+    }
+
+    window.PosCatalogo = {
+        init: init,
+        buscar: buscar,
+        sincronizar: sincronizar,
+        listo: function () { return estado.version !== null; }
+    };
+})();
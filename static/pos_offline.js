@@ -0,0 +1,131 @@
+// static/pos_offline.js
+// Cola local de ventas para que el POS siga cobrando sin conexión.
+// Las ventas se guardan en localStorage con su clave de idempotencia y se
+// envían en bloque a `sincronizar_ventas_offline` cuando vuelve la red.
+(function () {
+    var CLAVE_COLA = 'pos_ventas_pendientes';
+    var CLAVE_CONFLICTOS = 'pos_ventas_conflictos';
+    var TAMANO_LOTE = 200;
+    var INTERVALO_MS = 60000;
+
+    var config = {
+        url: null,
+        csrfToken: null,
+        onCambio: function () {},
+        onConflictos: function () {}
+    };
+    var sincronizando = false;
+
+    function leer(clave) {
+        try {
+            return JSON.parse(localStorage.getItem(clave)) || [];
+        } catch (e) {
+            return [];
+        }
+    }
+
+    function guardar(clave, valor) {
+        localStorage.setItem(clave, JSON.stringify(valor));
+    }
+
+    function pendientes() {
+        return leer(CLAVE_COLA);
+    }
+
+    function encolar(venta) {
+        var cola = pendientes();
+        venta.fecha_offline = new Date().toISOString();
+        cola.push(venta);
+        guardar(CLAVE_COLA, cola);
+        config.onCambio(cola.length);
+    }
+
+    function enviarLote(lote) {
+        return fetch(config.url, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFTOKEN': config.csrfToken
+            },
+            body: JSON.stringify({ ventas: lote })
+        }).then(function (resp) {
+            if (!resp.ok) {
+                throw new Error('HTTP ' + resp.status);
+            }
+            return resp.json();
+        });
+    }
+
+    // Quita de la cola las ventas ya resueltas por el servidor. Los
+    // conflictos (p. ej. stock insuficiente) se apartan para revisión.
+    function aplicarResultados(resultados) {
+        var resueltas = {};
+        var conflictos = leer(CLAVE_CONFLICTOS);
+        var nuevosConflictos = [];
+        resultados.forEach(function (r) {
+            resueltas[r.clave_idempotencia] = r;
+        });
+        var cola = pendientes().filter(function (venta) {
+            var r = resueltas[venta.clave_idempotencia];
+            if (!r) {
+                return true;
+            }
+            if (r.estado === 'conflicto' || r.estado === 'error') {
+                venta.error = r.error;
+                nuevosConflictos.push(venta);
+            }
+            return false;
+        });
+        guardar(CLAVE_COLA, cola);
+        if (nuevosConflictos.length) {
+            guardar(CLAVE_CONFLICTOS, conflictos.concat(nuevosConflictos));
+            config.onConflictos(nuevosConflictos);
+        }
+        config.onCambio(cola.length);
+    }
+
+    function sincronizar() {
+        if (sincronizando || !config.url || !navigator.onLine) {
+            return Promise.resolve();
+        }
+        var cola = pendientes();
+        if (!cola.length) {
+            return Promise.resolve();
+        }
+        sincronizando = true;
+        var lotes = [];
+        for (var i = 0; i < cola.length; i += TAMANO_LOTE) {
+            lotes.push(cola.slice(i, i + TAMANO_LOTE));
+        }
+        return lotes.reduce(function (promesa, lote) {
+            return promesa.then(function () {
+                return enviarLote(lote).then(function (data) {
+                    aplicarResultados(data.resultados || []);
+                });
+            });
+        }, Promise.resolve()).catch(function (err) {
+            console.warn('Sincronización offline pendiente:', err);
+        }).then(function () {
+            sincronizando = false;
+        });
+    }
+
+    function init(opciones) {
+        for (var k in opciones) {
+            config[k] = opciones[k];
+        }
+        window.addEventListener('online', sincronizar);
+        setInterval(sincronizar, INTERVALO_MS);
+        config.onCambio(pendientes().length);
+        sincronizar();
+    }
+
+    window.PosOffline = {
+        init: init,
+        encolar: encolar,
+        pendientes: pendientes,
+        conflictos: function () { return leer(CLAVE_CONFLICTOS); },
+        sincronizar: sincronizar
+    };
+})();
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0007_passwordresettoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registroacceso',
+            index=models.Index(fields=['fecha_hora', 'id'], name='registro_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0008_indices_consultas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SesionActiva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40, unique=True)),
+                ('inicio', models.DateTimeField(auto_now_add=True)),
+                ('ultima_actividad', models.DateTimeField()),
+                ('expira', models.DateTimeField(help_text='Vencimiento de la sesión de Django')),
+                ('ip_address', models.CharField(blank=True, help_text='IP del cliente', max_length=45, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sesiones_activas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Sesión Activa',
+                'verbose_name_plural': 'Sesiones Activas',
+                'indexes': [models.Index(fields=['ultima_actividad'], include=('user', 'expira'), name='sesion_actividad_idx'), models.Index(fields=['expira'], name='sesion_expira_idx')],
+            },
+        ),
+    ]
@@ -46,6 +46,8 @@ class RegistroAcceso(models.Model):
         indexes = [
             models.Index(fields=['user', '-fecha_hora']),
             models.Index(fields=['tipo_evento', '-fecha_hora']),
+            # Listado paginado por cursor (fecha_hora, pk)
+            models.Index(fields=['fecha_hora', 'id'], name='registro_fecha_id_idx'),
         ]
     
     def __str__(self):
@@ -72,6 +74,33 @@ class RegistroAcceso(models.Model):
             return f"{minutos}m"
 
 
+class SesionActiva(models.Model):
+    """
+    Presencia: una fila por sesión iniciada y aún no cerrada. Se crea al
+    iniciar sesión, se borra al cerrarla y se renueva con la actividad (ver
+    usuarios.services); las sesiones que vencen o quedan inactivas sin
+    logout simplemente dejan de contarse.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sesiones_activas')
+    session_key = models.CharField(max_length=40, unique=True)
+    inicio = models.DateTimeField(auto_now_add=True)
+    ultima_actividad = models.DateTimeField()
+    expira = models.DateTimeField(help_text="Vencimiento de la sesión de Django")
+    ip_address = models.CharField(max_length=45, blank=True, null=True, help_text="IP del cliente")
+
+    class Meta:
+        verbose_name = "Sesión Activa"
+        verbose_name_plural = "Sesiones Activas"
+        indexes = [
+            # Usuarios conectados: rango sobre la última actividad
+            models.Index(fields=['ultima_actividad'], name='sesion_actividad_idx', include=['user', 'expira']),
+            models.Index(fields=['expira'], name='sesion_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - activa desde {self.inicio}"
+
+
 class PasswordResetToken(models.Model):
     """Token seguro para recuperación de contraseña (almacenado en BD)."""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='password_reset_tokens')
@@ -0,0 +1,83 @@
+# usuarios/services.py
+"""
+Presencia de usuarios (SesionActiva).
+
+El login crea la fila de la sesión y el logout la borra. Mientras tanto,
+PresenciaMiddleware renueva la última actividad como mucho una vez cada
+INTERVALO_ACTIVIDAD, guardando la marca en la propia sesión para no
+escribir en cada petición. Un usuario cuenta como conectado si tiene
+alguna sesión sin vencer con actividad dentro de VENTANA_PRESENCIA, así que
+quien cierra el navegador sin salir deja de contarse solo.
+
+`usuarios_conectados` es una sola consulta sobre el índice de actividad, en
+lugar de buscar el último LOGIN y LOGOUT de cada usuario en RegistroAcceso.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import SesionActiva
+
+# Sin actividad durante este tiempo, la sesión deja de contar como conectada.
+# El dashboard consulta cada 30 segundos, así que una pestaña abierta se
+# mantiene presente.
+VENTANA_PRESENCIA = timedelta(minutes=15)
+# Frecuencia máxima con la que una sesión renueva su última actividad
+INTERVALO_ACTIVIDAD = timedelta(minutes=2)
+CLAVE_PRESENCIA = '_presencia_marcada'
+
+
+def registrar_presencia(request, user, ip=None):
+    """Crea (o renueva) la fila de presencia de la sesión recién iniciada."""
+    session_key = request.session.session_key
+    if not session_key:
+        return
+    ahora = timezone.now()
+    # Las sesiones vencidas de cualquier usuario ya no sirven para nada
+    SesionActiva.objects.filter(expira__lte=ahora).delete()
+    SesionActiva.objects.update_or_create(
+        session_key=session_key,
+        defaults={
+            'user': user,
+            'ultima_actividad': ahora,
+            'expira': request.session.get_expiry_date(),
+            'ip_address': ip,
+        },
+    )
+    request.session[CLAVE_PRESENCIA] = ahora.timestamp()
+
+
+def quitar_presencia(request):
+    """Borra la fila de la sesión que se está cerrando."""
+    session_key = request.session.session_key
+    if session_key:
+        SesionActiva.objects.filter(session_key=session_key).delete()
+
+
+def marcar_actividad(request):
+    """
+    Renueva la última actividad de la sesión si la marca guardada en ella
+    tiene más de INTERVALO_ACTIVIDAD. Las sesiones iniciadas antes de que
+    existiera la presencia se registran aquí la primera vez.
+    """
+    ahora = timezone.now()
+    marcada = request.session.get(CLAVE_PRESENCIA)
+    if marcada is not None and ahora.timestamp() - marcada < INTERVALO_ACTIVIDAD.total_seconds():
+        return
+    request.session[CLAVE_PRESENCIA] = ahora.timestamp()
+    actualizadas = SesionActiva.objects.filter(session_key=request.session.session_key).update(
+        ultima_actividad=ahora, expira=request.session.get_expiry_date(),
+    )
+    if not actualizadas:
+        registrar_presencia(request, request.user)
+
+
+def usuarios_conectados(ahora=None):
+    """Queryset con los ids (sin repetir) de los usuarios conectados ahora."""
+    ahora = ahora or timezone.now()
+    return (
+        SesionActiva.objects
+        .filter(ultima_actividad__gte=ahora - VENTANA_PRESENCIA, expira__gt=ahora)
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
@@ -8,6 +8,8 @@ from datetime import timedelta
 import logging
 
 from .models import RegistroAcceso, EstadoCaja
+from .services import quitar_presencia, registrar_presencia
+from possitema.eventos import publicar
 
 logger = logging.getLogger(__name__)
 
@@ -99,6 +101,28 @@ def registrar_logout(sender, request, user, **kwargs):
         logger.error(f"Error registrando logout para usuario desconocido: {str(e)}")
 
 
+@receiver(user_logged_in)
+def marcar_presencia_login(sender, request, user, **kwargs):
+    """Agrega la sesión recién iniciada a los usuarios conectados"""
+    if user is None or not getattr(user, 'id', None) or request is None:
+        return
+    try:
+        registrar_presencia(request, user, ip=obtener_ip_cliente(request))
+    except Exception as e:
+        logger.error(f"Error registrando presencia para usuario {user.username}: {str(e)}")
+
+
+@receiver(user_logged_out)
+def quitar_presencia_logout(sender, request, user, **kwargs):
+    """Quita la sesión que se cierra de los usuarios conectados"""
+    if request is None:
+        return
+    try:
+        quitar_presencia(request)
+    except Exception as e:
+        logger.error(f"Error quitando presencia: {str(e)}")
+
+
 # =========================================================================
 # SINCRONIZACIÓN ENTRE APERTURA DE CAJA (ventas.Caja) Y ESTADO DE CAJA
 # =========================================================================
@@ -138,6 +162,12 @@ def sincronizar_apertura_caja(sender, instance, created, **kwargs):
         logger.error(f"Error sincronizando caja: {str(e)}")
 
 
+@receiver(post_save, sender='ventas.Caja')
+def avisar_cambio_caja(sender, instance, **kwargs):
+    """Los dashboards abiertos actualizan el conteo de cajas del día"""
+    publicar(None, 'caja')
+
+
 @receiver(post_save, sender='ventas.Caja')
 def sincronizar_cierre_caja(sender, instance, **kwargs):
     """
@@ -27,3 +27,88 @@ class RegistroUsuarioTestCase(TestCase):
 from django.test import TestCase
 
 # Create your tests here.
+
+
+class PaginacionCursorTestCase(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        from .models import RegistroAcceso
+
+        user = get_user_model().objects.create_user(username='admin', password='x')
+        for _ in range(7):
+            RegistroAcceso.objects.create(user=user, tipo_evento='LOGIN')
+        # Fechas repetidas: el pk desempata
+        RegistroAcceso.objects.update(fecha_hora=timezone.now())
+        self.registros = RegistroAcceso.objects.all()
+        self.esperado = list(self.registros.order_by('-fecha_hora', '-pk').values_list('pk', flat=True))
+
+    def _pagina(self, **parametros):
+        from django.test import RequestFactory
+        from possitema.paginacion import paginar_por_cursor
+
+        request = RequestFactory().get('/', parametros)
+        return paginar_por_cursor(self.registros, request, 'fecha_hora', 3)
+
+    def test_recorre_adelante_y_atras_sin_offset(self):
+        primera = self._pagina(tipo_evento='LOGIN')
+        segunda = self._pagina(despues=primera.cursor_siguiente)
+        tercera = self._pagina(despues=segunda.cursor_siguiente)
+        self.assertEqual([r.pk for p in (primera, segunda, tercera) for r in p], self.esperado)
+        self.assertFalse(primera.has_previous)
+        self.assertFalse(tercera.has_next)
+        self.assertEqual(primera.query_string, 'tipo_evento=LOGIN')
+
+        volver = self._pagina(antes=tercera.cursor_anterior)
+        self.assertEqual([r.pk for r in volver], [r.pk for r in segunda])
+        self.assertEqual([r.pk for r in self._pagina(despues='basura')], self.esperado[:3])
+        self.assertEqual(primera.total_estimado, 7)
+
+    def test_cursor_manipulado_vuelve_a_la_primera_pagina(self):
+        from possitema.paginacion import _codificar
+
+        for valor in (['{}', 1], [[1], 1], [None, 1], ['2026-01-01T00:00:00', None], ['2026-13-45', 1], [1, 2, 3]):
+            for nombre in ('despues', 'antes'):
+                pagina = self._pagina(**{nombre: _codificar(valor)})
+                self.assertEqual([r.pk for r in pagina], self.esperado[:3], (nombre, valor))
+
+
+class PresenciaUsuariosTestCase(TestCase):
+    def setUp(self):
+        self.User = get_user_model()
+        self.cajero = self.User.objects.create_user(username='cajero', password='x')
+
+    def test_login_y_logout_actualizan_los_conectados(self):
+        from .services import usuarios_conectados
+
+        self.client.force_login(self.cajero)
+        self.assertEqual(list(usuarios_conectados()), [self.cajero.pk])
+        otro = Client()
+        otro.force_login(self.cajero)
+        self.assertEqual(usuarios_conectados().count(), 1)  # Dos sesiones, un usuario
+
+        self.client.logout()
+        otro.logout()
+        self.assertFalse(usuarios_conectados().exists())
+
+    def test_sesion_inactiva_o_vencida_deja_de_contar(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import SesionActiva
+        from .services import VENTANA_PRESENCIA, usuarios_conectados
+
+        self.client.force_login(self.cajero)
+        ahora = timezone.now()
+        self.assertFalse(usuarios_conectados(ahora + VENTANA_PRESENCIA + timedelta(seconds=1)).exists())
+        SesionActiva.objects.update(expira=ahora - timedelta(seconds=1))
+        self.assertFalse(usuarios_conectados(ahora).exists())
+
+    def test_conteo_del_dashboard_en_una_consulta(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .services import usuarios_conectados
+
+        for i in range(5):
+            Client().force_login(self.User.objects.create_user(username=f'u{i}', password='x'))
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(usuarios_conectados().count(), 5)
+        self.assertEqual(len(consultas), 1)
@@ -495,6 +495,7 @@ def dashboard_personal(request):
 def lista_personal(request):
     """Lista de todos los trabajadores con su estatus - Solo para admins"""
     from .models import EstadoCaja, RegistroAcceso
+    from .services import usuarios_conectados
     from datetime import timedelta
     from django.utils import timezone
     
@@ -515,6 +516,9 @@ def lista_personal(request):
     inicio_dia = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
     fin_dia = inicio_dia + timedelta(days=1)
     
+    # Sesiones activas ahora (las que vencieron sin logout ya no cuentan)
+    conectados = set(usuarios_conectados(ahora))
+    
     # Crear lista con información de cada usuario
     personal_info = []
     for user in usuarios:
@@ -534,13 +538,6 @@ def lista_personal(request):
             fecha_hora__lt=fin_dia
         ).order_by('-fecha_hora').first()
         
-        # Verificar si hay una sesión activa (login sin logout después)
-        sesion_activa = False
-        if ultimo_login and not ultimo_logout:
-            sesion_activa = True
-        elif ultimo_login and ultimo_logout:
-            sesion_activa = ultimo_login.fecha_hora > ultimo_logout.fecha_hora
-        
         # Buscar el estado de caja de hoy (usando la misma lógica de fecha)
         estado_caja = EstadoCaja.objects.filter(
             user=user,
@@ -552,7 +549,7 @@ def lista_personal(request):
             'usuario': user,
             'ultimo_login': ultimo_login,
             'ultimo_logout': ultimo_logout,
-            'sesion_activa': sesion_activa,
+            'sesion_activa': user.pk in conectados,
             'estado_caja': estado_caja,
         })
     
@@ -707,7 +704,7 @@ def registro_acceso(request):
     tipo_evento = request.GET.get('tipo_evento')
     
     # Inicializar queryset
-    registros = RegistroAcceso.objects.select_related('user').order_by('-fecha_hora')
+    registros = RegistroAcceso.objects.select_related('user')
     
     # Filtrar por usuario
     if usuario_id:
@@ -740,21 +737,17 @@ def registro_acceso(request):
         Q(perfilusuario__owner=request.user) | Q(pk=request.user.pk)
     ).order_by('first_name', 'last_name')
     
-    # Paginar resultados (50 por página)
-    from django.core.paginator import Paginator
-    paginator = Paginator(registros, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginar resultados (50 por página) por cursor sobre (fecha_hora, pk)
+    from possitema.paginacion import paginar_por_cursor
+    registros = paginar_por_cursor(registros, request, 'fecha_hora', 50)
     
     context = {
-        'page_obj': page_obj,
-        'registros': page_obj.object_list,
+        'registros': registros,
         'usuarios': usuarios,
         'usuario_id_seleccionado': int(usuario_id) if usuario_id else None,
         'fecha_inicio': fecha_inicio or '',
         'fecha_fin': fecha_fin or '',
         'tipo_evento_seleccionado': tipo_evento or '',
-        'total_registros': registros.count(),
     }
     
     return render(request, 'usuarios/registro_acceso.html', context)
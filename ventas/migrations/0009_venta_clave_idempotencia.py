@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0008_venta_subido_sri_manual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='clave_idempotencia',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='Clave de Idempotencia'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0009_venta_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='establecimiento_sri',
+            field=models.CharField(blank=True, default='', editable=False, max_length=3, verbose_name='Establecimiento SRI'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='punto_emision_sri',
+            field=models.CharField(blank=True, default='', editable=False, max_length=3, verbose_name='Punto de Emisión SRI'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='secuencial_sri',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Secuencial SRI'),
+        ),
+    ]
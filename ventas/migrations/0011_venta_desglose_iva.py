@@ -0,0 +1,130 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:18
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+# Copia congelada de ventas.models: la migración no debe depender del código actual
+PORCENTAJES_IVA = {'0': Decimal('0'), '5': Decimal('5'), '15': Decimal('15'), 'NO_OBJETO': Decimal('0'), 'EXENTO': Decimal('0')}
+CAMPOS_BASE_POR_TARIFA = {'15': 'base_iva_15', '5': 'base_iva_5', '0': 'base_iva_0', 'NO_OBJETO': 'base_no_objeto', 'EXENTO': 'base_exento'}
+CAMPOS_IVA_POR_TARIFA = {'15': 'iva_15', '5': 'iva_5'}
+TAMANO_LOTE = 500
+
+
+def _centavos(valor):
+    return valor.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def desglosar_iva_existente(apps, schema_editor):
+    """
+    Completa el desglose de IVA de las ventas anteriores por lotes de
+    TAMANO_LOTE ventas. Se usa la tarifa actual del producto (15% si el
+    producto fue eliminado), que es lo mismo que recalculaban los comprobantes.
+    """
+    Venta = apps.get_model('ventas', 'Venta')
+    DetalleVenta = apps.get_model('ventas', 'DetalleVenta')
+
+    ultimo_pk = 0
+    while True:
+        venta_pks = list(
+            Venta.objects.filter(pk__gt=ultimo_pk).order_by('pk').values_list('pk', flat=True)[:TAMANO_LOTE]
+        )
+        if not venta_pks:
+            break
+        ultimo_pk = venta_pks[-1]
+
+        totales = {pk: {campo: Decimal('0.00') for campo in CAMPOS_BASE_POR_TARIFA.values()} for pk in venta_pks}
+        detalles = list(DetalleVenta.objects.filter(venta_id__in=venta_pks).select_related('producto'))
+        for detalle in detalles:
+            tarifa = detalle.producto.tarifa_iva if detalle.producto else '15'
+            if tarifa not in PORCENTAJES_IVA:
+                tarifa = '15'
+            detalle.tarifa_iva = tarifa
+            detalle.porcentaje_iva = PORCENTAJES_IVA[tarifa]
+            detalle.valor_iva = _centavos(detalle.subtotal * PORCENTAJES_IVA[tarifa] / Decimal('100'))
+            totales[detalle.venta_id][CAMPOS_BASE_POR_TARIFA[tarifa]] += detalle.subtotal
+        DetalleVenta.objects.bulk_update(detalles, ['tarifa_iva', 'porcentaje_iva', 'valor_iva'])
+
+        ventas = list(Venta.objects.filter(pk__in=venta_pks).only('pk'))
+        for venta in ventas:
+            valores = totales[venta.pk]
+            for tarifa, campo_iva in CAMPOS_IVA_POR_TARIFA.items():
+                valores[campo_iva] = _centavos(valores[CAMPOS_BASE_POR_TARIFA[tarifa]] * PORCENTAJES_IVA[tarifa] / Decimal('100'))
+            valores['subtotal_sin_impuestos'] = sum(valores[c] for c in CAMPOS_BASE_POR_TARIFA.values())
+            valores['iva_total'] = sum(valores[c] for c in CAMPOS_IVA_POR_TARIFA.values())
+            for campo, valor in valores.items():
+                setattr(venta, campo, valor)
+        campos = list(CAMPOS_BASE_POR_TARIFA.values()) + list(CAMPOS_IVA_POR_TARIFA.values()) + ['subtotal_sin_impuestos', 'iva_total']
+        Venta.objects.bulk_update(ventas, campos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0022_reservastock'),
+        ('ventas', '0010_venta_establecimiento_sri_venta_punto_emision_sri_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detalleventa',
+            name='porcentaje_iva',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5, verbose_name='Porcentaje IVA'),
+        ),
+        migrations.AddField(
+            model_name='detalleventa',
+            name='tarifa_iva',
+            field=models.CharField(default='15', max_length=20, verbose_name='Tarifa IVA'),
+        ),
+        migrations.AddField(
+            model_name='detalleventa',
+            name='valor_iva',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Valor IVA'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='base_exento',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Subtotal Exento de IVA'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='base_iva_0',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Subtotal IVA 0%'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='base_iva_15',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Subtotal IVA 15%'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='base_iva_5',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Subtotal IVA 5%'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='base_no_objeto',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Subtotal No Objeto de IVA'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='iva_15',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='IVA 15%'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='iva_5',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='IVA 5%'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='iva_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='IVA Total'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='subtotal_sin_impuestos',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Subtotal sin Impuestos'),
+        ),
+        migrations.RunPython(desglosar_iva_existente, migrations.RunPython.noop),
+    ]
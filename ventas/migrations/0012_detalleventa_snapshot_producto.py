@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0011_venta_desglose_iva'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detalleventa',
+            name='producto_codigo',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Código del Producto'),
+        ),
+        migrations.AddField(
+            model_name='detalleventa',
+            name='producto_nombre',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Nombre del Producto'),
+        ),
+    ]
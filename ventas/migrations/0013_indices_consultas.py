@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cliente', '0006_cliente_busqueda'),
+        ('ventas', '0012_detalleventa_snapshot_producto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['owner', 'fecha_venta', 'id_venta'], name='venta_owner_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['antendido_por', 'fecha_venta'], name='venta_cajero_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(condition=models.Q(('estado', 'ACT')), fields=['antendido_por', 'fecha_venta'], include=('total',), name='venta_cajero_activa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(condition=models.Q(('es_credito', True)), fields=['antendido_por', 'estado_credito'], name='venta_cajero_credito_idx'),
+        ),
+    ]
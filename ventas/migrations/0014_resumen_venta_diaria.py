@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0013_indices_consultas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('cantidad_ventas', models.IntegerField(default=0, verbose_name='Número de Ventas')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total Vendido')),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Subtotal de Detalles')),
+                ('costo', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Costo')),
+                ('ganancia', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Ganancia')),
+                ('cajero', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_venta_cajero', to=settings.AUTH_USER_MODEL, verbose_name='Cajero')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_venta_owner', to=settings.AUTH_USER_MODEL, verbose_name='Dueño')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Ventas Diario',
+                'verbose_name_plural': 'Resúmenes de Ventas Diarios',
+                'indexes': [models.Index(fields=['cajero', 'fecha'], name='resumen_venta_cajero_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'cajero', 'fecha'), name='resumen_venta_dia_unico')],
+            },
+        ),
+    ]
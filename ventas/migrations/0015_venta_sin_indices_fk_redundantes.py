@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0014_resumen_venta_diaria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='venta',
+            name='antendido_por',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Atendido por'),
+        ),
+        migrations.AlterField(
+            model_name='venta',
+            name='owner',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ventas_owner', to=settings.AUTH_USER_MODEL, verbose_name='Dueño/Superusuario'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:40
+
+from django.db import migrations, transaction
+
+# Copia congelada de possitema.services: la migración no debe depender del código actual
+NOMBRE_PRODUCTO_ELIMINADO = 'Producto eliminado'
+TAMANO_LOTE = 1000
+
+
+def completar_snapshot_detalles(apps, schema_editor):
+    """
+    Copia código y nombre del producto en los detalles registrados antes de
+    que DetalleVenta los guardara, por lotes de TAMANO_LOTE en orden de pk y
+    cada lote en su propia transacción (la migración no es atómica).
+    Los lectores usan solo la copia, así que ningún detalle queda vacío.
+    """
+    DetalleVenta = apps.get_model('ventas', 'DetalleVenta')
+    pendientes = DetalleVenta.objects.filter(producto_nombre='').order_by('pk')
+    ultimo_pk = 0
+    while True:
+        lote = list(
+            pendientes.filter(pk__gt=ultimo_pk).values('pk', 'producto_id', 'producto__nombre')[:TAMANO_LOTE]
+        )
+        if not lote:
+            break
+        ultimo_pk = lote[-1]['pk']
+        detalles = [
+            DetalleVenta(
+                pk=fila['pk'],
+                producto_codigo=fila['producto_id'] or '',
+                producto_nombre=fila['producto__nombre'] or NOMBRE_PRODUCTO_ELIMINADO,
+            )
+            for fila in lote
+        ]
+        with transaction.atomic():
+            DetalleVenta.objects.bulk_update(detalles, ['producto_codigo', 'producto_nombre'])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('ventas', '0015_venta_sin_indices_fk_redundantes'),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_snapshot_detalles, migrations.RunPython.noop),
+    ]
@@ -3,9 +3,40 @@ from django.db import models
 from inventario.models import Producto 
 from cliente.models import Cliente
 from django.contrib.auth.models import User
-from django.db.models import Sum, F
+from django.db.models import Sum, F, ExpressionWrapper
 from decimal import Decimal
 
+# Porcentaje de IVA y código SRI (codigoPorcentaje) de cada tarifa de Producto
+PORCENTAJES_IVA = {
+    '0': Decimal('0'),
+    '5': Decimal('5'),
+    '15': Decimal('15'),
+    'NO_OBJETO': Decimal('0'),
+    'EXENTO': Decimal('0'),
+}
+CODIGOS_PORCENTAJE_IVA_SRI = {'0': '0', '5': '5', '15': '4', 'NO_OBJETO': '6', 'EXENTO': '7'}
+TARIFA_IVA_DEFECTO = '15'
+
+# Costo y ganancia de una línea de venta (DetalleVenta) con el costo unitario
+# congelado al vender. Los usan Venta.ganancia_total y el resumen diario.
+COSTO_DETALLE = ExpressionWrapper(
+    F('costo_al_vender') * F('cantidad'), output_field=models.DecimalField(max_digits=14, decimal_places=2),
+)
+GANANCIA_DETALLE = ExpressionWrapper(
+    F('subtotal') - COSTO_DETALLE, output_field=models.DecimalField(max_digits=14, decimal_places=2),
+)
+
+# Campo de Venta que acumula la base imponible y el IVA de cada tarifa
+CAMPOS_BASE_POR_TARIFA = {
+    '15': 'base_iva_15',
+    '5': 'base_iva_5',
+    '0': 'base_iva_0',
+    'NO_OBJETO': 'base_no_objeto',
+    'EXENTO': 'base_exento',
+}
+CAMPOS_IVA_POR_TARIFA = {'15': 'iva_15', '5': 'iva_5'}
+
+
 class Venta(models.Model):
     METODOS_PAGO = [
         ('efectivo', 'Efectivo'),
@@ -28,9 +59,10 @@ class Venta(models.Model):
     ]
     
     id_venta = models.AutoField(primary_key=True)
-    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ventas_owner', null=True, blank=True, verbose_name="Dueño/Superusuario")
+    # Sin índice propio: los compuestos de Meta.indexes empiezan por owner y por antendido_por
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ventas_owner', null=True, blank=True, db_index=False, verbose_name="Dueño/Superusuario")
     cliente = models.ForeignKey(Cliente, on_delete=models.SET_NULL, null=True, blank=True)
-    antendido_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="Atendido por")
+    antendido_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, db_index=False, verbose_name="Atendido por")
     fecha_venta = models.DateTimeField(auto_now_add=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     metodo_pago = models.CharField(max_length=20, choices=METODOS_PAGO, default='efectivo', verbose_name="Método de Pago Principal")
@@ -52,6 +84,22 @@ class Venta(models.Model):
     caja = models.ForeignKey('Caja', on_delete=models.SET_NULL, null=True, blank=True, related_name='ventas_realizadas')
     email_enviado = models.BooleanField(default=False, verbose_name="Email Enviado")
     notas = models.TextField(blank=True, verbose_name="Notas de Venta")
+    # Clave generada por el POS para que los reintentos no dupliquen la venta
+    clave_idempotencia = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False, verbose_name="Clave de Idempotencia")
+    # Numeración SRI asignada al emitir el comprobante (no se reutiliza al anular)
+    establecimiento_sri = models.CharField(max_length=3, blank=True, default='', editable=False, verbose_name="Establecimiento SRI")
+    punto_emision_sri = models.CharField(max_length=3, blank=True, default='', editable=False, verbose_name="Punto de Emisión SRI")
+    secuencial_sri = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Secuencial SRI")
+    # Desglose de impuestos calculado al registrar la venta (ver DetalleVenta.valor_iva)
+    subtotal_sin_impuestos = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, verbose_name="Subtotal sin Impuestos")
+    base_iva_15 = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, verbose_name="Subtotal IVA 15%")
+    base_iva_5 = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, verbose_name="Subtotal IVA 5%")
+    base_iva_0 = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, verbose_name="Subtotal IVA 0%")
+    base_no_objeto = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, verbose_name="Subtotal No Objeto de IVA")
+    base_exento = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, verbose_name="Subtotal Exento de IVA")
+    iva_15 = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, verbose_name="IVA 15%")
+    iva_5 = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, verbose_name="IVA 5%")
+    iva_total = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, verbose_name="IVA Total")
 
     @property
     def usuario(self):
@@ -60,14 +108,32 @@ class Venta(models.Model):
 
     @property
     def ganancia_total(self):
-        resultado = self.detalles.aggregate(
-            ganancia_sum=Sum(
-                F('subtotal') - (F('costo_al_vender') * F('cantidad')),
-                output_field=models.DecimalField()
-        )
+        return self.detalles.aggregate(
+            ganancia_sum=Sum(GANANCIA_DETALLE, default=Decimal('0.00'))
         )['ganancia_sum']
-        return resultado if resultado is not None else Decimal('0.00')
     
+    @property
+    def numero_comprobante_sri(self):
+        """Número SRI en formato 001-001-000000123, o None si aún no se emitió."""
+        if not self.secuencial_sri:
+            return None
+        return f"{self.establecimiento_sri}-{self.punto_emision_sri}-{self.secuencial_sri:09d}"
+
+    @property
+    def desglose_iva(self):
+        """
+        Bases e IVA por tarifa guardados en la venta, sin consultar detalles.
+        Devuelve [(tarifa, etiqueta, base, iva)] solo para las tarifas usadas.
+        """
+        etiquetas = dict(Producto.TARIFAS_IVA)
+        desglose = []
+        for tarifa, campo_base in CAMPOS_BASE_POR_TARIFA.items():
+            base = getattr(self, campo_base)
+            if base:
+                iva = getattr(self, CAMPOS_IVA_POR_TARIFA[tarifa]) if tarifa in CAMPOS_IVA_POR_TARIFA else Decimal('0.00')
+                desglose.append((tarifa, etiquetas[tarifa], base, iva))
+        return desglose
+
     @property
     def saldo_credito(self):
         """Calcula el saldo pendiente de crédito"""
@@ -81,6 +147,24 @@ class Venta(models.Model):
         verbose_name = "Venta"
         verbose_name_plural = "Ventas"
         ordering = ['-fecha_venta']
+        indexes = [
+            # Reportes por rango de fechas e historial paginado por (fecha, pk)
+            models.Index(fields=['owner', 'fecha_venta', 'id_venta'], name='venta_owner_fecha_idx'),
+            # Ventas del cajero en cualquier estado ordenadas por fecha (últimas
+            # ventas del dashboard, historial, IA); el índice parcial de abajo
+            # no sirve sin estado='ACT'. También cubre la FK antendido_por
+            models.Index(fields=['antendido_por', 'fecha_venta'], name='venta_cajero_fecha_idx'),
+            # Totales del dashboard: solo ventas activas, con el total en el índice
+            models.Index(
+                fields=['antendido_por', 'fecha_venta'], include=['total'], name='venta_cajero_activa_idx',
+                condition=models.Q(estado='ACT'),
+            ),
+            # Créditos pendientes del cajero
+            models.Index(
+                fields=['antendido_por', 'estado_credito'], name='venta_cajero_credito_idx',
+                condition=models.Q(es_credito=True),
+            ),
+        ]
 
     def __str__(self):
         return f"Venta #{self.id_venta} - Cliente: {self.cliente}"
@@ -89,12 +173,19 @@ class DetalleVenta(models.Model):
     id_detalle_venta = models.AutoField(primary_key=True)
     venta = models.ForeignKey(Venta, on_delete=models.CASCADE, related_name='detalles')
     producto = models.ForeignKey(Producto, on_delete=models.SET_NULL, null=True)
+    # Copia del producto al vender: comprobantes y reportes no dependen de que siga existiendo
+    producto_codigo = models.CharField(max_length=100, blank=True, default='', verbose_name="Código del Producto")
+    producto_nombre = models.CharField(max_length=100, blank=True, default='', verbose_name="Nombre del Producto")
     cantidad = models.IntegerField(default=1)
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
 
     #Reporte de ganacias por producto vendido
     costo_al_vender = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, verbose_name="Costo unitario registrado")
+    # Impuesto congelado al vender: 'subtotal' es la base imponible de la línea
+    tarifa_iva = models.CharField(max_length=20, default=TARIFA_IVA_DEFECTO, verbose_name="Tarifa IVA")
+    porcentaje_iva = models.DecimalField(max_digits=5, decimal_places=2, default=0, verbose_name="Porcentaje IVA")
+    valor_iva = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Valor IVA")
     #calcular la ganancia para este item especifico
     @property
     def ganancia_detalle(self):
@@ -106,7 +197,7 @@ class DetalleVenta(models.Model):
         verbose_name_plural = "Detalles de Venta"
         
     def __str__(self):
-        return f"Detalle de Venta #{self.venta.id_venta} - Producto: {self.producto.nombre}"
+        return f"Detalle de Venta #{self.venta_id} - Producto: {self.producto_nombre}"
 
 
 class MetodoPagoVenta(models.Model):
@@ -208,6 +299,40 @@ class Caja(models.Model):
         total = self.ventas_realizadas.aggregate(total_sum=Sum('total'))['total_sum']
         return total if total is not None else Decimal('0.00')
 
+class ResumenVentaDiaria(models.Model):
+    """
+    Totales de las ventas activas por dueño, cajero y día local
+    (America/Guayaquil, TIME_ZONE del proyecto).
+
+    registrar_venta_completa suma cada venta y anular_venta la resta, en la
+    misma transacción (ver ventas.services); `reconstruir_resumen_ventas`
+    lo recalcula desde Venta/DetalleVenta. Los reportes y el dashboard leen
+    estas filas en lugar de recorrer las ventas del período.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='resumenes_venta_owner', verbose_name="Dueño")
+    cajero = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='resumenes_venta_cajero', verbose_name="Cajero")
+    fecha = models.DateField(verbose_name="Fecha")
+    cantidad_ventas = models.IntegerField(default=0, verbose_name="Número de Ventas")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Total Vendido")
+    # Suma de DetalleVenta.subtotal (sin IVA) y del costo registrado al vender
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Subtotal de Detalles")
+    costo = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Costo")
+    ganancia = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Ganancia")
+
+    class Meta:
+        verbose_name = "Resumen de Ventas Diario"
+        verbose_name_plural = "Resúmenes de Ventas Diarios"
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'cajero', 'fecha'], name='resumen_venta_dia_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['cajero', 'fecha'], name='resumen_venta_cajero_idx'),
+        ]
+
+    def __str__(self):
+        return f"Resumen {self.fecha} - {self.cajero}: ${self.total}"
+
+
 # ControlAcceso se mantiene como un modelo de permisos
 class ControlAcceso(models.Model):
     nombre = models.CharField(max_length=100, default='Control de Permiso POS')
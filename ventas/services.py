@@ -0,0 +1,226 @@
+# ventas/services.py
+"""
+Resumen diario de ventas (ResumenVentaDiaria).
+
+Cada venta activa suma una vez en la fila de (dueño, cajero, fecha local) y
+se resta al anularse, dentro de la transacción que la registra o la anula.
+Las lecturas siempre suman filas, así que el dashboard, la IA y los reportes
+obtienen los totales de un día, una semana o un mes leyendo unas pocas
+filas en lugar de recorrer las ventas del período.
+
+La fecha local es la de TIME_ZONE (America/Guayaquil): una venta a las
+20:00 en Ecuador ya es el día siguiente en UTC, pero cuenta en el día local.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+
+from possitema.eventos import publicar
+
+from .models import COSTO_DETALLE, GANANCIA_DETALLE, DetalleVenta, ResumenVentaDiaria, Venta
+
+ZONA_RESUMEN = ZoneInfo(settings.TIME_ZONE)
+CAMPOS_RESUMEN = ('cantidad_ventas', 'total', 'subtotal', 'costo', 'ganancia')
+# Clave del bloqueo consultivo entre las ventas y reconstruir_resumen
+BLOQUEO_RESUMEN = 0x52534D56
+
+
+def fecha_local(momento):
+    """Día local (TIME_ZONE) al que pertenece un datetime."""
+    return momento.astimezone(ZONA_RESUMEN).date()
+
+
+def _inicio_dia(fecha):
+    return datetime.combine(fecha, time.min, tzinfo=ZONA_RESUMEN)
+
+
+def rango_local(desde, hasta):
+    """
+    Límites [inicio, fin) de los días locales `desde`..`hasta` (inclusive),
+    para filtrar Venta.fecha_venta con los mismos días que el resumen diario.
+    """
+    return _inicio_dia(desde), _inicio_dia(hasta + timedelta(days=1))
+
+
+def _bloquear_resumen(exclusivo=False):
+    """
+    Bloqueo consultivo de Postgres hasta el fin de la transacción. Las ventas
+    lo toman compartido (no se esperan entre sí) y reconstruir_resumen
+    exclusivo: el recálculo espera a que confirmen las ventas en curso y las
+    siguientes esperan a que reemplace las filas. SQLite ya serializa las
+    escrituras.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    funcion = 'pg_advisory_xact_lock' if exclusivo else 'pg_advisory_xact_lock_shared'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {funcion}(%s)', [BLOQUEO_RESUMEN])
+
+
+def _acumular(owner_id, cajero_id, fecha, **deltas):
+    """Suma `deltas` a la fila del día con un UPDATE; la crea si aún no existe."""
+    _bloquear_resumen()
+    filtro = {'owner_id': owner_id, 'cajero_id': cajero_id, 'fecha': fecha}
+    cambios = {campo: F(campo) + valor for campo, valor in deltas.items()}
+    if ResumenVentaDiaria.objects.filter(**filtro).update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            ResumenVentaDiaria.objects.create(**filtro, **deltas)
+    except IntegrityError:
+        # Otra transacción creó la fila del día entre el UPDATE y el INSERT
+        ResumenVentaDiaria.objects.filter(**filtro).update(**cambios)
+
+
+def acumular_venta(venta, signo=1, subtotal=None, costo=None):
+    """
+    Suma (signo=1) o resta (signo=-1, al anular) una venta en su resumen
+    diario. Debe llamarse dentro de la transacción que registra o anula la
+    venta.
+
+    Args:
+        subtotal, costo: Totales de los detalles si ya se tienen en memoria;
+            si no, se calculan con un aggregate sobre los detalles.
+    """
+    if subtotal is None or costo is None:
+        agregados = venta.detalles.aggregate(
+            subtotal=Sum('subtotal', default=Decimal('0')),
+            costo=Sum(COSTO_DETALLE, default=Decimal('0')),
+        )
+        subtotal, costo = agregados['subtotal'], agregados['costo']
+    total = Decimal(str(venta.total))
+    _acumular(
+        venta.owner_id, venta.antendido_por_id, fecha_local(venta.fecha_venta),
+        cantidad_ventas=signo,
+        total=signo * total,
+        subtotal=signo * subtotal,
+        costo=signo * costo,
+        ganancia=signo * (subtotal - costo),
+    )
+    # Los dashboards abiertos reciben los ingresos nuevos
+    for propietario_id in {venta.owner_id, venta.antendido_por_id} - {None}:
+        publicar(propietario_id, 'ventas')
+
+
+def resumen_ventas(desde=None, hasta=None, **filtro):
+    """
+    Totales de las ventas activas entre dos fechas locales (inclusive).
+
+    Args:
+        **filtro: Filtros sobre ResumenVentaDiaria, p. ej. cajero=usuario u
+            owner=usuario.
+
+    Returns:
+        dict con cantidad_ventas, total, subtotal, costo y ganancia.
+    """
+    filas = ResumenVentaDiaria.objects.filter(**filtro)
+    if desde is not None:
+        filas = filas.filter(fecha__gte=desde)
+    if hasta is not None:
+        filas = filas.filter(fecha__lte=hasta)
+    return filas.aggregate(**{campo: Sum(campo, default=0) for campo in CAMPOS_RESUMEN})
+
+
+def resumen_ventas_periodos(periodos, **filtro):
+    """
+    Como resumen_ventas, para varios rangos de fechas a la vez: una sola
+    consulta sobre el rango que los cubre, con una suma condicional
+    (SUM ... FILTER) por rango y campo.
+
+    Args:
+        periodos: dict {nombre: (desde, hasta)} con fechas locales inclusive.
+
+    Returns:
+        dict {nombre: dict con cantidad_ventas, total, subtotal, costo y ganancia}.
+    """
+    agregados = {}
+    for nombre, (desde, hasta) in periodos.items():
+        en_periodo = Q(fecha__gte=desde, fecha__lte=hasta)
+        for campo in CAMPOS_RESUMEN:
+            agregados[f'{nombre}_{campo}'] = Sum(campo, filter=en_periodo, default=0)
+    fila = ResumenVentaDiaria.objects.filter(
+        fecha__gte=min(desde for desde, _ in periodos.values()),
+        fecha__lte=max(hasta for _, hasta in periodos.values()),
+        **filtro,
+    ).aggregate(**agregados)
+    return {
+        nombre: {campo: fila[f'{nombre}_{campo}'] for campo in CAMPOS_RESUMEN}
+        for nombre in periodos
+    }
+
+
+def ventas_por_dia(desde, hasta, **filtro):
+    """Totales por fecha local entre `desde` y `hasta` (inclusive), en orden de fecha."""
+    return (
+        ResumenVentaDiaria.objects.filter(fecha__gte=desde, fecha__lte=hasta, **filtro)
+        .values('fecha')
+        .annotate(**{campo: Sum(campo) for campo in CAMPOS_RESUMEN})
+        .order_by('fecha')
+    )
+
+
+def reconstruir_resumen(desde=None, hasta=None):
+    """
+    Recalcula el resumen diario desde Venta y DetalleVenta, para llenarlo la
+    primera vez o corregirlo. Las ventas y los detalles se agrupan por
+    separado (un JOIN repetiría el total de la venta por cada detalle). Leer
+    y reemplazar las filas del rango ocurre en una sola transacción que
+    excluye a las ventas (ver _bloquear_resumen), así que puede ejecutarse
+    con la tienda abierta: las ventas esperan mientras dura el recálculo.
+
+    Args:
+        desde, hasta: Fechas locales (inclusive); sin ellas, todo el historial.
+
+    Returns:
+        int: Número de filas de resumen creadas.
+    """
+    with transaction.atomic():
+        # Las agregaciones se leen con el bloqueo tomado: ninguna venta a
+        # medio confirmar queda fuera del recálculo ni suma sobre filas borradas
+        _bloquear_resumen(exclusivo=True)
+        ventas = Venta.objects.filter(estado='ACT')
+        detalles = DetalleVenta.objects.filter(venta__estado='ACT')
+        anteriores = ResumenVentaDiaria.objects.all()
+        if desde is not None:
+            ventas = ventas.filter(fecha_venta__gte=_inicio_dia(desde))
+            detalles = detalles.filter(venta__fecha_venta__gte=_inicio_dia(desde))
+            anteriores = anteriores.filter(fecha__gte=desde)
+        if hasta is not None:
+            fin = _inicio_dia(hasta + timedelta(days=1))
+            ventas = ventas.filter(fecha_venta__lt=fin)
+            detalles = detalles.filter(venta__fecha_venta__lt=fin)
+            anteriores = anteriores.filter(fecha__lte=hasta)
+
+        filas = {}
+        por_venta = (
+            ventas.order_by()
+            .annotate(dia=TruncDate('fecha_venta', tzinfo=ZONA_RESUMEN))
+            .values('owner_id', 'antendido_por_id', 'dia')
+            .annotate(cantidad=Count('pk'), suma=Sum('total'))
+        )
+        for fila in por_venta:
+            filas[(fila['owner_id'], fila['antendido_por_id'], fila['dia'])] = ResumenVentaDiaria(
+                owner_id=fila['owner_id'], cajero_id=fila['antendido_por_id'], fecha=fila['dia'],
+                cantidad_ventas=fila['cantidad'], total=fila['suma'] or Decimal('0'),
+            )
+        por_detalle = (
+            detalles.order_by()
+            .annotate(dia=TruncDate('venta__fecha_venta', tzinfo=ZONA_RESUMEN))
+            .values('venta__owner_id', 'venta__antendido_por_id', 'dia')
+            .annotate(suma=Sum('subtotal'), costo=Sum(COSTO_DETALLE), ganancia=Sum(GANANCIA_DETALLE))
+        )
+        for fila in por_detalle:
+            resumen = filas.get((fila['venta__owner_id'], fila['venta__antendido_por_id'], fila['dia']))
+            if resumen is not None:
+                resumen.subtotal = fila['suma'] or Decimal('0')
+                resumen.costo = fila['costo'] or Decimal('0')
+                resumen.ganancia = fila['ganancia'] or Decimal('0')
+
+        anteriores.delete()
+        ResumenVentaDiaria.objects.bulk_create(filas.values(), batch_size=1000)
+    return len(filas)
@@ -1,3 +1,404 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+
+from inventario.models import Producto
+from .models import Caja, Venta
+
+
+class ProcesarVentaIdempotenteTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+        Caja.objects.create(usuario_apertura=self.user, monto_inicial=Decimal('0.00'))
+        Producto.objects.create(id_producto='A1', user=self.user, nombre='Arroz',
+                                precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=10)
+        self.client.force_login(self.user)
+        self.url = reverse('ventas:procesar_venta_ajax')
+
+    def _cobrar(self, clave):
+        payload = {
+            'carrito': [{'id': 'A1', 'cantidad': 2, 'precio': '1.50'}],
+            'total': '3.00',
+            'clave_idempotencia': clave,
+        }
+        return self.client.post(self.url, json.dumps(payload), content_type='application/json')
+
+    def test_reintento_devuelve_la_venta_original(self):
+        primera = self._cobrar('clave-1').json()
+        segunda = self._cobrar('clave-1').json()
+        self.assertTrue(segunda['success'])
+        self.assertTrue(segunda['duplicada'])
+        self.assertEqual(primera['venta_id'], segunda['venta_id'])
+        self.assertEqual(Venta.objects.count(), 1)
+        self.assertEqual(Producto.objects.get(pk='A1').cantidad, 8)
+
+    def test_claves_distintas_registran_ventas_distintas(self):
+        self._cobrar('clave-1')
+        self._cobrar('clave-2')
+        self.assertEqual(Venta.objects.count(), 2)
+        self.assertEqual(Producto.objects.get(pk='A1').cantidad, 6)
+
+    def test_stock_insuficiente_tiene_codigo_propio(self):
+        Producto.objects.filter(pk='A1').update(cantidad=1)
+        resp = self._cobrar('clave-1')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()['codigo'], 'stock_insuficiente')
+        Caja.objects.update(abierta=False)
+        self.assertNotIn('codigo', self._cobrar('clave-2').json())
+
+
+class SincronizarVentasOfflineTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+        Caja.objects.create(usuario_apertura=self.user, monto_inicial=Decimal('0.00'))
+        Producto.objects.create(id_producto='A1', user=self.user, nombre='Arroz',
+                                precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=3)
+        self.client.force_login(self.user)
+        self.url = reverse('ventas:sincronizar_ventas_offline')
+
+    def _venta(self, clave, cantidad):
+        return {
+            'clave_idempotencia': clave,
+            'carrito': [{'id': 'A1', 'cantidad': cantidad, 'precio': '1.50'}],
+            'total': str(Decimal('1.50') * cantidad),
+        }
+
+    def test_resultados_por_venta_y_conflictos(self):
+        ventas = [self._venta('v1', 2), self._venta('v2', 2), self._venta('v1', 2), self._venta('v3', 1)]
+        resp = self.client.post(self.url, json.dumps({'ventas': ventas}), content_type='application/json')
+        estados = [r['estado'] for r in resp.json()['resultados']]
+        self.assertEqual(estados, ['registrada', 'conflicto', 'duplicada', 'registrada'])
+        self.assertEqual(Venta.objects.count(), 2)
+        self.assertEqual(Producto.objects.get(pk='A1').cantidad, 0)
+
+    def test_reenviar_la_cola_no_duplica(self):
+        ventas = [self._venta('v1', 1)]
+        self.client.post(self.url, json.dumps({'ventas': ventas}), content_type='application/json')
+        resp = self.client.post(self.url, json.dumps({'ventas': ventas}), content_type='application/json')
+        self.assertEqual(resp.json()['resultados'][0]['estado'], 'duplicada')
+        self.assertEqual(Venta.objects.count(), 1)
+
+    def test_claves_invalidas_o_de_otro_cajero(self):
+        otro = User.objects.create_user(username='otro', password='x')
+        Venta.objects.create(owner=otro, antendido_por=otro, total=Decimal('1.50'), clave_idempotencia='ajena')
+        ventas = [self._venta(['v1'], 1), self._venta({'k': 1}, 1), self._venta('', 1),
+                  self._venta('x' * 65, 1), self._venta('ajena', 1), self._venta('v1', 1)]
+        resp = self.client.post(self.url, json.dumps({'ventas': ventas}), content_type='application/json')
+        resultados = resp.json()['resultados']
+        self.assertEqual([r['estado'] for r in resultados],
+                         ['error', 'error', 'error', 'error', 'duplicada', 'registrada'])
+        self.assertIsNone(resultados[4]['venta_id'])
+        self.assertEqual(Venta.objects.filter(antendido_por=self.user).count(), 1)
+
+    def test_conserva_la_fecha_offline_dentro_del_turno(self):
+        from django.utils import timezone
+        from ventas.models import ResumenVentaDiaria
+
+        ahora = timezone.now()
+        Caja.objects.update(fecha_apertura=ahora - timedelta(days=2))
+        ayer = ahora - timedelta(days=1)
+        ventas = [
+            dict(self._venta('v1', 1), fecha_offline=ayer.isoformat()),
+            dict(self._venta('v2', 1), fecha_offline=(ahora + timedelta(hours=1)).isoformat()),
+            dict(self._venta('v3', 1), fecha_offline=(ahora - timedelta(days=3)).isoformat()),
+            dict(self._venta('v4', 1), fecha_offline='ayer'),
+            'no es una venta',
+        ]
+        resp = self.client.post(self.url, json.dumps({'ventas': ventas}), content_type='application/json')
+        self.assertEqual([r['estado'] for r in resp.json()['resultados']],
+                         ['registrada', 'error', 'error', 'error', 'error'])
+        venta = Venta.objects.get()
+        self.assertEqual(venta.fecha_venta, ayer)
+        self.assertEqual(ResumenVentaDiaria.objects.get().fecha, timezone.localdate(ayer))
+
+    def test_no_sincroniza_en_una_caja_cerrada(self):
+        Caja.objects.update(abierta=False)
+        resp = self.client.post(self.url, json.dumps({'ventas': [self._venta('v1', 1)]}),
+                                content_type='application/json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Venta.objects.exists())
+
+
+class ReservaStockTestCase(TestCase):
+    def setUp(self):
+        self.cajero_a = User.objects.create_user(username='cajero_a', password='x')
+        self.cajero_b = User.objects.create_user(username='cajero_b', password='x')
+        Producto.objects.create(id_producto='A1', user=self.cajero_a, nombre='Arroz',
+                                precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=3)
+
+    def _reservar(self, cajero, cantidad):
+        self.client.force_login(cajero)
+        return self.client.post(reverse('ventas:reservar_stock_ajax'),
+                                json.dumps({'producto_id': 'A1', 'cantidad': cantidad}),
+                                content_type='application/json').json()
+
+    def _stock_en_busqueda(self, cajero):
+        self.client.force_login(cajero)
+        resp = self.client.get(reverse('ventas:buscar_productos_vivo'), {'q': 'Arroz'},
+                               HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+        return resp[0]['stock'] if resp else 0
+
+    def test_reserva_descuenta_stock_para_otros_cajeros(self):
+        self.assertTrue(self._reservar(self.cajero_a, 2)['success'])
+        self.assertEqual(self._stock_en_busqueda(self.cajero_a), 3)
+        self.assertEqual(self._stock_en_busqueda(self.cajero_b), 1)
+
+        respuesta = self._reservar(self.cajero_b, 2)
+        self.assertFalse(respuesta['success'])
+        self.assertEqual(respuesta['reservado'], 1)
+        self.assertEqual(self._stock_en_busqueda(self.cajero_a), 2)
+
+    def test_reservas_vencidas_no_cuentan_y_se_barren(self):
+        from django.utils import timezone
+        from inventario.models import ReservaStock
+        from inventario.services import limpiar_reservas_vencidas
+
+        self._reservar(self.cajero_a, 3)
+        ReservaStock.objects.update(expira=timezone.now())
+        self.assertEqual(self._stock_en_busqueda(self.cajero_b), 3)
+        self.assertEqual(limpiar_reservas_vencidas(), 1)
+
+
+class DesgloseIvaVentaTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+        Caja.objects.create(usuario_apertura=self.user, monto_inicial=Decimal('0.00'))
+        for pk, tarifa in [('A15', '15'), ('B5', '5'), ('C0', '0'), ('D_NO', 'NO_OBJETO')]:
+            Producto.objects.create(id_producto=pk, user=self.user, nombre=pk, tarifa_iva=tarifa,
+                                    precio_costo=Decimal('1.00'), precio_venta=Decimal('3.33'), cantidad=10)
+        self.client.force_login(self.user)
+
+    def _cobrar(self, carrito, clave):
+        payload = {'carrito': carrito, 'total': '0.00', 'clave_idempotencia': clave}
+        resp = self.client.post(reverse('ventas:procesar_venta_ajax'), json.dumps(payload),
+                                content_type='application/json')
+        return Venta.objects.get(pk=resp.json()['venta_id'])
+
+    def test_impuestos_por_linea_y_por_tarifa(self):
+        carrito = [{'id': pk, 'cantidad': 3, 'precio': '3.33'} for pk in ('A15', 'B5', 'C0', 'D_NO')]
+        venta = self._cobrar(carrito, 'iva-1')
+        self.assertEqual(venta.base_iva_15, Decimal('9.99'))
+        self.assertEqual(venta.iva_15, Decimal('1.50'))
+        self.assertEqual(venta.iva_5, Decimal('0.50'))
+        self.assertEqual(venta.base_no_objeto, Decimal('9.99'))
+        self.assertEqual(venta.subtotal_sin_impuestos, Decimal('39.96'))
+        self.assertEqual(venta.iva_total, Decimal('2.00'))
+        self.assertEqual([t for t, *_ in venta.desglose_iva], ['15', '5', '0', 'NO_OBJETO'])
+        detalle = venta.detalles.get(producto_id='B5')
+        self.assertEqual((detalle.tarifa_iva, detalle.valor_iva), ('5', Decimal('0.50')))
+
+    def test_ticket_no_consulta_por_linea(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        corta = self._cobrar([{'id': 'A15', 'cantidad': 1, 'precio': '3.33'}], 'iva-2')
+        larga = self._cobrar([{'id': pk, 'cantidad': 1, 'precio': '3.33'} for pk in ('A15', 'B5', 'C0', 'D_NO')], 'iva-3')
+        consultas = []
+        for venta in (corta, larga):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse('ventas:generar_ticket', args=[venta.pk]))
+            consultas.append(len(ctx))
+        self.assertEqual(consultas[0], consultas[1])
+
+
+class BuscarPorCodigoTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.create(id_producto='BTP001', user=self.user, nombre='Botella',
+                                    precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=3)
+        self.client.force_login(self.user)
+
+    def _escanear(self, codigo):
+        return self.client.post(reverse('ventas:buscar_codigo_ajax'), json.dumps({'codigo_busqueda': codigo}),
+                                content_type='application/json', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_codigo_con_prefijo_y_sufijo_del_lector(self):
+        self.assertEqual(self._escanear('*BTP001*01').json()['id_producto'], 'BTP001')
+
+    def test_productos_nuevos_y_eliminados_actualizan_el_automata(self):
+        self._escanear('*BTP001*')  # Construye el autómata
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.create(id_producto='LATA-77', user=self.user, nombre='Lata',
+                                    precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=3)
+            Producto.objects.filter(pk='BTP001').first().delete()
+        self.assertEqual(self._escanear('#LATA-77#').json()['id_producto'], 'LATA-77')
+        self.assertEqual(self._escanear('*BTP001*').status_code, 404)
+
+
+class CatalogoPosTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+        for pk, nombre in [('A1', 'Arroz'), ('B2', 'Azúcar')]:
+            Producto.objects.create(id_producto=pk, user=self.user, nombre=nombre,
+                                    precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=5)
+        self.client.force_login(self.user)
+        self.url = reverse('ventas:catalogo_pos')
+
+    def test_snapshot_etag_y_delta(self):
+        resp = self.client.get(self.url)
+        datos = resp.json()
+        self.assertTrue(datos['completo'])
+        self.assertEqual([p[0] for p in datos['productos']], ['A1', 'B2'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 304)
+
+        # La delta trae exactamente lo cambiado después de la versión pedida
+        version = self.client.get(self.url).json()['version']
+        self.assertEqual(self.client.get(self.url, {'desde': version}).json()['productos'], [])
+        from inventario.services import reponer_stock
+        reponer_stock({'A1': 2})
+        Producto.objects.get(pk='B2').delete()
+        delta = self.client.get(self.url, {'desde': version}).json()
+        self.assertFalse(delta['completo'])
+        self.assertEqual(delta['productos'], [['A1', 'Arroz', 1.5, '15', 7]])
+        self.assertEqual(delta['bajas'], ['B2'])
+        self.assertEqual(delta['version'], version + 2)
+
+
+class CacheBusquedaTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='cajero', password='x')
+        Producto.objects.create(id_producto='C1', user=self.user, nombre='Coca Cola',
+                                precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=5)
+        self.client.force_login(self.user)
+
+    def _buscar(self, q):
+        resp = self.client.get(reverse('ventas:buscar_productos_vivo'), {'q': q},
+                               HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return [(p['id'], p['stock']) for p in resp.json()]
+
+    def test_aciertos_stock_fresco_e_invalidacion(self):
+        from inventario.services import reponer_stock
+        from possitema.cache_busqueda import estadisticas_cache_busqueda
+
+        self.assertEqual(self._buscar('coca'), [('C1', 5)])
+        # Un cambio de stock se ve sin invalidar la caché
+        reponer_stock({'C1': 2})
+        self.assertEqual(self._buscar('Coca '), [('C1', 7)])
+        self.assertEqual(estadisticas_cache_busqueda()['productos']['aciertos'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.create(id_producto='C3', user=self.user, nombre='Coca Zero',
+                                    precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=1)
+        self.assertEqual(self._buscar('coca'), [('C1', 7), ('C3', 1)])
+        self.assertEqual(estadisticas_cache_busqueda()['productos']['fallos'], 2)
+
+    def test_agotados_no_ocultan_productos_con_stock(self):
+        Producto.objects.bulk_create(
+            Producto(id_producto=f'L{i:02d}', user=self.user, nombre=f'Leche {i:02d}', busqueda=f'leche {i:02d}',
+                     precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=0 if i < 50 else 3)
+            for i in range(60)
+        )
+        # La entrada sin filtrar (la de inventario) no debe reutilizarse
+        from inventario.services import buscar_productos_cacheado
+        self.assertEqual(len(buscar_productos_cacheado('leche', None)), 50)
+
+        self.assertEqual(len(self._buscar('leche')), 10)
+        resp = self.client.get(reverse('ventas:buscar_nombre_ajax'), {'q': 'leche'},
+                               HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(len(resp.json()), 10)
+
+
+class ConsultasApiPosTestCase(TestCase):
+    """Consultas por endpoint del POS: 2 de sesión/usuario más las propias."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from cliente.models import Cliente
+        from inventario.models import Categoria
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='cajero', password='x')
+        categoria = Categoria.objects.create(nombre='Granos')
+        for i in range(12):
+            Producto.objects.create(id_producto=f'AR{i}', user=self.user, nombre=f'Arroz {i}',
+                                    categoria=categoria if i % 2 else None, precio_costo=Decimal('1.00'),
+                                    precio_venta=Decimal('2.50'), cantidad=3)
+        for i in range(5):
+            Cliente.objects.create(id_cliente=f'09{i}', user=self.user, nombre='Ana', apellido=f'Pérez {i}',
+                                   email=f'ana{i}@example.com', telefono='0999999999')
+        self.client.force_login(self.user)
+
+    def _get(self, nombre, q):
+        return self.client.get(reverse(nombre), {'q': q}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_busquedas_de_productos(self):
+        # Fallo de caché: búsqueda de claves + lectura de la página
+        with self.assertNumQueries(4):
+            datos = self._get('ventas:buscar_productos_vivo', 'arroz').json()
+        self.assertEqual(len(datos), 10)
+        self.assertEqual(datos[1], {'id': 'AR1', 'id_producto': 'AR1', 'nombre': 'Arroz 1', 'precio': 2.5,
+                                    'stock': 3, 'categoria': 'Granos', 'tarifa_iva': '15'})
+        self.assertEqual(datos[0]['categoria'], 'Sin categoría')
+        # Acierto de caché: solo la lectura
+        with self.assertNumQueries(3):
+            datos = self._get('ventas:buscar_nombre_ajax', 'arroz').json()
+        self.assertEqual(datos[0], {'id': 'AR0', 'nombre': 'Arroz 0', 'precio_venta': 2.5, 'stock': 3,
+                                    'tarifa_iva': '15'})
+
+    def test_busqueda_de_clientes(self):
+        with self.assertNumQueries(4):
+            datos = self._get('ventas:buscar_clientes_vivo', 'ana').json()
+        self.assertTrue(datos[0]['is_default'])
+        self.assertEqual(len(datos), 6)
+        self.assertEqual(datos[1]['nombre'], 'Ana Pérez 0')
+
+    def test_busqueda_por_codigo(self):
+        with self.assertNumQueries(3):
+            resp = self.client.post(reverse('ventas:buscar_codigo_ajax'), json.dumps({'codigo_busqueda': 'AR3'}),
+                                    content_type='application/json', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(resp.json(), {'success': True, 'id': 'AR3', 'id_producto': 'AR3', 'nombre': 'Arroz 3',
+                                       'precio': 2.5, 'stock': 3, 'categoria': 'Granos'})
+
+    def test_respuestas_grandes_comprimidas(self):
+        resp = self.client.get(reverse('ventas:buscar_productos_vivo'), {'q': 'arroz'},
+                               HTTP_X_REQUESTED_WITH='XMLHttpRequest', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+
+
+class ResumenVentaDiariaTestCase(TestCase):
+    def setUp(self):
+        from possitema.services import registrar_venta_completa
+
+        self.user = User.objects.create_superuser(username='dueno', password='x')
+        Producto.objects.create(id_producto='A1', user=self.user, nombre='Arroz',
+                                precio_costo=Decimal('1.00'), precio_venta=Decimal('1.50'), cantidad=10)
+        carrito = [{'id': 'A1', 'cantidad': 2, 'precio': '1.50'}]
+        self.ventas = [registrar_venta_completa(self.user, carrito, Decimal('3.00')) for _ in range(2)]
+
+    def _resumen(self):
+        from .services import resumen_ventas
+
+        return resumen_ventas(owner=self.user)
+
+    def test_ventas_y_anulacion_actualizan_el_resumen(self):
+        resumen = self._resumen()
+        self.assertEqual(resumen['cantidad_ventas'], 2)
+        self.assertEqual(resumen['total'], Decimal('6.00'))
+        self.assertEqual(resumen['ganancia'], Decimal('2.00'))
+
+        self.client.force_login(self.user)
+        self.client.post(reverse('ventas:anular_venta', args=[self.ventas[0].pk]))
+        resumen = self._resumen()
+        self.assertEqual(resumen['cantidad_ventas'], 1)
+        self.assertEqual(resumen['total'], Decimal('3.00'))
+        self.assertEqual(resumen['costo'], Decimal('2.00'))
+
+    def test_reconstruir_agrupa_por_fecha_local(self):
+        from datetime import datetime, timezone as tz
+        from .models import ResumenVentaDiaria
+        from .services import reconstruir_resumen
 
-# Create your tests here.
+        # 02:00 UTC del día 2 son las 21:00 del día 1 en Guayaquil
+        Venta.objects.filter(pk=self.ventas[1].pk).update(fecha_venta=datetime(2026, 3, 2, 2, 0, tzinfo=tz.utc))
+        reconstruir_resumen()
+        self.assertEqual(self._resumen()['total'], Decimal('6.00'))
+        fila = ResumenVentaDiaria.objects.get(fecha__lt=self.ventas[0].fecha_venta.date())
+        self.assertEqual(str(fila.fecha), '2026-03-01')
+        self.assertEqual(fila.ganancia, Decimal('1.00'))
@@ -18,8 +18,13 @@ urlpatterns = [
     path('buscar_nombre/', views.buscar_por_nombre_ajax, name='buscar_nombre_ajax'),
     path('buscar_codigo/', views.buscar_por_codigo_ajax, name='buscar_codigo_ajax'),
     path('buscar_productos_vivo/', views.buscar_productos_vivo, name='buscar_productos_vivo'),
+    path('catalogo/', views.catalogo_pos_ajax, name='catalogo_pos'),
     path('buscar_clientes_vivo/', views.buscar_clientes_vivo, name='buscar_clientes_vivo'),
     path('procesar_venta/', views.procesar_venta_ajax, name='procesar_venta_ajax'),
+    path('sincronizar_offline/', views.sincronizar_ventas_offline, name='sincronizar_ventas_offline'),
+    path('anular/<int:pk>/', views.anular_venta, name='anular_venta'),
+    path('reservar_stock/', views.reservar_stock_ajax, name='reservar_stock_ajax'),
+    path('liberar_reservas/', views.liberar_reservas_ajax, name='liberar_reservas_ajax'),
     
     # RUTAS DE CAJA
     path('apertura_caja/', views.apertura_caja, name='apertura_caja'),
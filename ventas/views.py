@@ -1,5 +1,6 @@
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET, require_POST
 from django.views.decorators.csrf import csrf_exempt
 from .models import Venta
 # AJAX: Cambiar estado subido_sri_manual
@@ -16,18 +17,26 @@ def toggle_subido_sri_manual(request):
         return JsonResponse({'success': False, 'error': 'Venta no encontrada'})
 # ventas/views.py
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib import messages
 from django.utils import timezone
-from .models import Caja, Venta, DetalleVenta 
+from .models import Caja, Venta, DetalleVenta, GANANCIA_DETALLE
 from datetime import date
 from decimal import Decimal
-from django.db.models import Sum, F
-from django.db.models.functions import TruncDay
+from django.db.models import CharField, Sum, Value
+from django.db.models.functions import Coalesce, Concat, TruncDay
+from inventario.codigos_barras import buscar_producto_en_codigo
 from inventario.models import Producto
+from inventario.services import (
+    STOCK_ACTUAL, StockInsuficienteError, anotar_stock_disponible, buscar_productos_cacheado, catalogo_pos,
+    liberar_reservas, propietario_catalogo, registrar_movimientos, reponer_stock, reservar_stock,
+    version_catalogo,
+)
 from datetime import date, timedelta
 from .decorators import permission_required_message
+from possitema.respuestas_json import RespuestaJSON, filas
+from .services import acumular_venta
 from django.db import transaction
 import logging
 
@@ -59,11 +68,11 @@ def historial_ventas(request):
     """
     Muestra el listado de todas las ventas registradas con paginación y búsqueda.
     """
-    from django.core.paginator import Paginator
     from django.db.models import Q
+    from possitema.paginacion import paginar_por_cursor
     
-    # Obtener todas las ventas ordenadas por fecha descendente
-    ventas_list = Venta.objects.filter(owner=request.user).order_by('-fecha_venta')
+    # Ventas del dueño; el orden (fecha, pk) lo pone la paginación por cursor
+    ventas_list = Venta.objects.filter(owner=request.user).select_related('cliente', 'antendido_por')
     
     # Motor de búsqueda
     query = request.GET.get('q', '').strip()
@@ -85,27 +94,20 @@ def historial_ventas(request):
         ventas_list = ventas_list.filter(fecha_venta__date__lte=fecha_hasta)
     
     # Obtener items por página del GET, por defecto 10
-    per_page = int(request.GET.get('per_page', 10))
-    
-    # Configurar paginación
-    paginator = Paginator(ventas_list, per_page)
-    page_number = request.GET.get('page')
-    ventas = paginator.get_page(page_number)
+    try:
+        per_page = int(request.GET.get('per_page', 10))
+    except ValueError:
+        per_page = 10
     
-    # Construir query string sin 'page' para paginación
-    query_params = request.GET.copy()
-    if 'page' in query_params:
-        del query_params['page']
-    query_string = query_params.urlencode()
+    # Paginación por cursor: la página N cuesta lo mismo que la primera
+    ventas = paginar_por_cursor(ventas_list, request, 'fecha_venta', per_page)
     
     context = {
         'ventas': ventas,
-        'paginator': paginator,
-        'page_range': list(paginator.page_range),
         'query': query,
         'fecha_desde': fecha_desde,
         'fecha_hasta': fecha_hasta,
-        'query_string': query_string,
+        'query_string': ventas.query_string,
     } 
     # El template 'historial_ventas.html' necesita la lista 'ventas'
     return render(request, 'ventas/historial_ventas.html', context)
@@ -244,32 +246,64 @@ def imprimir_ticket(request, pk):
     return HttpResponse(f"<h1>Ticket de Venta #{pk}</h1><p>Esta vista generará el ticket de impresión en formato PDF o HTML.</p>")
 
 # --- VISTAS AJAX (JSON) PARA EL POS (nueva_venta) ---
+# Esquemas de respuesta: (clave en el JSON, campo del queryset). Los nombres
+# de las claves son los que espera el JavaScript de nueva_venta.
+
+CATEGORIA_O_DEFECTO = Coalesce('categoria__nombre', Value('Sin categoría'))
+
+ESQUEMA_PRODUCTO_NOMBRE = (
+    ('id', 'id_producto'),
+    ('nombre', 'nombre'),
+    ('precio_venta', 'precio_venta'),
+    ('stock', 'stock_actual'),
+    ('tarifa_iva', 'tarifa_iva'),
+)
+ESQUEMA_PRODUCTO_VIVO = (
+    ('id', 'id_producto'),
+    ('id_producto', 'id_producto'),
+    ('nombre', 'nombre'),
+    ('precio', 'precio_venta'),
+    ('stock', 'disponible'),
+    ('categoria', CATEGORIA_O_DEFECTO),
+    ('tarifa_iva', 'tarifa_iva'),
+)
+ESQUEMA_PRODUCTO_CODIGO = (
+    ('id', 'id_producto'),
+    ('id_producto', 'id_producto'),
+    ('nombre', 'nombre'),
+    ('precio', 'precio_venta'),
+    ('stock', STOCK_ACTUAL),
+    ('categoria', CATEGORIA_O_DEFECTO),
+)
+ESQUEMA_CLIENTE_VIVO = (
+    ('id', 'id_cliente'),
+    ('nombre', Concat('nombre', Value(' '), 'apellido', output_field=CharField())),
+    ('email', 'email'),
+    ('telefono', 'telefono'),
+    ('is_default', Value(False)),
+)
+CONSUMIDOR_FINAL = {'id': '', 'nombre': 'Consumidor Final', 'email': '', 'telefono': '', 'is_default': True}
+
 
 @login_required
+@gzip_page
 def buscar_por_nombre_ajax(request):
     """Busca productos por nombre (usado en la vista 'nueva_venta')."""
     if request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.method == 'GET':
         query = request.GET.get('q', '')
         if query:
-            productos = Producto.objects.filter(
-                nombre__icontains=query,
-                cantidad__gt=0
+            # Los cajeros buscan en el catálogo compartido (propietario None)
+            productos = buscar_productos_cacheado(
+                query, None, Producto.objects.annotate(stock_actual=STOCK_ACTUAL).filter(stock_actual__gt=0),
+                con_stock=True,
             )[:10]
-            data = [
-                {
-                    'id': p.id_producto,
-                    'nombre': p.nombre,
-                    'precio_venta': float(p.precio_venta),
-                    'stock': p.cantidad,
-                    'tarifa_iva': p.tarifa_iva if hasattr(p, 'tarifa_iva') else 15
-                }
-                for p in productos
-            ]
+            data = filas(productos, ESQUEMA_PRODUCTO_NOMBRE)
         else:
             data = []
-        return JsonResponse(data, safe=False)
+        return RespuestaJSON(data)
     return JsonResponse({'error': 'Método no permitido'}, status=400)
 @login_required
+@gzip_page
 def buscar_clientes_vivo(request):
     """Búsqueda en vivo de clientes mientras el usuario escribe."""
     if request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.method == 'GET':
@@ -277,50 +311,16 @@ def buscar_clientes_vivo(request):
         
         if len(query) < 1:
             # Retornar opción de consumidor final si no hay búsqueda
-            return JsonResponse([
-                {
-                    'id': '',
-                    'nombre': 'Consumidor Final',
-                    'email': '',
-                    'telefono': '',
-                    'is_default': True
-                }
-            ], safe=False)
+            return RespuestaJSON([CONSUMIDOR_FINAL])
         
         try:
-            from django.db.models import Q
-            from cliente.models import Cliente
-            
-            # Buscar por nombre, email, teléfono o ID
-            clientes = Cliente.objects.filter(
-                Q(nombre__icontains=query) | 
-                Q(apellido__icontains=query) | 
-                Q(email__icontains=query) | 
-                Q(telefono__icontains=query) |
-                Q(id_cliente__icontains=query)
-            )[:15]  # Limitar a 15 resultados
+            from cliente.services import buscar_clientes_cacheado
             
-            data = [
-                {
-                    'id': str(p.id_cliente),
-                    'nombre': f"{p.nombre} {p.apellido}",
-                    'email': p.email,
-                    'telefono': p.telefono,
-                    'is_default': False
-                }
-                for p in clientes
-            ]
+            # Cédula/RUC o teléfono exactos primero; si no, texto normalizado
+            clientes = buscar_clientes_cacheado(query, request.user.pk)[:15]
             
-            # Agregar opción de consumidor final al inicio
-            data.insert(0, {
-                'id': '',
-                'nombre': 'Consumidor Final',
-                'email': '',
-                'telefono': '',
-                'is_default': True
-            })
-            
-            return JsonResponse(data, safe=False)
+            # Opción de consumidor final al inicio
+            return RespuestaJSON([CONSUMIDOR_FINAL] + filas(clientes, ESQUEMA_CLIENTE_VIVO))
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     
@@ -328,35 +328,24 @@ def buscar_clientes_vivo(request):
 
 
 @login_required
+@gzip_page
 def buscar_productos_vivo(request):
     """Búsqueda en vivo de productos mientras el usuario escribe."""
     if request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.method == 'GET':
         query = request.GET.get('q', '').strip()
         
         if len(query) < 1:
-            return JsonResponse([], safe=False)
+            return RespuestaJSON([])
         
         try:
-            from django.db.models import Q
-            # Buscar por id_producto o nombre
-            productos = Producto.objects.filter(
-                Q(id_producto__icontains=query) | Q(nombre__icontains=query),
-                cantidad__gt=0  # Solo mostrar productos con stock
-            )[:10]  # Limitar a 10 resultados
+            # Buscar por id_producto o nombre; el stock reportado descuenta
+            # lo reservado en los carritos de otros cajeros
+            productos = anotar_stock_disponible(
+                buscar_productos_cacheado(query, None, Producto.objects.all(), con_stock=True),
+                request.user,
+            ).filter(disponible__gt=0)[:10]  # Solo con stock disponible, máximo 10 resultados
             
-            data = [
-                {
-                    'id': p.id_producto,
-                    'id_producto': p.id_producto,
-                    'nombre': p.nombre,
-                    'precio': float(p.precio_venta),
-                    'stock': p.cantidad,
-                    'categoria': p.categoria.nombre if p.categoria else 'Sin categoría',
-                    'tarifa_iva': p.tarifa_iva if hasattr(p, 'tarifa_iva') else 15
-                }
-                for p in productos
-            ]
-            return JsonResponse(data, safe=False)
+            return RespuestaJSON(filas(productos, ESQUEMA_PRODUCTO_VIVO))
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     
@@ -364,6 +353,38 @@ def buscar_productos_vivo(request):
 
 
 @login_required
+@gzip_page
+@require_GET
+def catalogo_pos_ajax(request):
+    """
+    Catálogo de productos activos para la búsqueda local del POS.
+
+    Sin parámetros devuelve el catálogo completo; con `?desde=<version>` solo
+    los cambios posteriores. El ETag es la versión del catálogo, así que una
+    consulta sin cambios se resuelve con 304 sin leer productos.
+    """
+    propietario_id = propietario_catalogo(request.user)
+    desde = request.GET.get('desde', '').strip()
+    try:
+        desde = int(desde) if desde else None
+    except ValueError:
+        return JsonResponse({'error': 'Versión inválida'}, status=400)
+
+    version = version_catalogo(propietario_id)
+    etag = f'"{propietario_id}-{version}-{desde}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        respuesta = HttpResponseNotModified()
+    else:
+        datos = catalogo_pos(propietario_id, desde)
+        datos['version'] = version
+        respuesta = RespuestaJSON(datos)
+    respuesta['ETag'] = etag
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
+@login_required
+@gzip_page
 def buscar_por_codigo_ajax(request):
     """Busca un producto por código de barras (id_producto) o nombre."""
     if request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.method == 'POST':
@@ -378,41 +399,31 @@ def buscar_por_codigo_ajax(request):
             # Buscar por id_producto (código) o por nombre.
             # Intentamos varias estrategias para ser tolerantes con formatos
             from django.db.models import Q
-            producto = Producto.objects.filter(
+            encontrados = filas(Producto.objects.filter(
                 Q(id_producto__iexact=codigo) | Q(id_producto__icontains=codigo) | Q(nombre__icontains=codigo)
-            ).first()
+            ).order_by('pk')[:1], ESQUEMA_PRODUCTO_CODIGO)
 
             # Si no se encontró, intentar un fallback: buscar productos cuyo
             # `id_producto` esté contenido dentro del código escaneado. Esto
             # es útil cuando el lector devuelve un string mayor que el id
             # almacenado (prefijos/sufijos añadidos por el lector o etiqueta).
-            if not producto:
+            # El autómata de códigos del propietario recorre el texto una vez
+            # en lugar de leer todo el catálogo.
+            if not encontrados:
                 try:
-                    # Recolectar candidatos pequeños y comprobar si su id aparece en el código
-                    candidatos = Producto.objects.values_list('id_producto', flat=True)
-                    for pid in candidatos:
-                        if pid and pid in codigo:
-                            producto = Producto.objects.filter(id_producto=pid).first()
-                            if producto:
-                                break
+                    producto = buscar_producto_en_codigo(codigo, propietario_catalogo(request.user))
                 except Exception:
                     # Si algo falla en el fallback, ignorar y continuar
+                    logger.exception("Error buscando códigos dentro de %r", codigo)
                     producto = None
+                if producto:
+                    encontrados = filas(Producto.objects.filter(pk=producto.pk), ESQUEMA_PRODUCTO_CODIGO)
             
-            if not producto:
+            if not encontrados:
                 return JsonResponse({'success': False, 'message': 'Producto no encontrado'}, status=404)
             
             # Retornar los datos del producto
-            data = {
-                'success': True,
-                'id': producto.id_producto,
-                'id_producto': producto.id_producto,
-                'nombre': producto.nombre,
-                'precio': float(producto.precio_venta),
-                'stock': producto.cantidad,
-                'categoria': producto.categoria.nombre if producto.categoria else 'Sin categoría'
-            }
-            return JsonResponse(data, safe=False)
+            return RespuestaJSON({'success': True, **encontrados[0]})
             
         except json.JSONDecodeError:
             return JsonResponse({'success': False, 'message': 'Formato JSON inválido'}, status=400)
@@ -421,24 +432,79 @@ def buscar_por_codigo_ajax(request):
     
     return JsonResponse({'success': False, 'message': 'Método no permitido'}, status=400)
 
+@login_required
+@require_POST
+def reservar_stock_ajax(request):
+    """
+    Aparta stock para el carrito del cajero. Recibe la cantidad total del
+    producto en el carrito (0 para liberarlo) y responde cuánto se reservó.
+    """
+    import json
+    try:
+        data = json.loads(request.body)
+        producto_id = str(data.get('producto_id', '')).strip()
+        cantidad = int(data.get('cantidad', 0))
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return JsonResponse({'success': False, 'message': 'Datos inválidos'}, status=400)
+    if not producto_id:
+        return JsonResponse({'success': False, 'message': 'Producto no indicado'}, status=400)
+
+    try:
+        reservado, disponible = reservar_stock(request.user, producto_id, cantidad)
+    except Producto.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Producto no encontrado'}, status=404)
+    return JsonResponse({
+        'success': reservado >= cantidad,
+        'reservado': reservado,
+        'disponible': disponible,
+    })
+
+
+@login_required
+@require_POST
+def liberar_reservas_ajax(request):
+    """Libera todas las reservas del cajero (carrito cancelado)."""
+    liberadas = liberar_reservas(request.user)
+    return JsonResponse({'success': True, 'liberadas': liberadas})
+
+
+def _obtener_clave_idempotencia(request, json_data):
+    """Lee la clave de idempotencia enviada por el POS (cuerpo JSON o cabecera)."""
+    clave = json_data.get('clave_idempotencia') or request.headers.get('X-Idempotency-Key') or ''
+    return str(clave).strip()[:64] or None
+
+
+def _respuesta_venta_duplicada(venta):
+    """Respuesta para un reintento cuya venta ya fue registrada."""
+    return JsonResponse({
+        'success': True,
+        'venta_id': venta.id_venta,
+        'mensaje': 'Venta ya registrada previamente.',
+        'es_credito': venta.es_credito,
+        'duplicada': True,
+    }, status=200)
+
+
+# Código de error de procesar_venta_ajax cuando el stock no alcanza
+ERROR_STOCK_INSUFICIENTE = 'stock_insuficiente'
+
+
 @login_required
 def procesar_venta_ajax(request):
-    """Recibe la lista de productos y la información de pago para registrar la venta."""
+    """
+    Recibe la lista de productos y la información de pago para registrar la venta.
+
+    Si el POS envía una `clave_idempotencia`, un reintento de la misma venta
+    devuelve el `venta_id` original sin volver a bloquear ni descontar stock.
+    """
     if request.method == 'POST':
         import json
         import logging
-        from possitema.services import registrar_venta_completa
+        from django.db import IntegrityError
+        from possitema.services import registrar_venta_completa, buscar_venta_idempotente
         
         try:
-            # 1. Verificar que hay una caja abierta
-            caja_activa = Caja.objects.filter(usuario_apertura=request.user, abierta=True).first()
-            if not caja_activa:
-                return JsonResponse({
-                    'success': False, 
-                    'error': 'No hay una caja abierta. Abre un turno antes de procesar ventas.'
-                }, status=400)
-            
-            # 2. Parsear datos del carrito
+            # 1. Parsear datos del carrito
             try:
                 json_data = json.loads(request.body)
             except json.JSONDecodeError:
@@ -446,6 +512,20 @@ def procesar_venta_ajax(request):
                     'success': False,
                     'error': 'Datos inválidos. El JSON no se pudo procesar.'
                 }, status=400)
+
+            # 2. Reintento de una venta ya registrada: responder sin escribir nada
+            clave_idempotencia = _obtener_clave_idempotencia(request, json_data)
+            venta_previa = buscar_venta_idempotente(request.user, clave_idempotencia)
+            if venta_previa:
+                return _respuesta_venta_duplicada(venta_previa)
+
+            # 3. Verificar que hay una caja abierta
+            caja_activa = Caja.objects.filter(usuario_apertura=request.user, abierta=True).first()
+            if not caja_activa:
+                return JsonResponse({
+                    'success': False, 
+                    'error': 'No hay una caja abierta. Abre un turno antes de procesar ventas.'
+                }, status=400)
                 
             carrito_data = json_data.get('carrito', [])
             total_venta = json_data.get('total', 0)
@@ -459,15 +539,30 @@ def procesar_venta_ajax(request):
                     'error': 'El carrito está vacío.'
                 }, status=400)
             
-            # 3. Llamar al servicio para registrar la venta completa
-            venta = registrar_venta_completa(
-                user=request.user,
-                carrito_data=carrito_data,
-                total_venta_calculado=total_venta,
-                cliente_id=cliente_id,
-                caja=caja_activa,
-                metodo_pago=metodo_pago,
-            )
+            # 4. Llamar al servicio para registrar la venta completa
+            try:
+                venta = registrar_venta_completa(
+                    user=request.user,
+                    carrito_data=carrito_data,
+                    total_venta_calculado=total_venta,
+                    cliente_id=cliente_id,
+                    caja=caja_activa,
+                    metodo_pago=metodo_pago,
+                    clave_idempotencia=clave_idempotencia,
+                )
+            except StockInsuficienteError as e:
+                # Rechazo esperado (otro cajero se llevó el stock), no un fallo
+                return JsonResponse({
+                    'success': False,
+                    'error': str(e),
+                    'codigo': ERROR_STOCK_INSUFICIENTE,
+                }, status=400)
+            except IntegrityError:
+                # Dos peticiones simultáneas con la misma clave: gana la primera
+                venta_previa = buscar_venta_idempotente(request.user, clave_idempotencia)
+                if venta_previa:
+                    return _respuesta_venta_duplicada(venta_previa)
+                raise
             
             return JsonResponse({
                 'success': True, 
@@ -486,6 +581,55 @@ def procesar_venta_ajax(request):
         
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
+MAX_VENTAS_SINCRONIZACION = 500
+
+
+@login_required
+def sincronizar_ventas_offline(request):
+    """
+    Recibe en una sola petición las ventas que el POS guardó sin conexión
+    y retorna el resultado de cada una (registrada, duplicada, conflicto o error).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+    import json
+    from possitema.services import sincronizar_ventas_offline as sincronizar
+
+    try:
+        json_data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Datos inválidos. El JSON no se pudo procesar.'
+        }, status=400)
+
+    ventas_data = json_data.get('ventas', [])
+    if not isinstance(ventas_data, list) or not ventas_data:
+        return JsonResponse({'success': False, 'error': 'No hay ventas para sincronizar.'}, status=400)
+    if len(ventas_data) > MAX_VENTAS_SINCRONIZACION:
+        return JsonResponse({
+            'success': False,
+            'error': f'Máximo {MAX_VENTAS_SINCRONIZACION} ventas por sincronización.'
+        }, status=400)
+
+    # Las ventas offline pertenecen al turno abierto del cajero; un turno ya
+    # cerrado no se modifica
+    caja = Caja.objects.filter(usuario_apertura=request.user, abierta=True).first()
+    if not caja:
+        return JsonResponse({
+            'success': False,
+            'error': 'No hay una caja abierta. Abre un turno antes de sincronizar ventas.'
+        }, status=400)
+
+    resultados = sincronizar(request.user, ventas_data, caja=caja)
+    return JsonResponse({
+        'success': True,
+        'resultados': resultados,
+        'registradas': sum(1 for r in resultados if r['estado'] == 'registrada'),
+        'conflictos': sum(1 for r in resultados if r['estado'] == 'conflicto'),
+    })
+
 def dashboard_view(request):
     fecha_limite = date.today() + timedelta(days=30)
     productos_proximo_vencer = Producto.objects.filter(
@@ -636,11 +780,11 @@ def ranking_productos(request):
         detalle_qs = DetalleVenta.objects.filter(venta__owner=request.user, venta__estado='ACT')
 
     reporte_base = detalle_qs.values(
-        'producto__nombre'
+        'producto_nombre'
     ).annotate(
         cantidad_vendida=Sum('cantidad'),
         ingresos_generados=Sum('subtotal'),
-        ganancia_total=Sum(F('subtotal') - (F('costo_al_vender') * F('cantidad')))
+        ganancia_total=Sum(GANANCIA_DETALLE)
     )
 
     # Ranking por cantidad vendida (volumen) - Top 10
@@ -669,66 +813,57 @@ def anular_venta(request, pk):
 
     if venta.estado != 'ACT':
         messages.warning(request, f"La Venta #{pk} ya está {venta.get_estado_display().lower()}.")
-        return redirect('ventas:detalle_venta', pk=pk)
+        return redirect('ventas:historial_ventas')
 
     if request.method == 'POST':
         try:
             # 🌟 TRANSACCIÓN ATÓMICA
             with transaction.atomic():
                 
-                # A. Devolver Stock
-                detalles = venta.detalles.select_related('producto')
-                for detalle in detalles:
-                    producto = detalle.producto
-                    if producto:
-                        producto.cantidad += detalle.cantidad
-                        producto.save()
+                # A. Devolver Stock (un solo UPDATE; respeta el stock fragmentado)
+                cantidades = {}
+                for producto_id, cantidad in venta.detalles.filter(producto__isnull=False).values_list('producto_id', 'cantidad'):
+                    cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+                reponer_stock(cantidades)
+                registrar_movimientos(cantidades, 'ANULACION', usuario=request.user, referencia=f"Anulación venta #{venta.pk}")
 
                 # B. Marcar la Venta como Anulada
                 venta.estado = 'ANU'
                 venta.anulado_por = request.user
                 venta.fecha_anulacion = timezone.now()
                 venta.save()
+
+                # C. Restar la venta del resumen diario
+                acumular_venta(venta, signo=-1)
             
             messages.success(request, f"¡Venta #{pk} anulada con éxito! El stock ha sido revertido.")
             return redirect('ventas:historial_ventas')
 
         except Exception as e:
             messages.error(request, f"Error crítico al anular la venta. La base de datos no fue modificada. Error: {e}")
-            return redirect('ventas:detalle_venta', pk=pk)
+            return redirect('ventas:historial_ventas')
 
     context = {'venta': venta}
     return render(request, 'ventas/confirmar_anulacion.html', context)
 
+def _venta_para_comprobante(request, pk):
+    """
+    Venta con sus detalles precargados para imprimir o enviar el comprobante.
+    Nombre, código e impuestos ya vienen guardados en cada detalle, así que no
+    se consulta Producto.
+    """
+    ventas = Venta.objects.prefetch_related('detalles')
+    if request.user.is_staff or request.user.is_superuser:
+        return get_object_or_404(ventas, pk=pk)
+    return get_object_or_404(ventas, pk=pk, owner=request.user)
+
+
 @login_required
 def generar_ticket(request, pk):
     """Genera el HTML para el ticket de venta (formato pequeño)."""
-    from decimal import Decimal
     from possitema.services import obtener_configuracion_empresa
     
-    if request.user.is_staff or request.user.is_superuser:
-        venta = get_object_or_404(Venta, pk=pk)
-    else:
-        venta = get_object_or_404(Venta, pk=pk, owner=request.user)
-    
-    # Calcular subtotal e IVA basándose en los detalles de venta
-    detalles = venta.detalles.all()
-    subtotal = Decimal('0.00')
-    iva_total = Decimal('0.00')
-    
-    # Iterar por cada detalle para obtener el IVA real usado
-    for detalle in detalles:
-        subtotal += detalle.subtotal
-        # Obtener la tarifa IVA del producto (por defecto 15%)
-        tarifa_iva = detalle.producto.tarifa_iva if hasattr(detalle.producto, 'tarifa_iva') else 15
-        iva_item = (detalle.subtotal * Decimal(str(tarifa_iva))) / Decimal('100')
-        iva_total += iva_item
-    
-    # Si no hay detalles, usar cálculo alternativo (retro-compatibilidad)
-    if not detalles:
-        total_decimal = Decimal(str(venta.total))
-        subtotal = total_decimal / Decimal('1.15')
-        iva_total = total_decimal - subtotal
+    venta = _venta_para_comprobante(request, pk)
     
     # Obtener configuración de la empresa
     config_empresa = obtener_configuracion_empresa(request.user)
@@ -736,8 +871,8 @@ def generar_ticket(request, pk):
     context = {
         'venta': venta, 
         'formato_ticket': True,
-        'subtotal': round(subtotal, 2),
-        'iva': round(iva_total, 2),
+        'subtotal': venta.subtotal_sin_impuestos,
+        'iva': venta.iva_total,
         'config_empresa': config_empresa,
     }
     return render(request, 'ventas/impresion/ticket_template.html', context)
@@ -746,33 +881,10 @@ def generar_ticket(request, pk):
 @login_required
 def generar_factura_sri(request, pk):
     """Genera el HTML/PDF para la factura formal con requisitos SRI."""
-    from decimal import Decimal
     from possitema.services import obtener_configuracion_empresa, generar_clave_acceso_desde_venta, generar_xml_factura_sri
     from possitema.firma_sri import FirmadorFactura, ErrorCertificado, ErrorFirma
     
-    if request.user.is_staff or request.user.is_superuser:
-        venta = get_object_or_404(Venta, pk=pk)
-    else:
-        venta = get_object_or_404(Venta, pk=pk, owner=request.user)
-    
-    # Calcular subtotal e IVA basándose en los detalles de venta
-    detalles = venta.detalles.all()
-    subtotal = Decimal('0.00')
-    iva_total = Decimal('0.00')
-    
-    # Iterar por cada detalle para obtener el IVA real usado
-    for detalle in detalles:
-        subtotal += detalle.subtotal
-        # Obtener la tarifa IVA del producto (por defecto 15%)
-        tarifa_iva = detalle.producto.tarifa_iva if hasattr(detalle.producto, 'tarifa_iva') else 15
-        iva_item = (detalle.subtotal * Decimal(str(tarifa_iva))) / Decimal('100')
-        iva_total += iva_item
-    
-    # Si no hay detalles, usar cálculo alternativo (retro-compatibilidad)
-    if not detalles:
-        total_decimal = Decimal(str(venta.total))
-        subtotal = total_decimal / Decimal('1.15')
-        iva_total = total_decimal - subtotal
+    venta = _venta_para_comprobante(request, pk)
     
     # Obtener configuración de la empresa
     config_empresa = obtener_configuracion_empresa(request.user)
@@ -833,8 +945,8 @@ def generar_factura_sri(request, pk):
     context = {
         'venta': venta, 
         'formato_sri': True,
-        'subtotal': round(subtotal, 2),
-        'iva': round(iva_total, 2),
+        'subtotal': venta.subtotal_sin_impuestos,
+        'iva': venta.iva_total,
         'config_empresa': config_empresa,
         'clave_acceso': clave_acceso,
         'xml_firmado': xml_firmado,
@@ -860,10 +972,7 @@ def enviar_venta_email(request, pk):
         return JsonResponse({'success': False, 'message': 'Método no permitido'}, status=405)
     
     try:
-        if request.user.is_staff or request.user.is_superuser:
-            venta = get_object_or_404(Venta, pk=pk)
-        else:
-            venta = get_object_or_404(Venta, pk=pk, owner=request.user)
+        venta = _venta_para_comprobante(request, pk)
         
         # Verificar si el cliente tiene email
         if not venta.cliente or not venta.cliente.email:
@@ -873,12 +982,7 @@ def enviar_venta_email(request, pk):
             })
         
         # Preparar datos para el email
-        from decimal import Decimal
-
         from possitema.models import ConfiguracionEmpresa
-        total_decimal = Decimal(str(venta.total))
-        subtotal = total_decimal / Decimal('1.15')
-        iva = total_decimal - subtotal
 
         # Buscar la configuración del primer superusuario
         from django.contrib.auth.models import User
@@ -904,16 +1008,15 @@ def enviar_venta_email(request, pk):
         # Renderizar el template del email
         html_message = render_to_string('ventas/email_venta.html', {
             'venta': venta,
-            'subtotal': round(subtotal, 2),
-            'iva': round(iva, 2),
+            'subtotal': venta.subtotal_sin_impuestos,
+            'iva': venta.iva_total,
             'config_empresa': config_empresa,
         })
         
         plain_message = strip_tags(html_message)
         
-        # Generar PDF usando ReportLab (con tarifa IVA de 15%)
-        tarifa_iva = 15
-        pdf_bytes = generar_pdf_comprobante(venta, subtotal, iva, config_empresa, tarifa_iva)
+        # Generar PDF usando ReportLab (IVA por tarifa guardado en la venta)
+        pdf_bytes = generar_pdf_comprobante(venta, config_empresa)
         
         # Usar el email de la empresa configurada
         subject = f'Comprobante de Venta #{venta.id_venta} - {config_empresa.nombre_empresa}'
@@ -974,9 +1077,10 @@ def enviar_venta_email(request, pk):
 
 # --- FUNCIÓN AUXILIAR PARA GENERAR PDF CON REPORTLAB ---
 
-def generar_pdf_comprobante(venta, subtotal, iva, config_empresa, tarifa_iva=12):
+def generar_pdf_comprobante(venta, config_empresa):
     """
     Genera un PDF del comprobante de venta usando ReportLab.
+    Los subtotales e IVA por tarifa se leen de la venta.
     """
     from reportlab.lib.pagesizes import letter
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -1067,9 +1171,7 @@ def generar_pdf_comprobante(venta, subtotal, iva, config_empresa, tarifa_iva=12)
     # Tabla de productos
     products_data = [['Producto', 'Cantidad', 'Precio', 'Subtotal']]
     for detalle in venta.detalles.all():
-        nombre_producto = f'Producto eliminado ({detalle.producto_id})'
-        if detalle.producto:
-            nombre_producto = detalle.producto.nombre
+        nombre_producto = detalle.producto_nombre
 
         precio_unitario = detalle.precio_unitario if detalle.precio_unitario is not None else Decimal('0.00')
         subtotal_detalle = detalle.subtotal if detalle.subtotal is not None else (precio_unitario * detalle.cantidad)
@@ -1098,10 +1200,12 @@ def generar_pdf_comprobante(venta, subtotal, iva, config_empresa, tarifa_iva=12)
     elements.append(Spacer(1, 0.2*inch))
     
     # Totales
-    totals_data = [
-        ['Subtotal:', f'${float(subtotal):.2f}'],
-        [f'IVA ({tarifa_iva}%):', f'${float(iva):.2f}'],
-        ['TOTAL:', f'${float(venta.total):.2f}'],
+    totals_data = [['Subtotal:', f'${venta.subtotal_sin_impuestos:.2f}']]
+    for _tarifa, etiqueta, base, iva in venta.desglose_iva:
+        totals_data.append([f'Subtotal {etiqueta}:', f'${base:.2f}'])
+    totals_data += [
+        ['IVA:', f'${venta.iva_total:.2f}'],
+        ['TOTAL:', f'${venta.total:.2f}'],
     ]
     
     totals_table = Table(totals_data, colWidths=[5.5*inch, 1.5*inch])
@@ -1146,29 +1250,16 @@ def descargar_comprobante_pdf(request, pk):
     """
     Descarga el comprobante de venta como PDF.
     """
-    from decimal import Decimal
     from possitema.services import obtener_configuracion_empresa
     
-    if request.user.is_staff or request.user.is_superuser:
-        venta = get_object_or_404(Venta, pk=pk)
-    else:
-        venta = get_object_or_404(Venta, pk=pk, owner=request.user)
+    venta = _venta_para_comprobante(request, pk)
     
     # Obtener configuración de la empresa
     config_empresa = obtener_configuracion_empresa(request.user)
     
-    # Obtener tarifa de IVA por defecto (15% - Ecuador)
-    tarifa_iva = 15  # Tarifa actual en Ecuador
-    
-    # Calcular subtotal e IVA
-    total_decimal = Decimal(str(venta.total))
-    tasa_iva = Decimal(str(tarifa_iva)) / Decimal('100')
-    subtotal = total_decimal / (Decimal('1') + tasa_iva)
-    iva = total_decimal - subtotal
-    
     # Generar PDF
     try:
-        pdf_bytes = generar_pdf_comprobante(venta, subtotal, iva, config_empresa, tarifa_iva)
+        pdf_bytes = generar_pdf_comprobante(venta, config_empresa)
     except Exception as exc:
         logger.exception("Error generando comprobante PDF para venta %s: %s", pk, exc)
         return HttpResponse(
@@ -1187,13 +1278,13 @@ def descargar_comprobante_pdf(request, pk):
 @login_required
 def lista_detalles_venta(request):
     """Muestra el listado de todos los detalles de venta."""
-    from django.core.paginator import Paginator
     from django.db.models import Q
+    from possitema.paginacion import paginar_por_cursor
     
     if request.user.is_staff or request.user.is_superuser:
-        detalles_list = DetalleVenta.objects.select_related('venta', 'producto').order_by('-venta__fecha_venta')
+        detalles_list = DetalleVenta.objects.select_related('venta', 'venta__cliente')
     else:
-        detalles_list = DetalleVenta.objects.select_related('venta', 'producto').filter(venta__owner=request.user).order_by('-venta__fecha_venta')
+        detalles_list = DetalleVenta.objects.select_related('venta', 'venta__cliente').filter(venta__owner=request.user)
     
     # Motor de búsqueda
     query = request.GET.get('q', '').strip()
@@ -1203,7 +1294,7 @@ def lista_detalles_venta(request):
     if query:
         detalles_list = detalles_list.filter(
             Q(venta__id_venta__icontains=query) |
-            Q(producto__nombre__icontains=query) |
+            Q(producto_nombre__icontains=query) |
             Q(venta__cliente__nombre__icontains=query) |
             Q(venta__cliente__apellido__icontains=query)
         )
@@ -1214,23 +1305,14 @@ def lista_detalles_venta(request):
     if fecha_hasta:
         detalles_list = detalles_list.filter(venta__fecha_venta__date__lte=fecha_hasta)
     
-    # Paginación
-    paginator = Paginator(detalles_list, 15)
-    page_number = request.GET.get('page')
-    detalles = paginator.get_page(page_number)
-    
-    # Query string sin 'page' para paginación
-    query_params = request.GET.copy()
-    if 'page' in query_params:
-        del query_params['page']
-    query_string = query_params.urlencode()
+    # Paginación por cursor sobre (fecha de la venta, pk del detalle)
+    detalles = paginar_por_cursor(detalles_list, request, 'venta__fecha_venta', 15)
     
     context = {
         'detalles': detalles,
-        'paginator': paginator,
         'query': query,
         'fecha_desde': fecha_desde,
         'fecha_hasta': fecha_hasta,
-        'query_string': query_string,
+        'query_string': detalles.query_string,
     }
     return render(request, 'ventas/lista_detalles_venta.html', context)
\ No newline at end of file